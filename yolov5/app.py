@@ -1,9 +1,16 @@
 from flask import Flask, request, render_template
+import contextlib
 import os
-import boto3
+import queue
+import threading
 from dotenv import load_dotenv
-from moviepy.editor import *
 from flask_cors import CORS
+from worker import MosaicWorker
+from utils.mosaic.jobs import PRIORITY_IMAGE, PRIORITY_VIDEO, JobQueue
+from utils.mosaic.cache import ResultCache
+from utils.mosaic.sidecar import DetectionLog
+from utils.mosaic.storage import LocalStorage, LocalWriter, S3Storage, TeeWriter, is_video
+from utils.mosaic.video import ffmpeg_exe
 
 # from flask_cors import CORS
 
@@ -28,17 +35,63 @@ video_folder = "video_uploads"
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'mp4', 'avi', 'mov'}
 detect_folder =""
 
-# S3 클라이언트 생성
-s3 = boto3.client('s3', 
-                  aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-                  aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'))
-bucket_name = os.getenv('AWS_S3_BUCKET_NAME')
-
-def download_file_from_s3(file_name, destination_folder):
-    s3.download_file(bucket_name, file_name, os.path.join(destination_folder, file_name))
-
-def upload_file_to_s3(file_path, file_name):
-    s3.upload_file(file_path, bucket_name, file_name)
+# 저장소: STORAGE_ROOT가 있으면 로컬 폴더 (S3 없이 테스트), 없으면 S3
+# S3는 멀티파트 병렬 전송, 동영상은 presigned URL로 받으면서 디코딩하고 결과는 인코딩하면서 파트 단위로 업로드
+def make_storage():
+    if os.getenv('STORAGE_ROOT'):
+        return LocalStorage(os.getenv('STORAGE_ROOT'))
+    # S3 클라이언트 생성
+    import boto3  # S3를 쓰는 배포에서만 필요
+    s3 = boto3.client('s3', 
+                      aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+                      aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'))
+    bucket_name = os.getenv('AWS_S3_BUCKET_NAME')
+    return S3Storage(bucket_name, s3)
+
+# 모델(4class.pt + DeepFace)을 한 번만 로드하고 요청마다 재사용
+# MODEL_PROCESSES > 0이면 모델을 그 수만큼의 프로세스에 하나씩 올리고 프레임은 공유 메모리로 전달 (코어 수 = 프로세스 x MODEL_THREADS)
+def make_worker():
+    return MosaicWorker(weights='4class.pt', imgsz=(640, 640), conf_thres=0.25,
+                        processes=int(os.getenv('MODEL_PROCESSES', 0)), threads=int(os.getenv('MODEL_THREADS', 1)))
+
+# 비동기 작업 큐: 워커 스레드는 다운로드/업로드를 겹쳐 처리하고 모자이크는 worker가 한 번에 하나씩 처리
+def make_jobs():
+    return JobQueue(workers=int(os.getenv('JOB_WORKERS', 2)), maxsize=int(os.getenv('JOB_QUEUE_SIZE', 64)))
+
+# 결과 캐시: 같은 입력 + 옵션의 결과 파일과 탐지 목록을 로컬 디스크에 보관 (용량 초과 시 오래 안 쓴 것부터 삭제)
+def make_results():
+    return ResultCache(os.getenv('RESULT_CACHE_DIR', 'runs/result_cache'), int(os.getenv('RESULT_CACHE_MB', 2048)) << 20)
+
+# 탐지 결과 캐시: 원본별 탐지 박스/얼굴 비교 결과 (강도나 클래스만 바꾼 재요청은 모델 없이 모자이크만 다시 적용)
+def make_sidecars():
+    return ResultCache(os.getenv('DETECTION_CACHE_DIR', 'runs/detection_cache'), int(os.getenv('DETECTION_CACHE_MB', 512)) << 20)
+
+# 저장소/모델/작업 큐/캐시는 import 시점이 아니라 처음 쓰일 때 한 번만 생성
+# -> 가중치, DeepFace, S3 없이도 import 가능, 테스트는 configure()로 스텁 worker나 LocalStorage를 먼저 넣어 둠
+SERVICES = {'storage': make_storage, 'worker': make_worker, 'jobs': make_jobs,
+            'results': make_results, 'sidecars': make_sidecars}
+services = {}
+services_lock = threading.RLock()
+
+def get_service(name):
+    if name not in services:
+        with services_lock:  # 동시에 들어온 첫 요청들이 모델을 두 번 로드하지 않도록
+            if name not in services:
+                services[name] = SERVICES[name]()
+    return services[name]
+
+# 이미 만든 객체를 바꿔 끼움 (예: configure(worker=stub, storage=LocalStorage(tmp)))
+def configure(**kwargs):
+    unknown = kwargs.keys() - SERVICES.keys()
+    assert not unknown, f'unknown services {unknown}, choose from {list(SERVICES)}'
+    with services_lock:
+        services.update(kwargs)
+
+# app.worker, app.results 등 모듈 속성으로 접근하는 코드(app_async.py)도 처음 접근할 때 생성
+def __getattr__(name):
+    if name in SERVICES:
+        return get_service(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # 파일 확장자를 체크하는 함수
 def allowed_file(filename):
@@ -59,19 +112,12 @@ def read_image(file_path):
         image_bytes = file.read()
     return image_bytes
 
-saved_name = ""
-file_size = ""
-file_type = ""
-file_name = ""
 # 홈페이지 라우트
 # @app.route('/')
 # def home():
 #     return render_template('index.html')
-# 이미지 업로드 라우트
-@app.route('/detect', methods=['POST'])
-def mosaic_file():
-    detect_folder =""
-    get_data = request.get_json()
+# 요청 JSON에서 파일 이름과 모자이크 옵션 추출
+def parse_request(get_data):
     file_name = get_data['original']['original_file_name']
     print(file_name)
     croped_file_name = ""
@@ -82,103 +128,221 @@ def mosaic_file():
         print("예외처리할 대상 없음.")
 
     # 모자이크 옵션 딕셔너리 생성
-    ratio = get_data['data']['intensityAuto']
-    carNumber = get_data['data']['carNumber']
-    carNumber = True if carNumber.lower() == "true" else False
-    face = get_data['data']['face']
-    face = True if face.lower() == "true" else False
-    print(face)
-    knife = get_data['data']['knife']
-    knife = True if knife.lower() == "true" else False
-    print(knife)
-    cigar = get_data['data']['cigar']
-    cigar = True if cigar.lower() == "true" else False
-    
-    # 파일이 비어 있는지 확인
-    if file_name == '':
-        return 'No file name provided'
-    
-    # 파일이 허용된 확장자인지 확인(file이 비어있으면 false AND 확장자가 올바르지 않으면 false)
-    if allowed_file(file_name):
-        # 파일을 업로드할 디렉토리 생성(increment 로직 추가 필요)
-        if not os.path.exists(upload_folder):
-            os.makedirs(upload_folder)
-        
-        if not os.path.exists(croped_folder):
-            os.makedirs(croped_folder)
+    options = {'ratio': int(get_data['data']['intensityAuto'])}
+    for key in ('carNumber', 'face', 'knife', 'cigar'):
+        options[key] = get_data['data'][key].lower() == "true"
+    print(options)
+    return file_name, croped_file_name, options
+
+# 입력을 읽지 못해 결과 파일이 하나도 없는 요청 (/detect에서 422로 응답)
+class NoOutputError(Exception):
+    pass
+
+# 요청 하나의 처리 단계: 캐시 조회 -> (적중 시 복구) -> 다운로드 -> 모자이크 -> 업로드/캐시 저장
+# 동기 process_file과 비동기 app_async.py가 같은 단계를 공유 (비동기 쪽은 I/O 단계와 모델 단계를 다른 executor에서 실행)
+# store를 바꿔 끼우면 (LocalStorage) S3 없이 로컬 파일로도 실행/테스트 가능
+class MosaicRequest:
+    def __init__(self, file_name, croped_file_name, options, store=None):
+        self.file_name, self.croped_file_name, self.options = file_name, croped_file_name, options
+        self.store = store or get_service('storage')
+        # avi/mov 원본도 동영상 결과는 mp4
+        self.saved_name = f"mosaic_{os.path.splitext(file_name)[0]}.mp4" if is_video(file_name) else f"mosaic_{file_name}"
+        self.file_type = get_file_type(self.saved_name)
+        self.key = self.det_key = self.hit = self.record = self.replay = self.sink = None
+
+    # SpringBoot로 json type으로 S3에 저장된 이름, 확장자명, 파일 사이즈 넘겨주기
+    def response(self, file_size):
+        res = {"file_name": f'{self.saved_name}', "file_size": int(file_size), "file_type": f'{self.file_type}', "file_rename": f'{self.saved_name}'}
+        print(res)
+        return res
+
+    # 같은 사진/영상을 같은 옵션으로 다시 요청하면 (UI 재시도 등) 캐시된 결과로 응답 (다운로드/추론/업로드 생략), 적중하면 True
+    # 키: 원본 내용 해시(S3 ETag) + 모델 가중치 해시 + 옵션(강도, 켜진 클래스) + reference 얼굴 해시
+    # 탐지 결과 키: 옵션을 뺀 원본 해시 + 모델 가중치/임계값 + reference 얼굴 해시
+    def lookup(self):
+        store, options = self.store, self.options
+        worker, results, sidecars = get_service('worker'), get_service('results'), get_service('sidecars')
+        input_hash = store.fingerprint(self.file_name)
+        if input_hash is None:
+            return False
+        ref_hash = store.fingerprint(self.croped_file_name) if self.croped_file_name else None
+        self.key = results.key(input_hash, worker.weights_hash, ref_hash if options.get('face') else None, options)
+        self.hit = results.get(self.key)
+        if self.hit:
+            return True
+
+        # 기록된 탐지 결과가 있으면 리플레이 (얼굴 모자이크를 켰는데 얼굴 비교 결과가 기록되지 않은 경우는 제외)
+        self.det_key = sidecars.key(input_hash, worker.weights_hash, worker.conf_thres, worker.iou_thres, ref_hash)
+        entry = sidecars.get(self.det_key)
+        if entry:
+            try:
+                self.replay = DetectionLog.load(entry[0])
+            finally:
+                sidecars.release(entry[0])  # 읽은 뒤 고정 해제, 그 사이에는 교체/삭제되지 않음
+            if options.get('face') and ref_hash is not None and not self.replay.faces_verified:
+                self.replay = None
+        if self.replay is None:
+            self.record = DetectionLog()
+        return False
+
+    # 캐시 적중: 결과 객체가 지워졌거나 다른 옵션의 결과로 덮어써진 경우에만 복구 (가능하면 서버 측 복사)
+    def restore(self):
+        store, saved_name = self.store, self.saved_name
+        cached_path, meta = self.hit
+        try:  # get()이 고정한 캐시 항목은 업로드가 끝날 때까지 다른 요청의 교체/삭제에도 남아 있음
+            if store.fingerprint(saved_name) != meta['etag']:
+                if meta['file_name'] != saved_name and store.fingerprint(meta['file_name']) == meta['etag']:
+                    store.copy(meta['file_name'], saved_name)
+                else:
+                    store.upload(cached_path, saved_name)
+        finally:
+            get_service('results').release(cached_path)
+        print("캐시 사용")
+        return self.response(meta['file_size'])
+
+    # S3에서 파일 다운로드 (동영상은 내려받지 않고 presigned URL을 디코더가 바로 스트리밍)
+    def fetch(self, request_dir):
         # 파일을 저장할 경로 설정
         # os.path.join : 인수에 전달된 2개의 문자열을 결합하여, 1개의 경로로 할 수 있다. 인자 사이에는 /가 포함됨.
-        filepath = os.path.join(upload_folder, file_name)
+        download_folder = os.path.join(request_dir, upload_folder)
+        reference_folder = os.path.join(request_dir, croped_folder)
+        os.makedirs(download_folder)
+        os.makedirs(reference_folder)
+        self.croped_path = os.path.join(reference_folder, self.croped_file_name)
+        print("S3에서 가져온 이름 + 폴더명"+self.croped_path)
+
+        self.source = self.store.source(self.file_name, download_folder)
         try:
-            croped_path = os.path.join(croped_folder, croped_file_name)
-            print("S3에서 가져온 이름 + 폴더명"+croped_path)
-        except: 
-            print('croped가 None이라 붙일 수 없음.')
-
-        # S3에서 파일 다운로드
-        download_file_from_s3(file_name, upload_folder)
-        try:
-            download_file_from_s3(croped_file_name, croped_folder)
+            self.croped_path = self.store.download(self.croped_file_name, reference_folder)
         except:
             print("다운로드할 이미지 없음.")
-        # 모자이크할 이미지 저장된 경로
-        dir_path= filepath
-
-        # terminal 명령어 파이썬 내에서 실행
-        os.system(f'python detect.py --weights 4class.pt --img 640 --conf 0.25 --source "{dir_path}" --ratio {ratio} --carNumber "{carNumber}" --face "{face}" --knife "{knife}" --cigar "{cigar}" --reference "{croped_path}"')
 
-
-        # 기존에 생성된 exp 폴더의 번호 중 가장 큰 번호 찾기
-        exp_folders = [f.path for f in os.scandir("runs/detect") if f.is_dir() and f.name.startswith('exp')]
-
-        # 폴더 생성 시간으로 정렬
-        exp_folders.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-
-        # 가장 최근 폴더 경로 할당
-        if exp_folders:
-            detect_folder = exp_folders[0]
-            print(f"detect-folder: {detect_folder}")
+        # 동영상 결과는 ffmpeg가 인코딩하는 동안 파트 단위로 바로 업로드, 캐시용 로컬 사본도 함께 기록
+        self.cached_path = os.path.join(request_dir, self.saved_name)
+        if is_video(self.file_name) and ffmpeg_exe() is not None:
+            self.sink = self.store.writer(self.saved_name)
+            if self.key:
+                self.sink = TeeWriter(self.sink, LocalWriter(self.cached_path))
+
+    # 상주 워커로 모자이크 처리 (매 요청마다 python detect.py 프로세스를 띄우지 않음), 스트리밍 업로드 포함
+    # 결과 파일 경로를 직접 반환받으므로 runs/detect의 exp 폴더를 뒤질 필요 없음
+    def render(self, request_dir):
+        sink, worker = self.sink, get_service('worker')
+        try:
+            outputs = worker(self.source, save_dir=request_dir, reference=self.croped_path, record=self.record,
+                             replay=self.replay, video_sink=(lambda path: sink) if sink else None, **self.options)
+            if not outputs:  # 디코딩된 프레임이 없는 등 저장된 결과가 없는 경우
+                raise NoOutputError(f'No mosaic output for {self.file_name}')
+            self.detect_path = outputs[0]
+        except Exception:
+            if sink and not sink.closed:
+                sink.abort()
+            raise
+
+    # 모자이크 처리된 파일을 S3에 업로드 (스트리밍한 동영상은 이미 업로드됨) 후 결과/탐지 캐시에 저장
+    def finish(self, request_dir):
+        if self.sink:
+            file_size = self.sink.size
         else:
-            print("'exp' 로 시작하는 폴더가 없습니다.")
-
-        detect_path = os.path.join(detect_folder, file_name)
-
-        # 모자이크 처리된 파일의 확장자 확인
-        _, ext = os.path.splitext(file_name)
-        if ext.lower() in ['.mp4', '.mov', '.avi']:
-            # 모자이크 처리된 동영상 파일 로드
-            resultVideo = VideoFileClip(detect_path)
+            self.cached_path = self.detect_path
+            file_size = os.path.getsize(self.detect_path)
+            self.store.upload(self.detect_path, f"{self.saved_name}")
+
+        if self.record:
+            record_path = os.path.join(request_dir, 'detections.npz')
+            self.record.save(record_path)
+            get_service('sidecars').put(self.det_key, record_path, {'faces_verified': self.record.faces_verified})
+        if self.key:
+            meta = {'file_name': self.saved_name, 'file_size': int(file_size), 'etag': self.store.fingerprint(self.saved_name)}
+            get_service('results').put(self.key, self.cached_path, meta, self.record or self.replay)
+        return self.response(file_size)
+
+# 다운로드 -> 모자이크 -> 업로드, 동기 /detect와 비동기 /jobs가 공유, job이 있으면 단계별 시간 기록
+def process_file(file_name, croped_file_name, options, job=None, store=None):
+    stage = job.stage if job else lambda name: contextlib.nullcontext()
+    req = MosaicRequest(file_name, croped_file_name, options, store)
+    with stage('cache'):
+        hit = req.lookup()
+    if hit:
+        with stage('upload'):
+            return req.restore()
+
+    # 요청마다 고유한 임시 폴더에서 처리하고 끝나면 폴더째 삭제 (동시 요청 충돌 방지, runs/detect 누적 방지)
+    with get_service('worker').scratch.request() as request_dir:
+        with stage('download'):
+            req.fetch(request_dir)
+        with stage('replay' if req.replay else 'detect'):
+            req.render(request_dir)
+        with stage('upload'):
+            return req.finish(request_dir)
 
-            # 원본 동영상 파일 로드
-            audioVideo = VideoFileClip(filepath)
-
-            # 원본 동영상에서 오디오 추출
-            audio = audioVideo.audio
-
-            # 모자이크 처리된 동영상에 오디오 합치기
-            video = resultVideo.set_audio(audio)
-
-            # 합쳐진 동영상 파일 저장
-            output_path = os.path.join(detect_folder, f"mosaic_{file_name}")
-            video.write_videofile(output_path, fps=video.fps)
-
-            saved_name = f"mosaic_{file_name}"
-        else: 
-            output_path = os.path.join(detect_folder, file_name)    
-            saved_name = f"mosaic_{file_name}"
-
-        # 모자이크 처리된 파일을 S3에 업로드  
-        file_size = os.path.getsize(output_path)
-        file_type = get_file_type(saved_name)
-        upload_file_to_s3(output_path, f"{saved_name}")
+# 홈페이지 라우트
+# @app.route('/')
+# def home():
+#     return render_template('index.html')
+# 이미지 업로드 라우트
+@app.route('/detect', methods=['POST'])
+def mosaic_file():
+    file_name, croped_file_name, options = parse_request(request.get_json())
 
-        # SpringBoot로 json type으로 S3에 저장된 이름, 확장자명, 파일 사이즈 넘겨주기
-        res = {"file_name": f'{saved_name}', "file_size": int(file_size), "file_type": f'{file_type}', "file_rename": f'{saved_name}'}
-        print(res)
-        return res
+    # 파일이 비어 있는지 확인
+    if file_name == '':
+        return 'No file name provided'
+    
+    # 파일이 허용된 확장자인지 확인(file이 비어있으면 false AND 확장자가 올바르지 않으면 false)
+    if allowed_file(file_name):
+        try:
+            return process_file(file_name, croped_file_name, options)
+        except NoOutputError as e:
+            return {'error': str(e)}, 422
     else:
         return 'Allowed file types are png, jpg, jpeg, gif'
-# 받은 이미지들은 다시 끝나면 삭제
+
+# 긴 동영상용 비동기 작업 등록: 바로 job_id를 돌려주고 워커 풀에서 처리 (Spring Boot 요청 타임아웃 방지)
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    file_name, croped_file_name, options = parse_request(request.get_json())
+    if file_name == '' or not allowed_file(file_name):
+        return {'error': 'Allowed file types are png, jpg, jpeg, gif, mp4, avi, mov'}, 400
+    # 이미지는 동영상보다 먼저 처리 (짧은 작업이 긴 동영상 뒤에 밀리지 않도록)
+    priority = PRIORITY_VIDEO if get_file_type(file_name) in ('.mp4', '.avi', '.mov') else PRIORITY_IMAGE
+    try:
+        job = get_service('jobs').submit(process_file, priority, file_name=file_name,
+                                         croped_file_name=croped_file_name, options=options)
+    except queue.Full:
+        return {'error': 'Job queue is full, retry later', **get_service('jobs').stats()}, 503
+    return {'job_id': job.id, 'status': job.status}, 202
+
+# 작업 상태 조회 (대기/실행/완료/실패, 단계별 소요 시간)
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = get_service('jobs').get(job_id)
+    if job is None:
+        return {'error': 'Unknown job'}, 404
+    return job.info()
+
+# 작업 결과 조회: 완료 시 /detect와 같은 응답, 진행 중이면 202
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = get_service('jobs').get(job_id)
+    if job is None:
+        return {'error': 'Unknown job'}, 404
+    if job.status == 'done':
+        return job.result
+    if job.status == 'failed':
+        return job.info(), 500
+    return job.info(), 202
+
+# 큐 길이, 상태별 작업 수
+@app.route('/jobs', methods=['GET'])
+def job_stats():
+    return get_service('jobs').stats()
+
+# 작업 큐 + 결과 캐시 지표 (적중/실패 횟수, 적중률, 디스크 사용량)
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return {'jobs': get_service('jobs').stats(), 'cache': get_service('results').stats(),
+            'detection_cache': get_service('sidecars').stats()}
 
 # # 비디오 파일 처리를 위한 api 추가
 # @app.route('/video_detect', methods=['POST'])
@@ -229,4 +393,5 @@ def mosaic_file():
 #     else:
 #         return 'Allowed file types are png, jpg, jpeg, gif, mp4, avi, mov'
 if __name__ == '__main__':
+    get_service('worker')  # 첫 요청이 모델 로드를 기다리지 않도록 서버 시작 전에 로드
     app.run()
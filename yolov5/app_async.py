@@ -0,0 +1,111 @@
+# 비동기 서빙 진입점 (aiohttp): app.py의 /detect와 같은 요청/응답, 같은 워커/저장소/캐시/처리 단계(MosaicRequest)를 사용
+# S3/디스크 I/O 단계는 I/O executor에서 await하고 모델 추론은 전용 단일 스레드 executor에서 실행
+# -> 요청마다 스레드를 잡아두지 않고 한 프로세스의 이벤트 루프가 다운로드/업로드 대기 중인 많은 요청을 겹쳐 처리
+# 실행: STORAGE_ROOT=runs/storage python app_async.py --port 5001  (부하 테스트: mosaic_loadtest.py)
+import argparse
+import asyncio
+import collections
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+import app as service  # 모델(4class.pt + DeepFace) 로드, 저장소, 결과/탐지 캐시, 요청 파싱 재사용
+from utils.flask_rest_api.batching import Histogram
+
+# I/O 스레드는 대기 시간이 대부분이라 많이, 모델은 worker가 한 번에 하나만 처리하므로 1개
+io_workers = int(os.getenv('IO_WORKERS', 32))
+io_pool = ThreadPoolExecutor(io_workers, thread_name_prefix='io')
+model_pool = ThreadPoolExecutor(1, thread_name_prefix='model')
+latency = {}  # 단계 이름 -> Histogram (ms)
+inflight = 0  # 처리 중인 요청 수
+pending = collections.Counter()  # executor -> 제출했지만 아직 끝나지 않은 작업 수 (실행 중 + 대기 중, 이벤트 루프에서만 갱신)
+
+# executor에서 fn을 실행하고 끝날 때까지 이벤트 루프를 막지 않고 기다림
+async def run_in(pool, fn, *args):
+    pending[pool] += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+    finally:
+        pending[pool] -= 1
+
+# 단계 함수를 executor에서 실행, 단계별 시간 기록
+async def run_stage(name, pool, fn, *args):
+    t = time.perf_counter()
+    try:
+        return await run_in(pool, fn, *args)
+    finally:
+        latency.setdefault(name, Histogram()).add((time.perf_counter() - t) * 1e3)
+
+# 캐시 조회 -> (적중 시 복구) -> 다운로드 -> 모자이크 -> 업로드/캐시 저장, app.process_file의 비동기 버전
+async def process_file_async(file_name, croped_file_name, options, store=None):
+    req = service.MosaicRequest(file_name, croped_file_name, options, store)
+    if await run_stage('cache', io_pool, req.lookup):
+        return await run_stage('upload', io_pool, req.restore)
+
+    # 임시 폴더 생성/삭제(rmtree + prune)도 디스크 I/O라 이벤트 루프 대신 I/O executor에서 실행
+    scratch = service.worker.scratch.request()
+    request_dir = await run_in(io_pool, scratch.__enter__)
+    try:
+        await run_stage('download', io_pool, req.fetch, request_dir)
+        await run_stage('replay' if req.replay else 'detect', model_pool, req.render, request_dir)
+        return await run_stage('upload', io_pool, req.finish, request_dir)
+    finally:
+        await run_in(io_pool, scratch.__exit__, None, None, None)
+
+routes = web.RouteTableDef()
+
+@routes.post('/detect')
+async def mosaic_file(request):
+    global inflight
+    # 잘못된 JSON이나 필드가 빠진 요청은 서버 오류(500)가 아니라 400으로 응답
+    try:
+        file_name, croped_file_name, options = service.parse_request(await request.json())
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        return web.json_response({'error': f'Invalid request: {e!r}'}, status=400)
+
+    # 파일이 비어 있는지 확인
+    if file_name == '':
+        return web.Response(text='No file name provided')
+
+    # 파일이 허용된 확장자인지 확인
+    if not service.allowed_file(file_name):
+        return web.Response(text='Allowed file types are png, jpg, jpeg, gif')
+
+    inflight += 1
+    t = time.perf_counter()
+    try:
+        return web.json_response(await process_file_async(file_name, croped_file_name, options))
+    except service.NoOutputError as e:
+        return web.json_response({'error': str(e)}, status=422)
+    finally:
+        inflight -= 1
+        latency.setdefault('total', Histogram()).add((time.perf_counter() - t) * 1e3)
+
+# 처리 중인 요청 수, executor별 미완료/대기 작업 수, 단계별 지연 시간 히스토그램, 결과/탐지 캐시 지표
+@routes.get('/metrics')
+async def metrics(request):
+    return web.json_response({
+        'inflight': inflight,
+        'io_pending': pending[io_pool],
+        'io_queue': max(pending[io_pool] - io_workers, 0),
+        'model_pending': pending[model_pool],
+        'model_queue': max(pending[model_pool] - 1, 0),
+        'latency_ms': {k: h.summary() for k, h in latency.items()},
+        'cache': service.results.stats(),
+        'detection_cache': service.sidecars.stats(),
+    })
+
+def make_app():
+    aio = web.Application(client_max_size=16 * 1024 ** 2)
+    aio.add_routes(routes)
+    return aio
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Async mosaic API')
+    parser.add_argument('--host', default='0.0.0.0', help='bind address')
+    parser.add_argument('--port', default=5001, type=int, help='port number')
+    opt = parser.parse_args()
+    service.get_service('worker')  # 첫 요청이 모델 로드를 기다리지 않도록 서버 시작 전에 로드
+    web.run_app(make_app(), host=opt.host, port=opt.port)
@@ -34,17 +34,18 @@ import os
 import platform
 import sys
 import pathlib
+from collections import deque
 # import face_recognition
 from pathlib import Path
 import numpy as np
-from deepface import DeepFace
 import torch
-from tensorflow import keras
 import time
 import json
+from urllib.parse import urlsplit
 
 temp = pathlib.PosixPath
-pathlib.PosixPath = pathlib.WindowsPath
+if platform.system() == "Windows":  # load checkpoints pickled on Linux, without breaking Path when imported on Linux
+    pathlib.PosixPath = pathlib.WindowsPath
 
 FILE = Path(__file__).resolve()
 ROOT = FILE.parents[0]  # YOLOv5 root directory
@@ -52,9 +53,10 @@ if str(ROOT) not in sys.path:
     sys.path.append(str(ROOT))  # add ROOT to PATH
 ROOT = Path(os.path.relpath(ROOT, Path.cwd()))  # relative
 
-from ultralytics.utils.plotting import Annotator, colors, save_one_box
+from ultralytics.utils.plotting import save_one_box
 
 from models.common import DetectMultiBackend
+from utils.augmentations import LetterboxBuffers
 from utils.dataloaders import IMG_FORMATS, VID_FORMATS, LoadImages, LoadScreenshots, LoadStreams
 from utils.general import (
     LOGGER,
@@ -72,6 +74,13 @@ from utils.general import (
     strip_optimizer,
     xyxy2xywh,
 )
+from utils.mosaic.faces import FaceVerifier, load_reference
+from utils.mosaic.kernels import MOSAIC_MODES, apply_mosaic, clip_boxes_int
+from utils.mosaic.pipeline import Pipeline, Stage
+from utils.mosaic.procpool import ModelPool
+from utils.mosaic.sidecar import DetectionLog
+from utils.mosaic.tracker import IoUTracker
+from utils.mosaic.video import video_writer
 from utils.torch_utils import select_device, smart_inference_mode
 
 os.environ['KMP_DUPLICATE_LIB_OK']='True'
@@ -80,6 +89,11 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'mp4', 'avi', 'mov'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def str2bool(v):
+    """Returns the bool of a command-line value such as 'True', 'false', '1' or '0', so '--face False' disables."""
+    return str(v).lower() in ("true", "1", "yes", "y")
     
 @smart_inference_mode()
 def run(
@@ -116,26 +130,62 @@ def run(
     carNumber=False,
     face=False,
     knife=False,
-    cigar = False
+    cigar = False,
+    model=None,  # preloaded DetectMultiBackend, i.e. from a resident MosaicWorker
+    verifier=None,  # FaceVerifier for the reference-face exclusion, created on demand if None
+    face_window=1,  # frames whose face crops are verified together in one batched forward pass
+    face_recheck=30,  # video frames before a tracked face is verified again
+    mosaic_mode="pixelate",  # mosaic style: pixelate, blur or fill
+    keep_audio=True,  # mux the source audio into result videos
+    pipeline=False,  # overlap decode, preprocess, inference, mosaic and encode on separate threads
+    pipeline_queue=4,  # frames buffered between pipeline stages
+    batch=1,  # consecutive video frames per inference batch (file sources)
+    video_sink=None,  # callable(save_path) returning a binary sink that receives result videos instead of save_path
+    record=None,  # DetectionLog (or .npz path to save) filled with the raw detections of all classes and face verdicts
+    replay=None,  # DetectionLog or .npz path to mosaic from instead of running the model and face verification
+    processes=0,  # inference worker processes fed through shared memory (0: infer in this process)
+    threads=1,  # intra-op threads per inference worker process
+    pool=None,  # running utils.mosaic.procpool.ModelPool to infer with, i.e. from a resident MosaicWorker
 ):
     source = str(source) # source는 이미지, 비디오, 웹캠 등의 입력 소스를 나타내는 변수
     save_img = not nosave and not source.endswith(".txt")  # save inference images 추론 결과 이미지로 저장할 것인지
-    is_file = Path(source).suffix[1:] in (IMG_FORMATS + VID_FORMATS) # suffix: pathlib의 파일확장자 다루는 함수
     is_url = source.lower().startswith(("rtsp://", "rtmp://", "http://", "https://"))
+    suffix = Path(urlsplit(source).path if is_url else source).suffix[1:].lower()  # URL은 ?쿼리(presigned 서명) 제외
+    is_file = suffix in (IMG_FORMATS + VID_FORMATS) # suffix: pathlib의 파일확장자 다루는 함수
     webcam = source.isnumeric() or source.endswith(".streams") or (is_url and not is_file)
     screenshot = source.lower().startswith("screen")
-    if is_url and is_file:
+    if is_url and is_file and suffix not in VID_FORMATS:
         source = check_file(source)  # download , 해당 URL에서 파일을 다운로드하는 함수 -> S3 url로 다운로드 받을 경우에 사용할 수 있겠다!
+        # 동영상 URL(S3 presigned 등)은 내려받지 않고 디코더가 HTTP range 요청으로 받으면서 바로 디코딩
 
     # Directories
     save_dir = increment_path(Path(project) / name, exist_ok=exist_ok)  # increment run / 중복 허용 x / project: runs/detect name: exp
     (save_dir / "labels" if save_txt else save_dir).mkdir(parents=True, exist_ok=True)  # make dir 결과 저장 디렉터리와 라벨 디렉터리를 생성합니다.
 
     # Load model
-    device = select_device(device)
-    model = DetectMultiBackend(weights, device=device, dnn=dnn, data=data, fp16=half)
-    stride, names, pt = model.stride, model.names, model.pt # stride :  객체 탐지 모델의 다운샘플링 비율 -> 이미지의 크기를 줄여서(다운샘플링) 처리
+    # 프로세스 풀: 각 워커 프로세스가 모델을 하나씩 들고 공유 메모리로 받은 프레임을 letterbox/추론/NMS (이 프로세스엔 모델 없음)
+    own_pool = pool is None and processes > 0 and replay is None
+    if own_pool:
+        pool = ModelPool(weights, processes, threads, device=device, data=data, half=half, imgsz=imgsz)
+    preloaded = model is not None or pool is not None  # 상주 워커에서 호출된 경우 이미 로드/워밍업된 모델을 재사용
+    if pool is not None:
+        device = select_device("cpu")  # 이 프로세스는 디코딩/모자이크/인코딩만
+        stride, names, pt = pool.stride, pool.names, pool.pt
+    else:
+        if preloaded:
+            device = model.device
+        else:
+            device = select_device(device)
+            model = DetectMultiBackend(weights, device=device, dnn=dnn, data=data, fp16=half)
+        stride, names, pt = model.stride, model.names, model.pt # stride :  객체 탐지 모델의 다운샘플링 비율 -> 이미지의 크기를 줄여서(다운샘플링) 처리
     imgsz = check_img_size(imgsz, s=stride)  # check image size
+    if isinstance(replay, (str, Path)):
+        replay = DetectionLog.load(replay)
+    record_path = None
+    if isinstance(record, (str, Path)):
+        record_path, record = record, DetectionLog()
+    if record is not None and not record.names:
+        record.names = names if isinstance(names, dict) else dict(enumerate(names))
 
     # Dataloader -> 입력 데이터의 종류에 따라 웹캠, 스크린샷, 이미지/비디오 경로를 데이터셋으로 로드
     bs = 1  # batch_size
@@ -146,38 +196,184 @@ def run(
     elif screenshot:
         dataset = LoadScreenshots(source, img_size=imgsz, stride=stride, auto=pt)
     else:
-        dataset = LoadImages(source, img_size=imgsz, stride=stride, auto=pt, vid_stride=vid_stride)
+        # 로더는 디코딩만 하고 letterbox는 preprocess에서 미리 할당한 입력 버퍼에 바로 수행 (파이프라인에선 전처리 스레드)
+        # 리플레이는 모델 입력이 필요 없고, 프로세스 풀은 워커 프로세스가 letterbox
+        dataset = LoadImages(
+            source,
+            img_size=imgsz,
+            stride=stride,
+            auto=pt,
+            transforms=lambda im0: None,
+            vid_stride=vid_stride,
+            batch_size=batch,
+        )
     vid_path, vid_writer = [None] * bs, [None] * bs
-
-    # Run inference
-    model.warmup(imgsz=(1 if pt or model.triton else bs, 3, *imgsz))  # warmup
-    seen, windows, dt = 0, [], (Profile(device=device), Profile(device=device), Profile(device=device))
-    # seen: 추론한 이미지 수를 카운트하는 변수 windows: 추론 결과를 시각화하기 위한 창을 저장할 리스트 dt: 추론 시간을 측정하기 위한 프로파일러 객체들
-    for path, im, im0s, vid_cap, s in dataset:
+    outputs = []  # saved image/video paths, returned to the caller
+    pending = []  # processed frames waiting for batched face verification before they are saved
+    trackers = {}  # per video/stream face IoUTracker, caches verification verdicts per track
+
+    # 모자이크 제외 reference 얼굴은 요청당 한 번만 임베딩 (같은 파일은 요청 간에도 캐시 재사용)
+    # 리플레이는 기록된 얼굴 비교 결과를 그대로 사용
+    reference_emb = None
+    if face and allowed_file(str(reference)) and replay is None:
+        verifier = verifier or FaceVerifier()
+        reference_emb = load_reference(verifier, reference)
+
+    # 모자이크 옵션 -> 클래스 id별 처리 방식 디스패치 테이블
+    # 얼굴은 reference가 있으면 비교 후 flush_faces에서 처리 ("verify"), 나머지는 바로 모자이크 ("mosaic")
+    flags = {"cigar": cigar, "licensePlate": carNumber, "knife": knife, "face": face}
+    if replay is not None:
+        verify_faces = replay.faces_verified and allowed_file(str(reference))
+    else:
+        verify_faces = reference_emb is not None
+    actions = {}
+    for c, n in names.items() if isinstance(names, dict) else enumerate(names):
+        if flags.get(n):
+            actions[c] = "verify" if n == "face" and verify_faces else "mosaic"
+    if actions and record is None:  # 켜지지 않은 클래스는 NMS 전에 제외 (--classes와 함께 쓰면 교집합, 기록 시엔 전체 클래스)
+        classes = [c for c in actions if classes is None or c in classes]
+    dt_cls = {names[c]: Profile(device=device) for c in actions}  # per-class mosaic timing
+
+    def mosaic_boxes(im0, boxes, confs, face_dets):
+        """Mosaics xyxy `boxes` of frame `im0` in place."""
+        apply_mosaic(im0, boxes, ratio=ratio, mode=mosaic_mode)
+
+    def collect_faces(im0, boxes, confs, face_dets):
+        """Appends valid int face boxes and confidences to `face_dets` for batched reference verification."""
+        # reference와 비교할 얼굴은 모아 두었다가 배치 한 번으로 임베딩 (flush_faces)
+        for (x1, y1, x2, y2), conf in zip(clip_boxes_int(boxes, im0.shape), confs):
+            if x2 > x1 and y2 > y1:
+                face_dets.append((x1, y1, x2, y2, float(conf)))
+
+    handlers = {"mosaic": mosaic_boxes, "verify": collect_faces}
+
+    def save_result(i, p, im0, save_path, info, mode):
+        """Shows and/or saves the processed frame `im0` of image `i` in the batch, as an image or a video frame."""
+        # Stream results
+        # im0 = annotator.result() # YOLOv5 모델의 결과를 이미지로 반환하는 메서드
+        if view_img:
+            if platform.system() == "Linux" and p not in windows: # 리눅스 환경 이미지 출력
+                windows.append(p)
+                cv2.namedWindow(str(p), cv2.WINDOW_NORMAL | cv2.WINDOW_KEEPRATIO)  # allow window resize (Linux)
+                cv2.resizeWindow(str(p), im0.shape[1], im0.shape[0])
+            cv2.imshow(str(p), im0)
+            cv2.waitKey(1)  # 1 millisecond
+
+        # Save results (image with detections)
+        if save_img:
+            if mode == "image": # 이미지 im0를 save_path에 저장
+                cv2.imwrite(save_path, im0)
+                outputs.append(Path(save_path))
+            else:  # 'video' or 'stream'
+                if vid_path[i] != save_path:  # vid_path[i]가 save_path와 다르면 새로운 비디오 파일을 여는 것
+                    vid_path[i] = save_path   
+                    if vid_writer[i] is not None:
+                        vid_writer[i].release()  # 이전에 열린 vid_writer[i]가 있다면 해제
+                    if info:  # video이면 디코딩 시점에 vid_cap에서 읽어 둔 FPS, 가로 해상도, 세로 해상도, 원본 경로/URL
+                        fps, w, h, src = info
+                        # 비트레이트 설정
+                        # bitrate = vid_cap.get(cv2.CAP_PROP_BITRATE)
+                    else:  # stream
+                        fps, w, h = 30, im0.shape[1], im0.shape[0]
+                    save_path = str(Path(save_path).with_suffix(".mp4"))  # force *.mp4 suffix on results videos 코덱 -> 코덱의 종류가 다를 경우 문제가 될 수 있음. 찾아봐야함.
+                    # 프레임을 ffmpeg 하나로 바로 인코딩하고 원본 오디오를 복사해 합침 (MoviePy 재인코딩 불필요)
+                    # video_sink가 있으면 파일 대신 sink(S3 multipart 업로드 등)로 인코딩 결과를 바로 흘려보냄
+                    audio = src if keep_audio and mode == "video" else None
+                    sink = video_sink(save_path) if video_sink else None
+                    vid_writer[i] = video_writer(save_path, fps, (w, h), audio=audio, sink=sink)
+                    outputs.append(Path(save_path))
+                vid_writer[i].write(im0)
+
+    def flush_faces():
+        """Verifies all pending face crops in one batched forward pass, mosaics unmatched faces and returns the frames."""
+        crops = [im0[y1:y2, x1:x2] for _, _, im0, *_, faces in pending for x1, y1, x2, y2, _, check in faces if check]
+        verified = np.ones(len(crops), dtype=bool)  # 비교 실패 시 기존과 동일하게 모자이크하지 않음
+        if crops:
+            try:
+                print(f"얼굴 비교 시도 ({len(crops)}개)")
+                with dt_cls["face"]:
+                    verified = verifier.verify_batch(reference_emb, crops)
+            except ValueError as e:
+                print(f"Error comparing reference face: {e}")
+        verified = iter(verified)
+        done = []  # save_result() arguments of the finished frames, in order
+        for i, p, im0, save_path, info, mode, frame, faces in pending:
+            boxes, keep = [], []  # reference 얼굴과 다른 얼굴만 모자이크 처리
+            for x1, y1, x2, y2, track, check in faces:
+                if check:
+                    v = bool(next(verified))
+                    if track is not None:
+                        track.verified = v  # 트랙의 다음 프레임들은 이 결과를 재사용
+                else:
+                    v = track.verified is not False
+                if not v:
+                    boxes.append((x1, y1, x2, y2))
+                keep.append(v)
+            if record is not None and reference_emb is not None:
+                record.add_faces(p.name, frame, [f[:4] for f in faces], keep)
+            if boxes:
+                with dt_cls["face"]:
+                    apply_mosaic(im0, boxes, ratio=ratio, mode=mosaic_mode)
+            done.append((i, p, im0, save_path, info, mode))
+        pending.clear()
+        return done
+
+    # Define the path for the CSV file
+    csv_path = save_dir / "predictions.csv"
+
+    # Create or append to the CSV file : csv 파일에 이미지와 정확도 등등을 기록
+    def write_to_csv(image_name, prediction, confidence):
+        """Writes prediction data for an image to a CSV file, appending if the file exists."""
+        data = {"Image Name": image_name, "Prediction": prediction, "Confidence": confidence}
+        with open(csv_path, mode="a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=data.keys())
+            if not csv_path.is_file():
+                writer.writeheader()
+            writer.writerow(data)
+
+    def decode(path, im, im0s, vid_cap, s):
+        """Returns a loader item with its frame index, mode and (fps, w, h, source) video info captured at decode time."""
+        frame = dataset.count if webcam else getattr(dataset, "frame", 0)
+        info = None
+        if vid_cap:  # video이면 vid_cap에서 FPS, 가로 해상도, 세로 해상도를 가져옵니다. (파이프라인에선 디코더가 앞서 가므로 미리 읽어 둠)
+            info = (vid_cap.get(cv2.CAP_PROP_FPS), int(vid_cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                    int(vid_cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), path)
+        return path, im, im0s, s, frame, dataset.mode, info
+
+    @smart_inference_mode()
+    def preprocess(x):
+        """Letterboxes the decoded frame if needed and returns the item with a normalized model input tensor."""
+        path, im, im0s, s, *meta = x
         with dt[0]:
-            im = torch.from_numpy(im).to(model.device)
-            im = im.half() if model.fp16 else im.float()  # uint8 to fp16/32
-            im /= 255  # 0 - 255 to 0.0 - 1.0 픽셀 정규화 작업
-            if len(im.shape) == 3:
-                im = im[None]  # expand for batch dim
-            if model.xml and im.shape[0] > 1:
-                ims = torch.chunk(im, im.shape[0], 0)
-
+            if im is None or im[0] is None:  # 파일 소스: 로더는 디코딩만, letterbox/RGB/정규화는 재사용 버퍼에 한 번에
+                im = letterboxes(im0s if isinstance(im0s, list) else [im0s])  # 배치(영상 프레임 묶음) 또는 단일 이미지
+            else:  # 웹캠/스크린샷: 로더가 letterbox한 입력
+                im = torch.from_numpy(im).to(model.device)
+                im = im.half() if model.fp16 else im.float()  # uint8 to fp16/32
+                im /= 255  # 0 - 255 to 0.0 - 1.0 픽셀 정규화 작업
+                if len(im.shape) == 3:
+                    im = im[None]  # expand for batch dim
+        return path, im, im0s, s, *meta
+
+    @smart_inference_mode()
+    def infer(x):
+        """Runs the model and NMS on a preprocessed item and returns it with the per-image detections."""
+        path, im, *rest = x
         # Inference
         with dt[1]: # dt[1]은 추론 시간을 측정하기 위한 프로파일러
-            visualize = increment_path(save_dir / Path(path).stem, mkdir=True) if visualize else False
+            vis = increment_path(save_dir / Path(path).stem, mkdir=True) if visualize else False
             # OpenVINO XML 모델이고 배치 크기가 1 이상일 때 동작합니다. 배치 내의 각 이미지에 대해 개별적으로 추론을 수행하고, 결과를 pred에 누적합니다. augment는 데이터 augmentation 여부, visualize는 시각화 여부를 결정
             if model.xml and im.shape[0] > 1:
                 pred = None
-                for image in ims:
+                for image in torch.chunk(im, im.shape[0], 0):
                     if pred is None:
-                        pred = model(image, augment=augment, visualize=visualize).unsqueeze(0)
+                        pred = model(image, augment=augment, visualize=vis).unsqueeze(0)
                     else:
-                        pred = torch.cat((pred, model(image, augment=augment, visualize=visualize).unsqueeze(0)), dim=0)
+                        pred = torch.cat((pred, model(image, augment=augment, visualize=vis).unsqueeze(0)), dim=0)
                 pred = [pred, None]
             # 그 외의 경우에는 im 텐서를 직접 모델에 입력하여 추론을 수행
             else:
-                pred = model(im, augment=augment, visualize=visualize)
+                pred = model(im, augment=augment, visualize=vis)
             # 결과를 pred에 저장
         # NMS
         with dt[2]:
@@ -185,19 +381,33 @@ def run(
 
         # Second-stage classifier (optional)
         # pred = utils.general.apply_classifier(pred, classifier_model, im, im0s)
-
-        # Define the path for the CSV file
-        csv_path = save_dir / "predictions.csv"
-
-        # Create or append to the CSV file : csv 파일에 이미지와 정확도 등등을 기록
-        def write_to_csv(image_name, prediction, confidence):
-            """Writes prediction data for an image to a CSV file, appending if the file exists."""
-            data = {"Image Name": image_name, "Prediction": prediction, "Confidence": confidence}
-            with open(csv_path, mode="a", newline="") as f:
-                writer = csv.DictWriter(f, fieldnames=data.keys())
-                if not csv_path.is_file():
-                    writer.writeheader()
-                writer.writerow(data)
+        return path, im.shape[2:], *rest, pred
+
+    def pooled(items):
+        """Yields decoded items in order with their detections from the process `pool`, keeping its ring slots busy."""
+        nms = dict(conf_thres=conf_thres, iou_thres=iou_thres, classes=classes, agnostic=agnostic_nms, max_det=max_det)
+        window = deque()  # (item, frame futures) in submission order
+        for x in items:
+            ims = x[2] if isinstance(x[2], list) else [x[2]]
+            window.append((x, [pool.submit(im0, **nms) for im0 in ims]))  # blocks while every slot is in use
+            while len(window) > pool.ring.slots:
+                yield collect(*window.popleft())
+        while window:
+            yield collect(*window.popleft())
+
+    def collect(x, futures):
+        """Returns pooled item `x` with the letterbox shape and detections of its frames, waiting for the workers."""
+        path, _, *rest = x
+        with dt[1]:
+            out = [f.result() for f in futures]
+        return path, out[0][1], *rest, [torch.from_numpy(det) for det, _ in out]
+
+    @smart_inference_mode()
+    def postprocess(x):
+        """Rescales, records and mosaics the detections of an inferred item and returns the frames ready to save."""
+        nonlocal seen, start
+        path, shape, im0s, s, last, mode, info, pred = x
+        done = []
 
         # Process predictions
         # pred 리스트에서 하나씩 객체 탐지 결과(det)를 가져와 처리
@@ -206,29 +416,34 @@ def run(
 
         for i, det in enumerate(pred):  # per image
             seen += 1
+            j, frame = i, last  # j: 스트림 인덱스 (비디오 writer, 얼굴 트래커 구분)
             if webcam:  # batch_size >= 1
                 # path[i]는 현재 이미지의 경로, im0s[i]는 원본 이미지, s는 출력 문자열이며, 여기에 인덱스를 추가
-                p, im0, frame = path[i], im0s[i].copy(), dataset.count
+                p, im0 = path[i], im0s[i].copy()
                 s += f"{i}: "
+            elif isinstance(im0s, list):  # --batch: 같은 영상의 연속 프레임 묶음, i번째 프레임
+                p, im0, j, frame = path, im0s[i], 0, last - len(pred) + 1 + i
             else:
                 # im0s는 원본 이미지 리스트
-                p, im0, frame = path, im0s.copy(), getattr(dataset, "frame", 0)
+                p, im0 = path, im0s.copy()
             
-            p = Path(p)  # to Path
+            p = Path(urlsplit(p).path if is_url else p)  # to Path, URL은 쿼리 제외한 파일 이름으로 저장
             # 결과 저장 경로(save_path)와 텍스트 파일 경로(txt_path) 
             # 텍스트 파일 이름에는 frame 번호가 추가됨
             save_path = str(save_dir / p.name)  # im.jpg
-            txt_path = str(save_dir / "labels" / p.stem) + ("" if dataset.mode == "image" else f"_{frame}")  # im.txt
-            s += "%gx%g " % im.shape[2:]  # print string
+            txt_path = str(save_dir / "labels" / p.stem) + ("" if mode == "image" else f"_{frame}")  # im.txt
+            s += "%gx%g " % shape  # print string
             gn = torch.tensor(im0.shape)[[1, 0, 1, 0]]  # normalization gain whwh
             imc = im0.copy() if save_crop else im0  # for save_crop
-            # 이미지에 "바운딩 박스"와 "레이블"을 그리기 위한 Annotator 객체도 생성
-            annotator = Annotator(im0, line_width=line_thickness, example=str(names))
+            face_dets = []  # (x1, y1, x2, y2, conf) face boxes to compare with the reference
+            faces = []  # (x1, y1, x2, y2, track, check) face boxes to mosaic unless verified, check: needs embedding
 
             # 객체 탐지 결과를 후처리하고 출력하는 과정, len(det) -> det이 안비어있을 경우에 
             if len(det):
                 # Rescale boxes from img_size to im0 size
-                det[:, :4] = scale_boxes(im.shape[2:], det[:, :4], im0.shape).round()
+                det[:, :4] = scale_boxes(shape, det[:, :4], im0.shape).round()
+                if record is not None:  # 강도/클래스만 바꾼 재요청은 모델 없이 이 기록으로 다시 모자이크
+                    record.add(p.name, frame, det[:, :6].cpu().numpy())
 
                 # Print results
                 for c in det[:, 5].unique():
@@ -240,8 +455,8 @@ def run(
                 print(reference_path)
 
                 # Write results
-                # 각 객체의 바운딩 박스 좌표(xyxy), 신뢰도(conf), 클래스(cls)를 가져옵니다.
-                for *xyxy, conf, cls in reversed(det):
+                # 각 객체의 바운딩 박스 좌표(xyxy), 신뢰도(conf), 클래스(cls)를 가져옵니다. (라벨/CSV/crop 저장 시에만 박스 단위 루프)
+                for *xyxy, conf, cls in reversed(det) if save_csv or save_txt or save_crop else ():
                     c = int(cls)  # integer class
                     label = names[c] if hide_conf else f"{names[c]}"
                     confidence = float(conf)
@@ -256,113 +471,141 @@ def run(
                         with open(f"{txt_path}.txt", "a") as f:
                             f.write(("%g " * len(line)).rstrip() % line + "\n")
 
-                    if save_img or save_crop or view_img:  # Add bbox to image
-                        c = int(cls)  # integer class
-                        if names[c] == 'cigar':
-                            if cigar:
-                                x1, y1, x2, y2 = map(int, xyxy)
-                                roi = im0[y1:y2, x1:x2]
-                                roi = cv2.resize(roi, (0, 0), fx=5/ratio, fy=5/ratio)  # 모자이크 처리할 영역 축소
-                                roi = cv2.resize(roi, (x2 - x1, y2 - y1), interpolation=cv2.INTER_NEAREST)  # 원래 크기로 확대
-                                im0[y1:y2, x1:x2] = roi
-
-                        if names[c] == 'licensePlate':
-                            if carNumber:
-                                x1, y1, x2, y2 = map(int, xyxy)
-                                roi = im0[y1:y2, x1:x2]
-                                roi = cv2.resize(roi, (0, 0), fx=5/ratio, fy=5/ratio)  # 모자이크 처리할 영역 축소
-                                roi = cv2.resize(roi, (x2 - x1, y2 - y1), interpolation=cv2.INTER_NEAREST)  # 원래 크기로 확대
-                                im0[y1:y2, x1:x2] = roi
-
-                        if names[c] == 'knife':
-                            if knife:
-                                x1, y1, x2, y2 = map(int, xyxy)
-                                roi = im0[y1:y2, x1:x2]
-                                roi = cv2.resize(roi, (0, 0), fx=5/ratio, fy=5/ratio)  # 모자이크 처리할 영역 축소
-                                roi = cv2.resize(roi, (x2 - x1, y2 - y1), interpolation=cv2.INTER_NEAREST)  # 원래 크기로 확대
-                                im0[y1:y2, x1:x2] = roi
-
-                        if names[c] == 'face':
-                            # bounding box 좌표 추출
-                            # 탐지된 객체의 바운딩 박스 좌표(xyxy)를 정수형으로 변환하여 x1, y1, x2, y2에 저장합니다. 그리고 원본 이미지(im0)에서 해당 영역(roi)을 추출합니다.
-                            if face:
-                                x1, y1, x2, y2 = map(int, xyxy)
-                                face0 = im0[y1:y2, x1:x2]
-
-                                face_array = np.array(face0)
-                                if allowed_file(reference_path):
-                                    try:
-                                        result = DeepFace.verify(
-                                            img1_path= reference_path,
-                                            img2_path= face_array,
-                                            enforce_detection=False,
-                                        )
-                                        print("얼굴 비교 시도")
-                                        if not result['verified']:
-                                            # reference_face가 없는 경우 모든 얼굴 모자이크 처리
-                                            roi = im0[y1:y2, x1:x2]
-                                            # 모자이크 처리 -> 0.05일때 진했음(작을수록 진해짐)
-                                            roi = cv2.resize(roi, (0, 0), fx=5/ratio, fy=5/ratio)  # 모자이크 처리할 영역 축소
-                                            roi = cv2.resize(roi, (x2 - x1, y2 - y1), interpolation=cv2.INTER_NEAREST)  # 원래 크기로 확대
-                                            # 모자이크 적용
-                                            # 원본 이미지(im0)의 해당 영역에 모자이크 처리된 roi를 대입
-                                            im0[y1:y2, x1:x2] = roi
-                                    except ValueError as e:
-                                        print(f"Error comparing reference face: {e}")
-                                else:
-                                    print("그냥 모자이크 처리")
-                                    roi = im0[y1:y2, x1:x2]
-                                    roi = cv2.resize(roi, (0, 0), fx=5/ratio, fy=5/ratio)  # 모자이크 처리할 영역 축소
-                                    roi = cv2.resize(roi, (x2 - x1, y2 - y1), interpolation=cv2.INTER_NEAREST)  # 원래 크기로 확대
-                                    im0[y1:y2, x1:x2] = roi
-                        # else:
-                        #     print("그냥 모자이크 처리")
-                        #     roi = im0[y1:y2, x1:x2]
-                        #     roi = cv2.resize(roi, (0, 0), fx=5/ratio, fy=5/ratio)  # 모자이크 처리할 영역 축소
-                        #     roi = cv2.resize(roi, (x2 - x1, y2 - y1), interpolation=cv2.INTER_NEAREST)  # 원래 크기로 확대
-                        #     im0[y1:y2, x1:x2] = roi
-                        # else:
-                            # 그리고 hide_labels와 hide_conf 옵션에 따라 출력할 레이블 텍스트를 결정
-                            # label = None if hide_labels else (names[c] if hide_conf else f"{names[c]} {conf:.2f}")
-                            # xyxy는 바운딩 박스 좌표, label은 레이블 텍스트, colors는 클래스별 색상을 결정하는 함수입니다.
-                            # annotator.box_label(xyxy, label, color=colors(c, True))
                     if save_crop:
                         save_one_box(xyxy, imc, file=save_dir / "crops" / names[c] / f"{p.stem}.jpg", BGR=True)
                         #save_crop 옵션이 True이면, save_one_box 함수를 호출하여 잘린 객체 이미지를 저장합니다. xyxy는 바운딩 박스 좌표, imc는 원본 이미지의 복사본입니다. 저장 경로는 save_dir/crops/클래스이름/파일이름.jpg입니다. BGR=True는 OpenCV의 BGR 색상 포맷을 사용한다는 의미
 
-            # Stream results
-            # im0 = annotator.result() # YOLOv5 모델의 결과를 이미지로 반환하는 메서드
-            if view_img:
-                if platform.system() == "Linux" and p not in windows: # 리눅스 환경 이미지 출력
-                    windows.append(p)
-                    cv2.namedWindow(str(p), cv2.WINDOW_NORMAL | cv2.WINDOW_KEEPRATIO)  # allow window resize (Linux)
-                    cv2.resizeWindow(str(p), im0.shape[1], im0.shape[0])
-                cv2.imshow(str(p), im0)
-                cv2.waitKey(1)  # 1 millisecond
-
-            # Save results (image with detections)
-            if save_img:
-                if dataset.mode == "image": # 이미지 im0를 save_path에 저장
-                    cv2.imwrite(save_path, im0)
-                else:  # 'video' or 'stream'
-                    if vid_path[i] != save_path:  # vid_path[i]가 save_path와 다르면 새로운 비디오 파일을 여는 것
-                        vid_path[i] = save_path   
-                        if isinstance(vid_writer[i], cv2.VideoWriter):
-                            vid_writer[i].release()  # 이전에 열린 vid_writer[i]가 있다면 해제
-                        if vid_cap:  # video이면 vid_cap에서 FPS, 가로 해상도, 세로 해상도를 가져옵니다.
-                            fps = vid_cap.get(cv2.CAP_PROP_FPS)
-                            w = int(vid_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                            h = int(vid_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                            # 비트레이트 설정
-                            # bitrate = vid_cap.get(cv2.CAP_PROP_BITRATE)
-                        else:  # stream
-                            fps, w, h = 30, im0.shape[1], im0.shape[0]
-                        save_path = str(Path(save_path).with_suffix(".mp4"))  # force *.mp4 suffix on results videos 코덱 -> 코덱의 종류가 다를 경우 문제가 될 수 있음. 찾아봐야함.
-                        vid_writer[i] = cv2.VideoWriter(save_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
-                    vid_writer[i].write(im0)
+                # 클래스별 박스를 한 번에 디스패치 테이블의 처리 함수로 전달 (클래스별 시간 측정)
+                if save_img or save_crop or view_img:
+                    d = det.cpu().numpy()
+                    for c, action in actions.items():
+                        k = d[:, 5] == c
+                        if k.any():
+                            with dt_cls[names[c]]:
+                                handlers[action](im0, d[k, :4], d[k, 4], face_dets)
+
+            if reference_emb is not None:
+                if mode == "image":
+                    faces = [(*box, None, True) for *box, _ in face_dets]
+                else:
+                    # 영상은 얼굴을 트랙으로 묶어 검증 결과를 재사용, K 프레임마다 또는 신뢰도 하락 시에만 재검증
+                    tracker = trackers.setdefault((j, str(p)), IoUTracker(recheck=face_recheck))
+                    matches = tracker.update([box for *box, _ in face_dets], [c for *_, c in face_dets])
+                    for (*box, _), (track, iou) in zip(face_dets, matches):
+                        check = tracker.needs_verification(track, iou, frame)
+                        if check:
+                            track.verified_at = frame
+                        faces.append((*box, track, check))
+                    h, w = im0.shape[:2]
+                    for track in tracker.coasting():  # 잠깐 놓친 얼굴도 예측 위치에 모자이크 유지 (깜빡임 방지)
+                        x1, y1, x2, y2 = track.box.round().astype(int).clip(0, [w, h, w, h])
+                        if x2 > x1 and y2 > y1:
+                            faces.append((x1, y1, x2, y2, track, False))
+
+            # 얼굴 비교는 face_window 프레임 단위로 모아서 한 번에 처리한 뒤 프레임을 순서대로 출력/저장
+            pending.append((j, p, im0, save_path, info, mode, frame, faces))
+            if len(pending) >= face_window:
+                done += flush_faces()
 
         # Print time (inference-only)
         LOGGER.info(f"{s}{'' if len(det) else '(no detections), '}{dt[1].dt * 1E3:.1f}ms")
+        return done
+
+    def replay_frames(x):
+        """Mosaics a decoded item from the recorded `replay` detections and face verdicts, returning frames to save."""
+        nonlocal seen
+        path, im, im0s, s, last, mode, info = x
+        ims = im0s if isinstance(im0s, list) else [im0s.copy()]
+        p = Path(urlsplit(path).path if is_url else path)
+        done = []
+        for i, im0 in enumerate(ims):
+            seen += 1
+            frame = last - len(ims) + 1 + i
+            det, face_boxes, keep = replay.get(p.name, frame)
+            # 원래 실행과 같은 순서로 모자이크 (클래스 순서대로, reference 비교 얼굴은 마지막)
+            for c, action in actions.items():
+                with dt_cls[names[c]]:
+                    if action == "mosaic":
+                        apply_mosaic(im0, det[det[:, 5] == c, :4], ratio=ratio, mode=mosaic_mode)
+                    else:
+                        apply_mosaic(im0, face_boxes[~keep], ratio=ratio, mode=mosaic_mode)
+            done.append((0, p, im0, str(save_dir / p.name), info, mode))
+        LOGGER.info(f"{s}(replay)")
+        return done
+
+    # 입력 버퍼: 파이프라인에선 큐에 대기 중인 프레임 + 추론 중인 프레임이 버퍼를 잡고 있으므로 그만큼 돌려 씀
+    if model is not None:
+        n = pipeline_queue + 2 if pipeline else 1
+        letterboxes = LetterboxBuffers(imgsz, stride, auto=pt, device=model.device, half=model.fp16, n=n)
+
+    # Run inference
+    if not preloaded:
+        model.warmup(imgsz=(1 if pt or model.triton else bs, 3, *imgsz))  # warmup
+    seen, windows, dt = 0, [], (Profile(device=device), Profile(device=device), Profile(device=device))
+    # seen: 추론한 이미지 수를 카운트하는 변수 windows: 추론 결과를 시각화하기 위한 창을 저장할 리스트 dt: 추론 시간을 측정하기 위한 프로파일러 객체들
+    start = time.time()
+    if replay is not None:
+        # 기록된 탐지 결과로 모자이크만 다시 적용: 디코딩 -> 모자이크 -> 인코딩 (모델, 얼굴 비교 없음)
+        assert not webcam, "replay requires file sources"
+        if pipeline:
+            pipe = Pipeline(
+                (decode(*x) for x in dataset),
+                [Stage("mosaic", replay_frames, many=True), Stage("encode", lambda x: save_result(*x))],
+                maxsize=pipeline_queue,
+            )
+            pipe.run()
+            LOGGER.info(pipe.summary())
+        else:
+            for x in dataset:
+                for y in replay_frames(decode(*x)):
+                    save_result(*y)
+    elif pool is not None:
+        # 프로세스 풀: 디코딩한 프레임을 공유 메모리 슬롯 수만큼 미리 워커들에 넘기고 결과는 순서대로 받아 모자이크 -> 인코딩
+        assert not webcam, "processes require file sources"
+        try:
+            if pipeline:
+                pipe = Pipeline(
+                    pooled(decode(*x) for x in dataset),
+                    [
+                        Stage("mosaic", postprocess, many=True, final=flush_faces),
+                        Stage("encode", lambda x: save_result(*x)),
+                    ],
+                    maxsize=pipeline_queue,
+                )
+                pipe.run()
+                LOGGER.info(pipe.summary())
+            else:
+                for x in pooled(decode(*x) for x in dataset):
+                    for y in postprocess(x):
+                        save_result(*y)
+                for y in flush_faces():  # remaining frames of the last window
+                    save_result(*y)
+        finally:
+            if own_pool:
+                pool.close()
+    elif pipeline:
+        # 디코딩 -> letterbox/전처리 -> 추론/NMS -> 모자이크 -> 인코딩을 각각의 스레드로 겹쳐 실행 (큐 크기 제한으로 backpressure)
+        pipe = Pipeline(
+            (decode(*x) for x in dataset),
+            [
+                Stage("preprocess", preprocess),
+                Stage("infer", infer),
+                Stage("mosaic", postprocess, many=True, final=flush_faces),
+                Stage("encode", lambda x: save_result(*x)),
+            ],
+            maxsize=pipeline_queue,
+        )
+        pipe.run()
+        LOGGER.info(pipe.summary())
+    else:
+        for x in dataset:
+            for y in postprocess(infer(preprocess(decode(*x)))):
+                save_result(*y)
+        for y in flush_faces():  # remaining frames of the last window
+            save_result(*y)
+    for vw in vid_writer:
+        if vw is not None:
+            vw.release()  # finalize videos before returning their paths
     end = time.time()
     print(f"{end - start:.5f} sec")
     # Print results
@@ -370,11 +613,17 @@ def run(
     t = tuple(x.t / seen * 1e3 for x in dt)  # x.t / seen * 1e3는 각 이미지당 걸린 시간을 밀리초 단위로 변환
     # t는 전처리, 추론, NMS 시간의 튜플로 저장
     LOGGER.info(f"Speed: %.1fms pre-process, %.1fms inference, %.1fms NMS per image at shape {(1, 3, *imgsz)}" % t)
+    if dt_cls:
+        LOGGER.info("Mosaic: " + ", ".join(f"{x.t / seen * 1E3:.1f}ms {n}" for n, x in dt_cls.items()) + " per image")
     if save_txt or save_img:
         s = f"\n{len(list(save_dir.glob('labels/*.txt')))} labels saved to {save_dir / 'labels'}" if save_txt else ""
         LOGGER.info(f"Results saved to {colorstr('bold', save_dir)}{s}")
     if update:
         strip_optimizer(weights[0])  # update model (to fix SourceChangeWarning)
+    if record_path:
+        record.save(record_path)
+        LOGGER.info(f"Detections recorded to {colorstr('bold', record_path)}")
+    return outputs
 
 
 def parse_opt():
@@ -410,10 +659,21 @@ def parse_opt():
     parser.add_argument("--vid-stride", type=int, default=1, help="video frame-rate stride")
     parser.add_argument('--ratio', type=int, default=50, help='multiple ratio to mosaic_ratio')
     parser.add_argument("--reference", type=str, help="reference face image path")
-    parser.add_argument("--carNumber", default=False, help="mosaic options")
-    parser.add_argument("--face", default=False, help="mosaic options")
-    parser.add_argument("--knife", default=False, help="mosaic options")
-    parser.add_argument("--cigar", default=False, help="mosaic options")
+    parser.add_argument("--carNumber", type=str2bool, nargs="?", const=True, default=False, help="mosaic options")
+    parser.add_argument("--face", type=str2bool, nargs="?", const=True, default=False, help="mosaic options")
+    parser.add_argument("--knife", type=str2bool, nargs="?", const=True, default=False, help="mosaic options")
+    parser.add_argument("--cigar", type=str2bool, nargs="?", const=True, default=False, help="mosaic options")
+    parser.add_argument("--face-window", type=int, default=1, help="frames per batched face verification pass")
+    parser.add_argument("--face-recheck", type=int, default=30, help="video frames between tracked face re-checks")
+    parser.add_argument("--mosaic-mode", default="pixelate", choices=MOSAIC_MODES, help="mosaic style")
+    parser.add_argument("--no-audio", dest="keep_audio", action="store_false", help="do not copy source audio")
+    parser.add_argument("--pipeline", action="store_true", help="threaded decode/infer/mosaic/encode pipeline")
+    parser.add_argument("--pipeline-queue", type=int, default=4, help="frames buffered between pipeline stages")
+    parser.add_argument("--batch", type=int, default=1, help="video frames per inference batch (file sources)")
+    parser.add_argument("--record", type=str, default=None, help="save raw detections and face verdicts to *.npz")
+    parser.add_argument("--replay", type=str, default=None, help="re-mosaic from a --record *.npz without the model")
+    parser.add_argument("--processes", type=int, default=0, help="inference worker processes (shared-memory frames)")
+    parser.add_argument("--threads", type=int, default=1, help="intra-op threads per inference worker process")
 
 
     opt = parser.parse_args()
@@ -0,0 +1,514 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""
+Run latency benchmarks for the mosaic service.
+
+Benchmark                   | `--bench`     | Compares
+---                         | ---           | ---
+Request latency             | `worker`      | `python detect.py` subprocess per request vs resident MosaicWorker
+Face verification per frame | `faces`       | DeepFace.verify() per face vs cached reference, per-face and batched crops
+Mosaic kernel per frame     | `mosaic`      | per-box double cv2.resize vs apply_mosaic() modes, 1/10/100 boxes
+Video inference per frame   | `batch`       | detect.run() on a video file with --batch 1/2/4/8
+Process pool scaling        | `pool`        | detect.run() in-process vs ModelPool with 1/2/4/.. worker processes
+NMS per image               | `nms`         | non_max_suppression() without vs with --nms-topk prefilter, 1k-30k boxes
+Preprocess per frame        | `preprocess`  | letterbox() + ToTensor() vs LetterboxBuffers, time and allocations
+Training image loading      | `dataset`     | load_image() epochs from source images vs disk shards, cold and warm cache
+JPEG decode per image       | `decode`      | cv2.imread() + resize vs DCT-scaled imread_scaled() + resize, per resolution
+Training augmentation       | `augment`     | __getitem__() on the CPU vs BatchAugment on --device, images/s
+
+Usage:
+    $ python mosaic_benchmarks.py --bench worker --weights 4class.pt --source data/images/bus.jpg --n 20
+    $ python mosaic_benchmarks.py --bench faces --reference croped/face.jpg --source data/images/zidane.jpg --faces 3
+    $ python mosaic_benchmarks.py --bench mosaic --n 100
+    $ python mosaic_benchmarks.py --bench batch --weights 4class.pt --source vid.mp4 --n 3
+    $ python mosaic_benchmarks.py --bench pool --weights 4class.pt --source data/images --n 3 --processes 1 2 4 8
+    $ python mosaic_benchmarks.py --bench nms --n 5
+    $ python mosaic_benchmarks.py --bench preprocess --source vid.mp4 --n 100
+    $ python mosaic_benchmarks.py --bench dataset --source ../datasets/coco128/images/train2017 --n 3
+    $ python mosaic_benchmarks.py --bench decode --source ../datasets/coco128/images/train2017 --n 3
+    $ python mosaic_benchmarks.py --bench augment --source ../datasets/coco128/images/train2017 --n 3 --device 0
+"""
+
+import argparse
+import importlib.util
+import itertools
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import torch
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[0]  # YOLOv5 root directory
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
+ROOT = Path(os.path.relpath(ROOT, Path.cwd()))  # relative
+
+from utils.general import LOGGER, cv2, print_args
+
+COLUMNS = ["Method", "Runs", "Mean (ms)", "p50 (ms)", "p99 (ms)"]
+
+
+def latency_stats(name, t):
+    """Returns a [name, n, mean, p50, p99] row in milliseconds for a list of latencies `t` in seconds."""
+    t = np.asarray(t) * 1e3
+    return [name, len(t), t.mean(), np.percentile(t, 50), np.percentile(t, 99)]
+
+
+def bench_worker(weights, source, n=20, ratio=50, device=""):
+    """Measures per-request latency of the detect.py subprocess path against a warm in-process MosaicWorker."""
+    from worker import MosaicWorker
+
+    opts = dict(ratio=ratio, carNumber=True, face=True, knife=True, cigar=True)
+    y = []
+    with tempfile.TemporaryDirectory() as project:
+        # Subprocess: cold Python, torch, TensorFlow and DeepFace imports plus model load on every request
+        cmd = [sys.executable, str(ROOT / "detect.py"), "--weights", str(weights), "--source", str(source)]
+        cmd += ["--img", "640", "--conf", "0.25", "--device", device, "--project", project]
+        cmd += [f"--{k}={v}" for k, v in opts.items()]
+        t = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            subprocess.run(cmd, check=True, capture_output=True)
+            t.append(time.perf_counter() - t0)
+        y.append(latency_stats("subprocess", t))
+
+        # Worker: models loaded once, excluded from per-request latency
+        worker = MosaicWorker(weights=weights, device=device, scratch=project)
+        t = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            with worker.scratch.request() as save_dir:
+                worker(source, save_dir=save_dir, **opts)
+            t.append(time.perf_counter() - t0)
+        y.append(latency_stats("worker", t))
+    return pd.DataFrame(y, columns=COLUMNS)
+
+
+def random_crops(source, n=3, size=(64, 160), seed=0):
+    """Returns `n` reproducible random square BGR crops from image `source`, standing in for detected faces."""
+    im = cv2.imread(str(source))
+    assert im is not None, f"Image Not Found {source}"
+    rng = np.random.default_rng(seed)
+    h, w = im.shape[:2]
+    crops = []
+    for _ in range(n):
+        s = int(rng.integers(*size))
+        x, y = int(rng.integers(0, w - s)), int(rng.integers(0, h - s))
+        crops.append(im[y : y + s, x : x + s].copy())
+    return crops
+
+
+def bench_faces(reference, source, n=20, faces=3, model_name="VGG-Face"):
+    """Measures per-frame face-verification cost of DeepFace.verify() per face against a cached reference embedding."""
+    from deepface import DeepFace
+
+    from utils.mosaic.faces import FaceVerifier
+
+    crops = random_crops(source, faces)
+    DeepFace.build_model(model_name)  # exclude model build from both timings
+    y = []
+
+    # Before: reference image re-read and re-embedded for every face in every frame
+    t = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        for f in crops:
+            DeepFace.verify(img1_path=str(reference), img2_path=f, model_name=model_name, enforce_detection=False)
+        t.append(time.perf_counter() - t0)
+    y.append(latency_stats("DeepFace.verify", t))
+
+    # After: reference embedded once, each crop embedded and compared by vector distance
+    verifier = FaceVerifier(model_name)
+    t = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        ref = verifier.reference(reference)  # cache hit after the first frame
+        for f in crops:
+            verifier.verify(ref, f)
+        t.append(time.perf_counter() - t0)
+    y.append(latency_stats("cached reference", t))
+
+    # Batched: all crops of the frame embedded in one forward pass
+    t = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        verifier.verify_batch(verifier.reference(reference), crops)
+        t.append(time.perf_counter() - t0)
+    y.append(latency_stats("cached reference, batched", t))
+    return pd.DataFrame(y, columns=COLUMNS)
+
+
+def resize_mosaic(im0, boxes, ratio=50):
+    """Mosaics `boxes` of `im0` in place with the former per-box linear downscale and nearest-neighbour upscale."""
+    for x1, y1, x2, y2 in boxes:
+        roi = im0[y1:y2, x1:x2]
+        roi = cv2.resize(roi, (0, 0), fx=5 / ratio, fy=5 / ratio)
+        im0[y1:y2, x1:x2] = cv2.resize(roi, (x2 - x1, y2 - y1), interpolation=cv2.INTER_NEAREST)
+    return im0
+
+
+def random_boxes(n, shape=(1080, 1920), size=(32, 256), seed=0):
+    """Returns `n` reproducible random int xyxy boxes inside an image of `shape` (h, w)."""
+    rng = np.random.default_rng(seed)
+    h, w = shape
+    s = rng.integers(*size, (n, 2))
+    x1, y1 = rng.integers(0, w - s[:, 0]), rng.integers(0, h - s[:, 1])
+    return np.stack([x1, y1, x1 + s[:, 0], y1 + s[:, 1]], 1)
+
+
+def bench_mosaic(n=100, ratio=50, counts=(1, 10, 100)):
+    """Measures per-frame mosaic cost on a random 1080p frame for the resize loop and each apply_mosaic() mode."""
+    from utils.mosaic.kernels import MOSAIC_MODES, apply_mosaic
+
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (1080, 1920, 3), dtype=np.uint8)
+    methods = {"cv2.resize x2": lambda im, b: resize_mosaic(im, b, ratio)}
+    methods.update({m: lambda im, b, m=m: apply_mosaic(im, b, ratio=ratio, mode=m) for m in MOSAIC_MODES})
+    y = []
+    for k in counts:
+        boxes = random_boxes(k)
+        for name, f in methods.items():
+            t = []
+            for _ in range(n):
+                im = frame.copy()  # copy excluded from timing
+                t0 = time.perf_counter()
+                f(im, boxes)
+                t.append(time.perf_counter() - t0)
+            y.append(latency_stats(f"{name}, {k} boxes", t))
+    return pd.DataFrame(y, columns=COLUMNS)
+
+
+def bench_batch(weights, source, n=3, device="", batches=(1, 2, 4, 8)):
+    """Measures per-frame detect.run() latency on video `source` for micro-batches of consecutive frames."""
+    import detect
+    from models.common import DetectMultiBackend
+    from utils.torch_utils import select_device
+
+    model = DetectMultiBackend(weights, device=select_device(device))
+    model.warmup(imgsz=(1, 3, 640, 640))
+    cap = cv2.VideoCapture(str(source))
+    frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    opts = dict(model=model, source=source, cigar=True, knife=True, carNumber=True, exist_ok=True)
+    y = []
+    with tempfile.TemporaryDirectory() as project:
+        for b in batches:
+            t = []
+            for _ in range(n):
+                t0 = time.perf_counter()
+                detect.run(batch=b, project=project, **opts)
+                t.append((time.perf_counter() - t0) / frames)
+            y.append(latency_stats(f"batch {b}", t))
+    return pd.DataFrame(y, columns=COLUMNS)
+
+
+def count_frames(source):
+    """Returns the number of images plus video frames detect.run() reads from file, directory or glob `source`."""
+    from utils.dataloaders import LoadImages
+
+    dataset = LoadImages(source)
+    return sum(
+        int(cv2.VideoCapture(f).get(cv2.CAP_PROP_FRAME_COUNT)) if video else 1
+        for f, video in zip(dataset.files, dataset.video_flag)
+    )
+
+
+def bench_pool(weights, source, n=3, device="", processes=(1, 2, 4), threads=1):
+    """
+    Measures detect.run() throughput on `source` in-process and with ModelPool worker processes of `threads` each.
+
+    Worker start-up is excluded; speedup is relative to one worker process, which scales near-linearly while processes
+    x threads stays within the physical cores.
+    """
+    import detect
+    from utils.mosaic.procpool import ModelPool
+
+    frames = count_frames(source)
+    opts = dict(weights=weights, source=source, cigar=True, knife=True, carNumber=True, exist_ok=True, keep_audio=False)
+    y, base = [], None
+    with tempfile.TemporaryDirectory() as project:
+        torch.set_num_threads(threads)  # in-process reference with the same per-model thread budget
+        for p in (0, *processes):
+            pool = ModelPool(weights, p, threads, device=device or "cpu") if p else None
+            t = []
+            try:
+                for _ in range(n):
+                    t0 = time.perf_counter()
+                    detect.run(pool=pool, device=device, project=project, **opts)
+                    t.append((time.perf_counter() - t0) / frames)
+            finally:
+                if pool:
+                    pool.close()
+            fps = 1 / np.median(t)
+            base = fps if p == 1 else base
+            name = f"{p} processes x {threads} threads" if p else f"in-process, {threads} threads"
+            y.append([*latency_stats(name, t), fps, fps / base if base and p else None])
+    return pd.DataFrame(y, columns=[*COLUMNS, "Frames/s", "Speedup"])
+
+
+def random_predictions(bs, n, nc=4, size=640, seed=0):
+    """Returns (bs, n, 5 + nc) raw model outputs whose `n` boxes per image all pass conf 0.25, clustered like objects."""
+    g = torch.Generator().manual_seed(seed)
+    objects = torch.rand(bs, max(n // 20, 1), 4, generator=g) * torch.tensor([size, size, size / 4, size / 4])
+    idx = torch.randint(objects.shape[1], (n,), generator=g)
+    p = objects[:, idx]  # ~20 overlapping candidates per object
+    p += torch.randn(p.shape, generator=g) * torch.tensor([4.0, 4.0, 4.0, 4.0])
+    obj = 0.5 + torch.rand(bs, n, 1, generator=g) / 2
+    cls = torch.rand(bs, n, nc, generator=g)
+    best = torch.randint(nc, (bs, max(n // 20, 1), 1), generator=g)  # class of each object, any of nc
+    cls.scatter_add_(2, best[:, idx], torch.full((bs, n, 1), 0.5))  # best class conf * obj > 0.25
+    return torch.cat((p, obj, cls.clamp(max=1)), 2)
+
+
+def same_detections(a, b):
+    """Returns True if detection tensors `a` and `b` hold the same rows, in any order among equal-confidence rows."""
+    a, b = a.cpu().numpy(), b.cpu().numpy()
+    return a.shape == b.shape and np.array_equal(a[np.lexsort(a.T)], b[np.lexsort(b.T)])
+
+
+def bench_nms(n=5, device="", batches=(1, 8), candidates=(1000, 10000, 30000), classes=(4, 80), topk=100):
+    """Measures per-image non_max_suppression() time without and with the `topk` prefilter, and if results match."""
+    from utils.general import non_max_suppression
+    from utils.torch_utils import select_device
+
+    device = select_device(device)
+    y = []
+    for nc, k, bs in itertools.product(classes, candidates, batches):
+        pred = random_predictions(bs, k, nc).to(device)
+        for name, kwargs in ("full", {}), (f"topk {topk}", {"topk": topk}):
+            t = []
+            for _ in range(n):
+                t0 = time.perf_counter()
+                out = non_max_suppression(pred.clone(), max_det=1000, **kwargs)
+                if device.type == "cuda":
+                    torch.cuda.synchronize()
+                t.append((time.perf_counter() - t0) / bs)
+            if not kwargs:
+                ref = out
+            same = all(map(same_detections, ref, out))
+            y.append([*latency_stats(f"{name}, {nc} classes, batch {bs}, {k} boxes", t), same])
+    return pd.DataFrame(y, columns=[*COLUMNS, "Same"])
+
+
+def bench_preprocess(source, n=100):
+    """Measures per-frame time and peak new-array bytes of letterbox() + ToTensor() against LetterboxBuffers."""
+    import tracemalloc
+
+    from utils.augmentations import LetterboxBuffers, ToTensor, letterbox
+
+    cap = cv2.VideoCapture(str(source))  # first frame of a video, or the image
+    ok, im0 = cap.read()
+    cap.release()
+    assert ok, f"cannot read {source}"
+    to_tensor, buffers = ToTensor(), LetterboxBuffers(640, stride=32, auto=True)
+    methods = {
+        "letterbox + ToTensor": lambda: to_tensor(letterbox(im0, 640, stride=32, auto=True)[0])[None],
+        "LetterboxBuffers": lambda: buffers([im0]),
+    }
+    y = []
+    for name, f in methods.items():
+        f()  # warmup, LetterboxBuffers allocates its buffer here
+        t, mb = [], []
+        tracemalloc.start()
+        for _ in range(n):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            t0 = time.perf_counter()
+            im = f()
+            t.append(time.perf_counter() - t0)
+            new = im.nbytes if name.startswith("letterbox") else 0  # ToTensor() float copy, allocated outside tracemalloc
+            mb.append((tracemalloc.get_traced_memory()[1] - base + new) / 1e6)
+        tracemalloc.stop()
+        y.append([*latency_stats(name, t), np.mean(mb)])
+    return pd.DataFrame(y, columns=[*COLUMNS, "Allocated (MB)"])
+
+
+def drop_page_cache(files):
+    """Evicts `files` from the OS page cache for cold reads, posix_fadvise() needs no root unlike drop_caches."""
+    for f in files:
+        fd = os.open(f, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def bench_dataset(source, n=3, imgsz=640):
+    """Measures load_image() per image and per epoch from the source images and from disk shards, cold and warm."""
+    from utils.dataloaders import LoadImagesAndLabels
+
+    y = []
+    for cache in (False, "disk", "disk:jpeg", "disk:lz4"):
+        if cache == "disk:lz4" and not importlib.util.find_spec("lz4"):
+            LOGGER.info("lz4 not installed, skipping disk:lz4")
+            continue
+        dataset = LoadImagesAndLabels(str(source), imgsz, cache_images=cache)
+        files = sorted(dataset.shards.path.glob("*.shard")) if dataset.shards else dataset.im_files
+        mb = sum(os.path.getsize(f) for f in files) / 1e6
+        for cold in True, False:
+            t, epochs = [], []
+            for _ in range(n):
+                if cold:
+                    if dataset.shards:
+                        dataset.shards.close()  # unmap, mapped pages stay cached
+                    drop_page_cache(files)
+                t0 = time.perf_counter()
+                for i in range(dataset.n):
+                    t1 = time.perf_counter()
+                    dataset.load_image(i)[0].copy()  # touch every page like load_mosaic(), shard reads are lazy views
+                    t.append(time.perf_counter() - t1)
+                epochs.append(time.perf_counter() - t0)
+            name = f"{cache or 'images'}, {'cold' if cold else 'warm'} page cache"
+            y.append([*latency_stats(name, t), np.mean(epochs), mb])
+    return pd.DataFrame(y, columns=[*COLUMNS, "Epoch (s)", "Size (MB)"])
+
+
+def bench_decode(source, n=3, imgsz=640):
+    """Measures load_image() decode + resize per image at full resolution vs JPEG DCT scaling, grouped by resolution."""
+    import glob
+    import math
+
+    from utils.dataloaders import imread_scaled
+
+    files = sorted(f for f in glob.glob(str(Path(source) / "*.*")) if f.lower().endswith((".jpg", ".jpeg")))
+
+    def load(f, scaled):
+        """Returns image `f` decoded and resized to `imgsz` like load_image(), and its original (h, w)."""
+        if scaled:
+            im, (h0, w0) = imread_scaled(f, imgsz)
+        else:
+            im = cv2.imread(f)
+            h0, w0 = im.shape[:2]
+        r = imgsz / max(h0, w0)
+        return cv2.resize(im, (math.ceil(w0 * r), math.ceil(h0 * r)), interpolation=cv2.INTER_AREA), (h0, w0)
+
+    t, diff = {}, {}  # (h, w, method) -> latencies, (h, w) -> mean abs pixel differences
+    for _ in range(n):
+        for f in files:
+            t0 = time.perf_counter()
+            full, (h0, w0) = load(f, scaled=False)  # full-resolution decode, the reference
+            t1 = time.perf_counter()
+            im, _ = load(f, scaled=True)
+            t2 = time.perf_counter()
+            t.setdefault((h0, w0, False), []).append(t1 - t0)
+            t.setdefault((h0, w0, True), []).append(t2 - t1)
+            diff.setdefault((h0, w0), []).append(np.abs(im.astype(np.int16) - full.astype(np.int16)).mean())
+    y = []
+    for h, w, scaled in sorted(t, key=lambda x: (-x[0] * x[1], x[2])):
+        name = f"{w}x{h} {'imread_scaled()' if scaled else 'cv2.imread()'}"
+        y.append([*latency_stats(name, t[h, w, scaled]), np.mean(diff[h, w]) if scaled else 0.0])
+    for scaled in False, True:
+        all_t = [x for (*_, s), v in t.items() if s == scaled for x in v]
+        y.append([*latency_stats(f"all {'imread_scaled()' if scaled else 'cv2.imread()'}", all_t), np.nan])
+    return pd.DataFrame(y, columns=[*COLUMNS, "Mean abs diff"])
+
+
+def bench_augment(source, n=3, device="", imgsz=640, batch=16):
+    """Measures augmented batches per `batch` images from __getitem__() + collate_fn vs load_image() + BatchAugment."""
+    import random
+
+    import yaml
+
+    from utils.batch_augmentations import BatchAugment
+    from utils.dataloaders import LoadImagesAndLabels
+    from utils.torch_utils import select_device
+
+    device = select_device(device)
+    hyp = yaml.safe_load((ROOT / "data/hyps/hyp.scratch-low.yaml").read_text())
+    augment = BatchAugment(hyp, imgsz, device)
+    y = []
+    for batched in False, True:  # RAM cache, so both time augmentation only
+        dataset = LoadImagesAndLabels(
+            str(source), imgsz, batch, augment=True, hyp=hyp, cache_images="ram", batch_augment=batched
+        )
+        random.seed(0)
+        t = []
+        for _ in range(n):
+            for b in range(0, dataset.n - batch + 1, batch):
+                t0 = time.perf_counter()
+                if batched:
+                    ims, labels, _, segments = dataset.collate_fn_batch([dataset[i] for i in range(b, b + batch)])
+                    ims, targets = augment(ims, labels, segments)
+                else:
+                    ims, targets, *_ = dataset.collate_fn([dataset[i] for i in range(b, b + batch)])
+                    ims, targets = ims.to(device), targets.to(device)
+                if device.type == "cuda":
+                    torch.cuda.synchronize()
+                t.append(time.perf_counter() - t0)
+        name = f"BatchAugment ({device.type})" if batched else "__getitem__() (cpu)"
+        y.append([*latency_stats(f"{name}, batch {batch}", t), batch / np.mean(t)])
+    return pd.DataFrame(y, columns=[*COLUMNS, "Images/s"])
+
+
+def run(
+    bench="worker",  # benchmark to run
+    weights=ROOT / "4class.pt",  # weights path
+    source=ROOT / "data/images/bus.jpg",  # image or video file
+    n=20,  # number of timed requests or frames
+    ratio=50,  # mosaic ratio
+    device="",  # cuda device, i.e. 0 or 0,1,2,3 or cpu
+    reference=None,  # reference face image for --bench faces
+    faces=3,  # faces per frame for --bench faces
+    processes=(1, 2, 4),  # worker process counts for --bench pool
+    threads=1,  # intra-op threads per model for --bench pool
+):
+    """Runs the selected mosaic service benchmark and prints a results table."""
+    t = time.time()
+    if bench == "worker":
+        py = bench_worker(weights, source, n=n, ratio=ratio, device=device)
+    elif bench == "faces":
+        py = bench_faces(reference, source, n=n, faces=faces)
+    elif bench == "mosaic":
+        py = bench_mosaic(n=n, ratio=ratio)
+    elif bench == "batch":
+        py = bench_batch(weights, source, n=n, device=device)
+    elif bench == "preprocess":
+        py = bench_preprocess(source, n=n)
+    elif bench == "dataset":
+        py = bench_dataset(source, n=n)
+    elif bench == "decode":
+        py = bench_decode(source, n=n)
+    elif bench == "augment":
+        py = bench_augment(source, n=n, device=device)
+    elif bench == "nms":
+        py = bench_nms(n=n, device=device)
+    elif bench == "pool":
+        py = bench_pool(weights, source, n=n, device=device, processes=processes, threads=threads)
+    else:
+        raise ValueError(f"Unknown benchmark '{bench}'")
+    LOGGER.info(f"\nBenchmarks complete ({time.time() - t:.2f}s)")
+    LOGGER.info(str(py.round(2)))
+    return py
+
+
+def parse_opt():
+    """Parses command-line arguments for the mosaic service benchmarks."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bench", type=str, default="worker", help="benchmark to run")
+    parser.add_argument("--weights", type=str, default=ROOT / "4class.pt", help="weights path")
+    parser.add_argument("--source", type=str, default=ROOT / "data/images/bus.jpg", help="image or video file")
+    parser.add_argument("--n", type=int, default=20, help="number of timed requests or frames")
+    parser.add_argument("--ratio", type=int, default=50, help="mosaic ratio")
+    parser.add_argument("--device", default="", help="cuda device, i.e. 0 or 0,1,2,3 or cpu")
+    parser.add_argument("--reference", type=str, help="reference face image for --bench faces")
+    parser.add_argument("--faces", type=int, default=3, help="faces per frame for --bench faces")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4], help="process counts for --bench pool")
+    parser.add_argument("--threads", type=int, default=1, help="intra-op threads per model for --bench pool")
+    opt = parser.parse_args()
+    print_args(vars(opt))
+    return opt
+
+
+def main(opt):
+    """Executes the mosaic service benchmark with provided options."""
+    run(**vars(opt))
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    main(opt)
@@ -0,0 +1,137 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""
+Load-test a running mosaic API with concurrent /detect requests against a local stand-in storage directory.
+
+The server must use the same directory as its LocalStorage (STORAGE_ROOT). Each request gets its own copy of `--source`
+with a unique trailing byte string, so results are computed instead of served from the result cache, unless
+`--repeat` sends the same object every time.
+
+Usage:
+    $ STORAGE_ROOT=runs/storage python app_async.py --port 5001
+    $ python mosaic_loadtest.py --url http://localhost:5001 --root runs/storage --source data/images/bus.jpg --n 200
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import pandas as pd
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[0]  # YOLOv5 root directory
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
+ROOT = Path(os.path.relpath(ROOT, Path.cwd()))  # relative
+
+from mosaic_benchmarks import COLUMNS, latency_stats
+from utils.general import LOGGER, print_args
+
+
+def stage_objects(root, source, n, repeat=False):
+    """Copies `source` into storage `root` as `n` distinct objects (one shared object if `repeat`), returns keys."""
+    root, source = Path(root), Path(source)
+    root.mkdir(parents=True, exist_ok=True)
+    keys = []
+    for i in range(1 if repeat else n):
+        key = f"load_{uuid.uuid4().hex[:8]}{source.suffix}"
+        shutil.copy(source, root / key)
+        with open(root / key, "ab") as f:  # trailing bytes change the content hash, decoders ignore them
+            f.write(key.encode())
+        keys.append(key)
+    return keys * n if repeat else keys
+
+
+def payload(key, ratio=50):
+    """Returns a /detect request body for storage object `key`."""
+    flags = {k: "true" for k in ("carNumber", "face", "knife", "cigar")}
+    return {"original": {"original_file_name": key}, "area": {}, "data": {"intensityAuto": str(ratio), **flags}}
+
+
+async def load(url, keys, concurrency=16, ratio=50, timeout=600):
+    """Posts one /detect request per key with at most `concurrency` in flight, returns (latencies, errors, seconds)."""
+    import aiohttp  # scoped, only the load test and app_async.py need aiohttp
+
+    sem = asyncio.Semaphore(concurrency)
+    t, errors = [], 0
+
+    async def one(session, key):
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                async with session.post(f"{url}/detect", json=payload(key, ratio)) as r:
+                    await r.read()
+                    ok = r.status == 200
+            except aiohttp.ClientError:
+                ok = False
+            if ok:
+                t.append(time.perf_counter() - t0)
+            else:
+                errors += 1
+
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(session, k) for k in keys))
+        dt = time.perf_counter() - t0
+        async with session.get(f"{url}/metrics") as r:
+            metrics = await r.json() if r.status == 200 else None
+    return t, errors, dt, metrics
+
+
+def run(
+    url="http://localhost:5001",  # server base URL
+    root=ROOT / "runs/storage",  # server STORAGE_ROOT
+    source=ROOT / "data/images/bus.jpg",  # image or video uploaded per request
+    n=100,  # number of requests
+    concurrency=16,  # requests in flight
+    ratio=50,  # mosaic ratio
+    repeat=False,  # same object for every request (result cache hits)
+    keep=False,  # keep staged objects and results
+):
+    """Runs the load test and prints throughput and latency percentiles."""
+    keys = stage_objects(root, source, n, repeat)
+    try:
+        t, errors, dt, metrics = asyncio.run(load(url, keys, concurrency, ratio))
+    finally:
+        if not keep:
+            for k in set(keys):
+                for f in Path(root).glob(f"*{Path(k).stem}*"):  # source and mosaic_ result
+                    f.unlink(missing_ok=True)
+    y = pd.DataFrame([latency_stats(f"{concurrency} concurrent", t)], columns=COLUMNS) if t else None
+    LOGGER.info(f"\n{len(t)}/{n} requests ok, {errors} errors in {dt:.1f}s ({len(t) / dt:.1f} requests/s)")
+    if y is not None:
+        LOGGER.info(str(y.round(2)))
+    if metrics:
+        LOGGER.info(f"Server stage latency (ms): {({k: v['p50'] for k, v in metrics.get('latency_ms', {}).items()})}")
+    return y
+
+
+def parse_opt():
+    """Parses command line arguments."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", type=str, default="http://localhost:5001", help="server base URL")
+    parser.add_argument("--root", type=str, default=ROOT / "runs/storage", help="server STORAGE_ROOT directory")
+    parser.add_argument("--source", type=str, default=ROOT / "data/images/bus.jpg", help="image or video file")
+    parser.add_argument("--n", type=int, default=100, help="number of requests")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight")
+    parser.add_argument("--ratio", type=int, default=50, help="mosaic ratio")
+    parser.add_argument("--repeat", action="store_true", help="request the same object every time (cache hits)")
+    parser.add_argument("--keep", action="store_true", help="keep staged objects and results")
+    opt = parser.parse_args()
+    print_args(vars(opt))
+    return opt
+
+
+def main(opt):
+    """Runs the load test with parsed options."""
+    run(**vars(opt))
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    main(opt)
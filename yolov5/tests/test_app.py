@@ -0,0 +1,99 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Tests for the app.py /jobs routes with a stub worker and LocalStorage, no model, DeepFace or S3 needed."""
+
+import shutil
+import time
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_cors")
+pytest.importorskip("dotenv")
+
+import app as service  # noqa: E402
+from utils.mosaic.cache import ResultCache  # noqa: E402
+from utils.mosaic.jobs import JobQueue  # noqa: E402
+from utils.mosaic.storage import LocalStorage  # noqa: E402
+from worker import ScratchSpace  # noqa: E402
+
+ROOT = Path(__file__).resolve().parents[1]  # YOLOv5 root directory
+REQUEST = {
+    "original": {"original_file_name": "bus.jpg"},
+    "area": {},
+    "data": {"intensityAuto": "50", "carNumber": "true", "face": "false", "knife": "true", "cigar": "true"},
+}
+
+
+class StubWorker:
+    """MosaicWorker stand-in that 'mosaics' by copying the input into the request directory."""
+
+    weights_hash, conf_thres, iou_thres = "stub", 0.25, 0.45
+
+    def __init__(self, scratch):
+        """Records calls, using `scratch` for the per-request directories."""
+        self.scratch = scratch
+        self.calls = []
+
+    def __call__(self, source, save_dir=None, **kwargs):
+        """Copies `source` into `save_dir` and returns the copy as the only output."""
+        self.calls.append(kwargs)
+        return [shutil.copy(source, Path(save_dir) / Path(source).name)]
+
+
+@pytest.fixture
+def client(tmp_path):
+    """Returns a Flask test client of app.py with stub services, restoring the lazily built ones afterwards."""
+    assert "worker" not in service.services  # importing app.py loads no model
+    store = LocalStorage(tmp_path / "store")
+    shutil.copy(ROOT / "data/images/bus.jpg", store.root / "bus.jpg")
+    saved = dict(service.services)
+    service.configure(
+        storage=store,
+        worker=StubWorker(ScratchSpace(tmp_path / "scratch")),
+        jobs=JobQueue(workers=1),
+        results=ResultCache(tmp_path / "results"),
+        sidecars=ResultCache(tmp_path / "detections"),
+    )
+    yield service.app.test_client()
+    service.services.clear()
+    service.services.update(saved)
+
+
+def poll(client, job_id, timeout=10):
+    """Polls /jobs/<id> until the job finished and returns its status."""
+    t = time.time() + timeout
+    while True:
+        info = client.get(f"/jobs/{job_id}").get_json()
+        if info["status"] in ("done", "failed") or time.time() > t:
+            return info
+        time.sleep(0.02)
+
+
+def test_job_lifecycle(client):
+    """POST /jobs -> GET /jobs/<id> -> GET /jobs/<id>/result returns the /detect response and uploads the result."""
+    r = client.post("/jobs", json=REQUEST)
+    assert r.status_code == 202
+    job_id = r.get_json()["job_id"]
+    info = poll(client, job_id)
+    assert info["status"] == "done", info
+    assert {"cache", "download", "detect", "upload"} <= info["stages_s"].keys()
+    r = client.get(f"/jobs/{job_id}/result")
+    assert r.status_code == 200
+    assert r.get_json()["file_name"] == "mosaic_bus.jpg"
+    assert (service.get_service("storage").root / "mosaic_bus.jpg").is_file()
+    assert service.get_service("worker").calls[0]["ratio"] == 50
+    assert client.get("/jobs").get_json()["done"] == 1
+
+
+def test_job_errors(client):
+    """Unknown jobs are 404, unsupported files 400, and a failed job's result is 500 with its error."""
+    assert client.get("/jobs/unknown").status_code == 404
+    assert client.get("/jobs/unknown/result").status_code == 404
+    bad = {**REQUEST, "original": {"original_file_name": "notes.txt"}}
+    assert client.post("/jobs", json=bad).status_code == 400
+    missing = {**REQUEST, "original": {"original_file_name": "missing.jpg"}}
+    job_id = client.post("/jobs", json=missing).get_json()["job_id"]
+    assert poll(client, job_id)["status"] == "failed"
+    r = client.get(f"/jobs/{job_id}/result")
+    assert r.status_code == 500 and r.get_json()["error"].startswith("FileNotFoundError")
@@ -0,0 +1,51 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Tests for utils/augmentations.py LetterboxBuffers."""
+
+import numpy as np
+import pytest
+import torch
+
+from utils.augmentations import LetterboxBuffers, ToTensor, letterbox
+
+
+def frames(n, h, w, seed=0):
+    """Returns `n` random BGR uint8 frames of shape (h, w, 3)."""
+    return list(np.random.default_rng(seed).integers(0, 256, (n, h, w, 3), dtype=np.uint8))
+
+
+def reference(ims, new_shape, auto):
+    """Returns `ims` letterboxed with letterbox() and ToTensor(), stacked into a (b, 3, h, w) tensor."""
+    return torch.stack([ToTensor()(letterbox(im, new_shape, auto=auto)[0]) for im in ims])
+
+
+@pytest.mark.parametrize("auto", [True, False])
+@pytest.mark.parametrize("shape", [(480, 640), (640, 480), (333, 517), (640, 640), (100, 120)])
+def test_matches_letterbox_to_tensor(shape, auto):
+    """Output equals letterbox() followed by ToTensor() exactly, padding and resizing included."""
+    ims = frames(2, *shape)
+    im = LetterboxBuffers(320, auto=auto)(ims)
+    assert torch.equal(im, reference(ims, 320, auto))
+
+
+def test_buffers_reused_per_batch_size():
+    """Each batch size allocates `n` buffers once and rotates through them, whatever the input shapes."""
+    lb = LetterboxBuffers(256, n=2)
+    ptrs = []
+    for shape in [(240, 320), (320, 240), (100, 100), (240, 320), (256, 256)]:
+        ims = frames(3, *shape)
+        im = lb(ims)
+        assert torch.equal(im, reference(ims, 256, True))  # padding is refilled when the geometry changes
+        ptrs.append(im.data_ptr())
+    assert len(lb.buffers) == 1 and len(lb.buffers[3]) == 2
+    assert ptrs[0::2] == [ptrs[0]] * 3 and ptrs[1::2] == [ptrs[1]] * 2 and ptrs[0] != ptrs[1]
+
+
+def test_buffers_bounded_across_batch_sizes():
+    """Mixed batch sizes keep at most `n` buffers per size, each sized for the largest output."""
+    lb = LetterboxBuffers(128, n=2)
+    for b in [1, 4, 2, 4, 1, 2, 4, 1]:
+        ims = frames(b, 96, 128, seed=b)
+        assert torch.equal(lb(ims), reference(ims, 128, True))
+    assert sorted(lb.buffers) == [1, 2, 4]
+    for b, ring in lb.buffers.items():
+        assert len(ring) == 2 and all(t.numel() == b * 3 * 128 * 128 for t, _ in ring)
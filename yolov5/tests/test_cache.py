@@ -0,0 +1,89 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Tests for utils/mosaic/cache.py ResultCache."""
+
+import pytest
+
+from utils.mosaic.cache import ResultCache
+
+SIZE = 1000  # result file bytes, entries are a little larger with their meta.json
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """Returns a cache under `tmp_path` that fits three entries."""
+    return ResultCache(tmp_path / "cache", max_bytes=3500)
+
+
+def put(cache, tmp_path, key, fill=b"x"):
+    """Puts a SIZE-byte result of `fill` bytes under `key` and returns the cached path."""
+    f = tmp_path / f"{key}.jpg"
+    f.write_bytes(fill * SIZE)
+    return cache.put(key, f, {"key": key})
+
+
+def test_get_put_and_stats(cache, tmp_path):
+    """Misses return None, hits return the moved result with its meta, and stats() counts both."""
+    assert cache.get("a") is None
+    path = put(cache, tmp_path, "a")
+    assert not (tmp_path / "a.jpg").exists() and path.read_bytes() == b"x" * SIZE
+    got, meta = cache.get("a")
+    assert got == path and meta == {"key": "a", "result": "result.jpg"}
+    cache.release(got)
+    s = cache.stats()
+    assert (s["hits"], s["misses"], s["hit_rate"], s["entries"]) == (1, 1, 0.5, 1)
+    assert SIZE < s["bytes"] < 1200
+
+
+def test_lru_eviction(cache, tmp_path):
+    """Entries beyond `max_bytes` are evicted least recently used first, counting get() as a use."""
+    paths = {k: put(cache, tmp_path, k) for k in "abc"}
+    cache.release(cache.get("a")[0])  # b is now the least recently used
+    put(cache, tmp_path, "d")
+    assert list(cache.index) == ["c", "a", "d"]
+    assert not paths["b"].parent.exists() and paths["a"].exists()
+    s = cache.stats()
+    assert s["evictions"] == 1 and s["bytes"] <= s["max_bytes"]
+    assert s["bytes"] == sum(size for _, size in cache.index.values())
+
+
+def test_pinned_entry_survives_eviction(cache, tmp_path):
+    """An evicted entry leaves the index at once but its files stay until its last reader releases it."""
+    put(cache, tmp_path, "a")
+    path, _ = cache.get("a")
+    path2, _ = cache.get("a")
+    for k in "bcd":
+        put(cache, tmp_path, k)
+    assert "a" not in cache.index and cache.get("a") is None
+    assert path.read_bytes() == b"x" * SIZE
+    cache.release(path)
+    assert path.exists()
+    cache.release(path2)
+    assert not path.parent.exists() and not cache.pins and not cache.retired
+
+
+def test_pinned_entry_survives_replacement(cache, tmp_path):
+    """Putting an existing key serves the new entry while readers of the old one keep its files until release()."""
+    old = put(cache, tmp_path, "a")
+    path, _ = cache.get("a")
+    new = put(cache, tmp_path, "a", fill=b"y")
+    assert new != old and len(cache.index) == 1
+    assert path.read_bytes() == b"x" * SIZE and new.read_bytes() == b"y" * SIZE
+    cache.release(path)
+    assert not old.parent.exists()
+    got, _ = cache.get("a")
+    assert got == new
+    cache.release(got)
+    assert new.exists()
+
+
+def test_oversize_and_restart(cache, tmp_path):
+    """Results larger than the cache are not stored, and a new cache indexes entries left by the last one."""
+    f = tmp_path / "big.jpg"
+    f.write_bytes(b"x" * 4000)
+    assert cache.put("big", f, {}) is None and f.exists()
+    for k in "ab":
+        put(cache, tmp_path, k)
+    (cache.root / ".tmpdead").mkdir()  # entry of a killed process
+    restarted = ResultCache(cache.root, max_bytes=3500)
+    assert set(restarted.index) == {"a", "b"} and restarted.bytes == cache.bytes
+    assert not (cache.root / ".tmpdead").exists()
@@ -0,0 +1,59 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Tests for utils/dataloaders.py labels cache updates."""
+
+import os
+
+import numpy as np
+import pytest
+
+from utils.dataloaders import LoadImagesAndLabels
+from utils.general import cv2
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    """Returns a dataset directory of 4 images with one label each, in images/ and labels/."""
+    (tmp_path / "images").mkdir()
+    (tmp_path / "labels").mkdir()
+    for i in range(4):
+        cv2.imwrite(str(tmp_path / "images" / f"{i}.jpg"), np.full((64, 96, 3), 60 * i, np.uint8))
+        (tmp_path / "labels" / f"{i}.txt").write_text(f"{i} 0.5 0.5 0.2 0.2\n")
+    return tmp_path
+
+
+def load(path):
+    """Returns {image name: labels} of the dataset in `path`."""
+    d = LoadImagesAndLabels(str(path / "images"), 64, batch_size=1)
+    return {os.path.basename(f): lb for f, lb in zip(d.im_files, d.labels)}
+
+
+def test_cache_reused(dataset):
+    """A second load reads labels.cache without re-verifying, and returns the same labels."""
+    a = load(dataset)
+    assert (dataset / "labels.cache").is_file()
+    mtime = (dataset / "labels.cache").stat().st_mtime_ns
+    b = load(dataset)
+    assert (dataset / "labels.cache").stat().st_mtime_ns == mtime  # not rewritten
+    assert a.keys() == b.keys() and all(np.array_equal(a[k], b[k]) for k in a)
+
+
+def test_label_edited_in_place(dataset):
+    """A label rewritten in place, which leaves its directory mtime unchanged, is re-verified."""
+    load(dataset)
+    label = dataset / "labels" / "1.txt"
+    st = os.stat(dataset / "labels")
+    label.write_text("3 0.25 0.25 0.1 0.1\n")  # same size
+    os.utime(label, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    os.utime(dataset / "labels", ns=(st.st_atime_ns, st.st_mtime_ns))  # directory unchanged
+    assert np.allclose(load(dataset)["1.jpg"], [[3, 0.25, 0.25, 0.1, 0.1]])
+
+
+def test_files_added_and_removed(dataset):
+    """New images are verified, deleted ones dropped and the others kept from the cache."""
+    load(dataset)
+    (dataset / "images" / "0.jpg").unlink()
+    cv2.imwrite(str(dataset / "images" / "4.jpg"), np.zeros((64, 96, 3), np.uint8))
+    (dataset / "labels" / "4.txt").write_text("2 0.5 0.5 0.4 0.4\n")
+    labels = load(dataset)
+    assert sorted(labels) == ["1.jpg", "2.jpg", "3.jpg", "4.jpg"]
+    assert labels["4.jpg"][:, 0].tolist() == [2] and labels["2.jpg"][:, 0].tolist() == [2]
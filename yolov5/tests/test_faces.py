@@ -0,0 +1,47 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Tests for utils/mosaic/faces.py reference-face verification."""
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from utils.general import cv2
+from utils.mosaic.faces import EmbeddingCache, FaceVerifier
+
+ROOT = Path(__file__).resolve().parents[1]  # YOLOv5 root directory
+
+
+def test_preprocess_keeps_bgr():
+    """Crops reach the model in the BGR order DeepFace.represent() uses for the reference embedding."""
+    verifier = FaceVerifier.__new__(FaceVerifier)  # preprocess() only needs the input size, no DeepFace model
+    verifier.input_size = (224, 224)
+    crop = np.zeros((50, 100, 3), np.uint8)
+    crop[..., 0] = 255  # pure blue in BGR
+    x = verifier.preprocess(crop)
+    assert x.shape == (224, 224, 3) and x.dtype == np.float32
+    assert x[112, 112].tolist() == [1, 0, 0]
+    assert x[:56].max() == 0 and x[-56:].max() == 0  # centered zero padding above and below
+
+
+def test_embedding_cache_lru():
+    """The embedding cache evicts the least recently used entry."""
+    cache = EmbeddingCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # a is now most recent
+    cache.put("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1 and len(cache) == 2
+
+
+def test_embed_matches_represent():
+    """Batched embeddings of crops match DeepFace.represent() of the same crops, so distances to the reference hold."""
+    pytest.importorskip("deepface")
+    verifier = FaceVerifier()
+    if verifier.net is None:
+        pytest.skip(f"{verifier.model_name} has no batched path")
+    im = cv2.imread(str(ROOT / "data/images/zidane.jpg"))
+    crops = [im[60:360, 150:450], im[180:420, 720:960]]
+    batched = verifier.embed(crops)
+    single = np.stack([verifier.represent(c) for c in crops])
+    assert verifier.distance(batched, single).max() < 1e-3
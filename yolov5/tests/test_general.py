@@ -0,0 +1,63 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Tests for utils/general.py non_max_suppression(), with and without the `topk` prefilter."""
+
+import pytest
+import torch
+
+from utils.general import _ranked_below, non_max_suppression
+
+
+def predictions(bs, n, nc, seed=0):
+    """Returns (bs, n, 5 + nc) raw outputs of overlapping boxes, ~10 candidates per object, all with obj > 0.5."""
+    g = torch.Generator().manual_seed(seed)
+    objects = torch.rand(bs, n // 10, 4, generator=g) * torch.tensor([640, 640, 160, 160])
+    x = objects[:, torch.randint(n // 10, (n,), generator=g)]
+    x += torch.randn(x.shape, generator=g) * 4
+    obj = 0.5 + torch.rand(bs, n, 1, generator=g) / 2
+    return torch.cat((x, obj, torch.rand(bs, n, nc, generator=g)), 2)
+
+
+def test_nms_batch_matches_single_images():
+    """Every image of a batch gets the detections it gets on its own, for images late in large batches too."""
+    pred = predictions(16, 200, 80)
+    out = non_max_suppression(pred.clone(), max_det=1000)
+    assert len(out) == 16
+    for x, y in zip(pred, out):
+        assert torch.equal(non_max_suppression(x[None].clone(), max_det=1000)[0], y)
+        assert y.shape[1] == 6 and (y[:, 4] > 0.25).all()
+
+
+def test_nms_max_det_and_classes():
+    """`max_det` bounds the detections per image and `classes` keeps only the requested classes."""
+    pred = predictions(2, 500, 4)
+    assert all(len(y) <= 5 for y in non_max_suppression(pred.clone(), conf_thres=0.01, max_det=5))
+    for y in non_max_suppression(pred.clone(), classes=[1, 3]):
+        assert set(y[:, 5].tolist()) <= {1.0, 3.0}
+
+
+@pytest.mark.parametrize("multi_label", [False, True])
+@pytest.mark.parametrize("conf_thres", [0.001, 0.25, 0.6])
+def test_topk_lossless_above_candidates(conf_thres, multi_label):
+    """With `topk` at least the candidates per class, only the lossless conf prefilter applies and outputs match."""
+    pred = predictions(4, 1000, 20, seed=1)
+    kw = dict(conf_thres=conf_thres, multi_label=multi_label, max_det=3000)
+    for y, z in zip(non_max_suppression(pred.clone(), **kw), non_max_suppression(pred.clone(), topk=5000, **kw)):
+        assert torch.equal(y.unique(dim=0), z.unique(dim=0))  # equal-confidence rows may swap places
+
+
+def test_topk_keeps_best_per_class():
+    """Without suppression, `topk` keeps exactly the `topk` most confident boxes of every class."""
+    pred = predictions(2, 2000, 4, seed=2)
+    kw = dict(conf_thres=0.01, iou_thres=1.0, max_det=10000)  # IoU > 1 never suppresses
+    for y, z in zip(non_max_suppression(pred.clone(), **kw), non_max_suppression(pred.clone(), topk=50, **kw)):
+        for c in range(4):
+            best = y[y[:, 5] == c, 4].sort(descending=True)[0][:50]
+            kept = z[z[:, 5] == c, 4].sort(descending=True)[0]
+            assert len(best) == 50 and torch.equal(kept, best)
+
+
+def test_ranked_below():
+    """The mask keeps the first `n` rows of each group, for empty, short and long groups alike."""
+    g = torch.tensor([0, 0, 0, 2, 3, 3, 3, 3, 3])
+    assert _ranked_below(g, 5, 2).tolist() == [1, 1, 0, 1, 1, 1, 0, 0, 0]
+    assert _ranked_below(g, 5, 9).all()
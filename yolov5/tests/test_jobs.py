@@ -0,0 +1,61 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Tests for utils/mosaic/jobs.py JobQueue."""
+
+import queue
+import threading
+import time
+
+import pytest
+
+from utils.mosaic.jobs import PRIORITY_IMAGE, PRIORITY_VIDEO, JobQueue
+
+
+def wait(job, status=("done", "failed"), timeout=10):
+    """Polls `job` until its status is in `status`, as a client polling /jobs/<id> would."""
+    t = time.time() + timeout
+    while job.status not in status:
+        assert time.time() < t, f"job {job.id} still {job.status}"
+        time.sleep(0.01)
+    return job
+
+
+def test_priorities_and_fifo():
+    """Queued image jobs overtake queued videos, jobs of the same priority run in submission order."""
+    jobs, order, gate = JobQueue(workers=1), [], threading.Event()
+    first = wait(jobs.submit(lambda job: gate.wait(10)), "running")  # occupies the only worker while others queue
+    submitted = []
+    for name in "video0", "image0", "video1", "image1":
+        priority = PRIORITY_VIDEO if name.startswith("video") else PRIORITY_IMAGE
+        submitted.append(jobs.submit(lambda name, job: order.append(name), priority, name=name))
+    assert jobs.stats()["queued"] == 4
+    gate.set()
+    for job in [first, *submitted]:
+        wait(job)
+    assert order == ["image0", "image1", "video0", "video1"]
+
+
+def test_status_result_and_stages():
+    """A job records its result and stage timings, a failing job its error."""
+    jobs = JobQueue(workers=1)
+
+    def work(x, job):
+        with job.stage("download"):
+            pass
+        return x * 2
+
+    ok = wait(jobs.submit(work, x=21))
+    assert ok.status == "done" and ok.result == 42 and "download" in ok.info()["stages_s"]
+    bad = wait(jobs.submit(lambda job: 1 / 0))
+    assert bad.status == "failed" and bad.error.startswith("ZeroDivisionError")
+    assert jobs.get(ok.id) is ok and jobs.get("unknown") is None
+
+
+def test_queue_full():
+    """Submitting beyond `maxsize` queued jobs raises queue.Full and does not register the job."""
+    jobs, gate = JobQueue(workers=1, maxsize=1), threading.Event()
+    wait(jobs.submit(lambda job: gate.wait(10)), "running")
+    jobs.submit(lambda job: None)
+    with pytest.raises(queue.Full):
+        jobs.submit(lambda job: None)
+    assert jobs.stats()["queued"] == 1
+    gate.set()
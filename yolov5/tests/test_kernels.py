@@ -0,0 +1,52 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Tests for utils/mosaic/kernels.py apply_mosaic()."""
+
+import numpy as np
+import pytest
+
+from utils.mosaic.kernels import apply_mosaic
+
+
+@pytest.fixture
+def frame():
+    """Returns a random 120x160 BGR frame."""
+    return np.random.default_rng(0).integers(0, 256, (120, 160, 3), dtype=np.uint8)
+
+
+def test_pixelate_block_means(frame):
+    """Every block of a pixelated box, partial edge blocks included, holds the rounded mean of its pixels."""
+    im = apply_mosaic(frame.copy(), [[10, 20, 57, 53]], ratio=50)  # 47x33 box, 10 px blocks
+    for y in range(20, 53, 10):
+        for x in range(10, 57, 10):
+            block = im[y : min(y + 10, 53), x : min(x + 10, 57)]
+            mean = frame[y : min(y + 10, 53), x : min(x + 10, 57)].reshape(-1, 3).mean(0)
+            assert (block == block[0, 0]).all()
+            assert np.abs(block[0, 0].astype(float) - mean).max() <= 1  # INTER_AREA rounding
+    outside = np.ones(frame.shape[:2], bool)
+    outside[20:53, 10:57] = False
+    assert np.array_equal(im[outside], frame[outside])
+
+
+def test_enabled_classes_and_clipping(frame):
+    """Only boxes of enabled classes are mosaicked, boxes are clipped to the frame and empty boxes skipped."""
+    boxes = [[-20, -20, 30, 30], [100, 60, 140, 100], [50, 50, 50, 90]]  # partly outside, disabled class, empty
+    im = apply_mosaic(frame.copy(), boxes, classes=[0, 1, 0], enabled={0}, mode="fill", color=(1, 2, 3))
+    assert (im[:30, :30] == (1, 2, 3)).all()
+    assert np.array_equal(im[30:], frame[30:]) and np.array_equal(im[:, 30:], frame[:, 30:])
+
+
+@pytest.mark.parametrize("mode", ["pixelate", "blur", "fill"])
+def test_modes_in_place(frame, mode):
+    """All modes modify the frame in place, inside the box only."""
+    im = frame.copy()
+    out = apply_mosaic(im, np.array([[40.4, 30.6, 90.2, 80.5]]), mode=mode)
+    assert out is im
+    assert not np.array_equal(im[31:80, 40:90], frame[31:80, 40:90])
+    im[31:80, 40:90] = frame[31:80, 40:90]
+    assert np.array_equal(im, frame)
+
+
+def test_invalid_mode(frame):
+    """Unknown modes are rejected."""
+    with pytest.raises(AssertionError):
+        apply_mosaic(frame, [[0, 0, 10, 10]], mode="swirl")
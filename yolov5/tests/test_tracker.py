@@ -0,0 +1,67 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Tests for utils/mosaic/tracker.py IoUTracker."""
+
+import numpy as np
+
+from utils.mosaic.tracker import IoUTracker, box_iou_np
+
+
+def test_box_iou_np():
+    """IoU of identical, half-overlapping and disjoint boxes."""
+    a = np.array([[0, 0, 10, 10]], np.float32)
+    b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]], np.float32)
+    assert np.allclose(box_iou_np(a, b), [[1, 1 / 3, 0]], atol=1e-6)
+
+
+def test_tracks_follow_moving_boxes():
+    """Boxes moving a few pixels per frame keep their track ids, even when the detection order changes."""
+    tracker = IoUTracker()
+    ids = None
+    for f in range(10):
+        boxes = [[10 + 3 * f, 10, 60 + 3 * f, 60], [200, 100 + 2 * f, 260, 160 + 2 * f]]
+        if f % 2:
+            boxes = boxes[::-1]
+        matches = tracker.update(boxes, [0.9, 0.9])
+        got = [t.id for t, _ in (matches if f % 2 == 0 else matches[::-1])]
+        ids = ids or got
+        assert got == ids
+    assert len(tracker.tracks) == 2 and tracker.next_id == 2
+
+
+def test_new_and_expired_tracks():
+    """An unmatched box starts a new track, a track missing for more than max_age frames is dropped."""
+    tracker = IoUTracker(max_age=2)
+    (t, iou), = tracker.update([[0, 0, 50, 50]], [0.9])
+    assert iou == 0.0
+    (u, _), = tracker.update([[300, 300, 350, 350]], [0.9])  # far away: new track, first one coasts
+    assert u.id != t.id and t.misses == 1
+    tracker.update([[300, 300, 350, 350]], [0.9])
+    tracker.update([[300, 300, 350, 350]], [0.9])
+    assert [x.id for x in tracker.tracks] == [u.id]
+
+
+def test_verification_reuse():
+    """A verdict is reused until `recheck` frames passed, or the confidence or association IoU drop."""
+    tracker = IoUTracker(recheck=5, min_conf=0.5, min_iou=0.5)
+    (t, iou), = tracker.update([[0, 0, 50, 50]], [0.9])
+    assert tracker.needs_verification(t, iou, frame=0)  # never verified
+    t.verified, t.verified_at = True, 0
+    (t, iou), = tracker.update([[1, 0, 51, 50]], [0.9])
+    assert not tracker.needs_verification(t, iou, frame=1)
+    assert tracker.needs_verification(t, iou, frame=5)  # recheck interval
+    assert tracker.needs_verification(t, 0.4, frame=1)  # weak association
+    (t, iou), = tracker.update([[2, 0, 52, 50]], [0.3])
+    assert tracker.needs_verification(t, iou, frame=2)  # low confidence
+
+
+def test_coasting():
+    """Recently missed tracks whose face did not match the reference keep being mosaicked for `hold` frames."""
+    tracker = IoUTracker()
+    (t, _), = tracker.update([[0, 0, 50, 50]], [0.9])
+    t.verified = False
+    assert tracker.coasting() == []  # still detected
+    for _ in range(3):
+        tracker.update([], [])
+        assert tracker.coasting(hold=3) == [t]
+    tracker.update([], [])
+    assert tracker.coasting(hold=3) == []
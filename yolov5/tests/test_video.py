@@ -0,0 +1,56 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Tests for utils/mosaic/video.py FFmpegWriter."""
+
+import re
+import subprocess
+
+import numpy as np
+import pytest
+
+from utils.mosaic.video import FFmpegWriter, audio_codec, ffmpeg_exe
+
+EXE = ffmpeg_exe()
+pytestmark = pytest.mark.skipif(EXE is None, reason="ffmpeg not found")
+
+
+def make_video(path, acodec=None, seconds=4):
+    """Writes a 160x120 10 fps test video of `seconds` with a sine tone in `acodec` (no audio if None)."""
+    cmd = [EXE, "-y", "-loglevel", "error", "-f", "lavfi", "-i", f"testsrc=size=160x120:rate=10:duration={seconds}"]
+    if acodec:
+        cmd += ["-f", "lavfi", "-i", f"sine=duration={seconds}", "-c:a", acodec]
+    subprocess.run([*cmd, "-c:v", "libx264", "-pix_fmt", "yuv420p", str(path)], check=True)
+    return path
+
+
+def probe(path):
+    """Returns (duration in seconds, audio codecs, (width, height)) of video `path`."""
+    s = subprocess.run([EXE, "-hide_banner", "-i", str(path)], capture_output=True).stderr.decode(errors="ignore")
+    h, m, sec = re.search(r"Duration: (\d+):(\d+):([\d.]+)", s).groups()
+    w, h_ = re.search(r"Video: .*?(\d{2,})x(\d{2,})", s).groups()
+    return int(h) * 3600 + int(m) * 60 + float(sec), re.findall(r"Audio: (\w+)", s), (int(w), int(h_))
+
+
+@pytest.mark.parametrize("name, acodec", [("pcm.mov", "pcm_s16le"), ("aac.mp4", "aac"), ("mute.mp4", None)])
+def test_audio_cut_to_video(tmp_path, name, acodec):
+    """Audio mp4 cannot hold is encoded to AAC, and audio longer than the written frames is cut to the video length."""
+    src = make_video(tmp_path / name, acodec)
+    assert audio_codec(src, EXE) == acodec
+    out = tmp_path / "out.mp4"
+    w = FFmpegWriter(out, 10, (160, 120), audio=src, exe=EXE)
+    for _ in range(10):  # 1 s of frames against 4 s of audio
+        w.write(np.full((120, 160, 3), 128, np.uint8))
+    w.release()
+    duration, codecs, _ = probe(out)
+    assert duration == pytest.approx(1, abs=0.1)
+    assert codecs == (["aac"] if acodec else [])
+
+
+def test_odd_size_and_invalid_fps(tmp_path):
+    """Odd frame sizes are padded to even, NaN fps falls back to 30."""
+    out = tmp_path / "odd.mp4"
+    w = FFmpegWriter(out, float("nan"), (161, 121), exe=EXE)
+    for _ in range(30):
+        w.write(np.zeros((121, 161, 3), np.uint8))
+    w.release()
+    duration, _, size = probe(out)
+    assert size == (162, 122) and duration == pytest.approx(1, abs=0.1)
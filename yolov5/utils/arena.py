@@ -0,0 +1,127 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""
+RAM image cache shared by DataLoader workers and DDP ranks: one memory-mapped arena file with an offset/shape index.
+
+`--cache ram` used to keep resized images in a per-process Python list, so spawned DataLoader workers received pickled
+copies and every DDP rank built its own. The arena packs every resized image into one file in /dev/shm (RAM-backed
+tmpfs on Linux). Processes map the same pages and read zero-copy views; pickling an arena only sends its path and
+index, and DDP ranks on one node find the arena created by local rank 0 by name.
+
+Layout: a header of per-image `filled` flags (uint8) and original (h, w) (int32), then the images at 64-byte aligned
+offsets, each (h, w, 3) uint8 as returned by LoadImagesAndLabels.load_image().
+"""
+
+import atexit
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import psutil
+
+from utils.general import LOGGER
+
+SHM_DIR = Path("/dev/shm") if Path("/dev/shm").is_dir() else Path(tempfile.gettempdir())  # RAM-backed on Linux
+ALIGN = 64  # image offset alignment (bytes)
+
+
+def resized_shapes(shapes, img_size):
+    """Returns the (n, 3) h, w, c shapes load_image() resizes original `shapes` (n, 2) w, h to for `img_size`."""
+    w0, h0 = np.asarray(shapes, dtype=np.float64).T
+    r = img_size / np.maximum(h0, w0)
+    h = np.where(r != 1, np.ceil(h0 * r), h0).astype(np.int64)
+    w = np.where(r != 1, np.ceil(w0 * r), w0).astype(np.int64)
+    return np.stack((h, w, np.full_like(h, 3)), 1)
+
+
+class ImageArena:
+    """Images of fixed, known shapes in one memory-mapped file, see module docstring."""
+
+    def __init__(self, path, shapes, create=False):
+        """Maps arena `path` holding images of `shapes` (n, 3), creating (and owning) the file if `create`."""
+        self.path, self.shapes, self.owner = Path(path), np.asarray(shapes, dtype=np.int64), create
+        self.offsets, self.nbytes = self.layout(self.shapes)
+        self._map("w+" if create else "r+")
+        if create:
+            atexit.register(self.unlink)
+
+    @staticmethod
+    def layout(shapes):
+        """Returns the image byte offsets and the total file size of an arena for images of `shapes` (n, 3)."""
+        n, sizes = len(shapes), np.asarray(shapes, dtype=np.int64).prod(1)
+        header = -(-n * 9 // ALIGN) * ALIGN  # filled flags, (h0, w0) int32
+        offsets = header + np.cumsum(np.r_[0, -(-sizes // ALIGN) * ALIGN])
+        return offsets[:-1], int(offsets[-1])
+
+    def _map(self, mode):
+        """Maps the file, i.e. on creation or after unpickling in a DataLoader worker."""
+        n = len(self.shapes)
+        self.buf = np.memmap(self.path, dtype=np.uint8, mode=mode, shape=(self.nbytes,))
+        self.filled = self.buf[:n]
+        self.hw0 = self.buf[n : n * 9].view(np.int32).reshape(n, 2)
+
+    def __getstate__(self):
+        """Pickles the path and index only, workers map the same file."""
+        return {**{k: v for k, v in self.__dict__.items() if k not in ("buf", "filled", "hw0")}, "owner": False}
+
+    def __setstate__(self, state):
+        """Maps the arena file in the unpickling process."""
+        self.__dict__.update(state)
+        self._map("r+")
+
+    @staticmethod
+    def name(key):
+        """Returns the arena file name for `key` owned by this process, or by its launcher under DDP (torchrun)."""
+        owner = os.getppid() if int(os.getenv("LOCAL_RANK", -1)) != -1 else os.getpid()  # shared by local ranks
+        return f"yolov5_{owner}_{hashlib.sha256(str(key).encode()).hexdigest()[:16]}.arena"
+
+    @classmethod
+    def create(cls, key, shapes, prefix=""):
+        """Returns the arena for `key` in SHM_DIR, or None if SHM_DIR lacks the space (i.e. Docker's 64MB default)."""
+        for f in SHM_DIR.glob("yolov5_*.arena"):  # arenas left behind by killed runs
+            if not psutil.pid_exists(int(f.name.split("_")[1])):
+                f.unlink(missing_ok=True)
+        path, need, free = SHM_DIR / cls.name(key), cls.layout(shapes)[1], shutil.disk_usage(SHM_DIR).free
+        if path.is_file():
+            return cls(path, shapes)  # same dataset built twice in this process
+        if need > free:
+            LOGGER.warning(
+                f"{prefix}WARNING ⚠️ {SHM_DIR} has {free / 1E9:.1f}GB free, {need / 1E9:.1f}GB needed for a "
+                f"shared RAM cache, caching per process instead (i.e. docker run --shm-size)"
+            )
+            return None
+        return cls(path, shapes, create=True)
+
+    @classmethod
+    def attach(cls, key, shapes):
+        """Returns the arena for `key` created by another local rank, or None if there is none."""
+        path = SHM_DIR / cls.name(key)
+        return cls(path, shapes) if path.is_file() else None
+
+    def put(self, i, im, hw0):
+        """Stores image `i` with original (h, w) `hw0`, returning False if `im` does not have its indexed shape."""
+        if self.filled[i]:
+            return True
+        if im.shape != tuple(self.shapes[i]) or im.dtype != np.uint8:
+            return False
+        self.buf[self.offsets[i] : self.offsets[i] + im.nbytes] = im.reshape(-1)
+        self.hw0[i] = hw0
+        self.filled[i] = 1  # last, readers skip images still being written
+        return True
+
+    def get(self, i):
+        """Returns (read-only view, original hw, resized hw) of image `i`, or None if it is not stored."""
+        if not self.filled[i]:
+            return None
+        h, w, c = self.shapes[i]
+        im = self.buf[self.offsets[i] : self.offsets[i] + h * w * c].view(np.ndarray).reshape(h, w, c)
+        im.flags.writeable = False  # shared by every worker and rank
+        return im, tuple(int(x) for x in self.hw0[i]), (int(h), int(w))
+
+    def unlink(self):
+        """Removes the arena file if this process created it, mappings in other processes stay valid."""
+        if self.owner:
+            self.path.unlink(missing_ok=True)
+            self.owner = False
@@ -157,13 +157,31 @@ def random_perspective(
     # torchvision.transforms.RandomAffine(degrees=(-10, 10), translate=(0.1, 0.1), scale=(0.9, 1.1), shear=(-10, 10))
     # targets = [cls, xyxy]
 
-    height = im.shape[0] + border[0] * 2  # shape(h,w,c)
-    width = im.shape[1] + border[1] * 2
+    M, s, (width, height) = perspective_matrix(im.shape, degrees, translate, scale, shear, perspective, border)
+    if (border[0] != 0) or (border[1] != 0) or (M != np.eye(3)).any():  # image changed
+        if perspective:
+            im = cv2.warpPerspective(im, M, dsize=(width, height), borderValue=(114, 114, 114))
+        else:  # affine
+            im = cv2.warpAffine(im, M[:2], dsize=(width, height), borderValue=(114, 114, 114))
+
+    # Visualize
+    # import matplotlib.pyplot as plt
+    # ax = plt.subplots(1, 2, figsize=(12, 6))[1].ravel()
+    # ax[0].imshow(im[:, :, ::-1])  # base
+    # ax[1].imshow(im2[:, :, ::-1])  # warped
+
+    return im, warp_labels(targets, segments, M, s, width, height, perspective)
+
+
+def perspective_matrix(shape, degrees=10, translate=0.1, scale=0.1, shear=10, perspective=0.0, border=(0, 0)):
+    """Returns a random_perspective() warp matrix M, its scale s and the output (width, height) for image `shape`."""
+    height = shape[0] + border[0] * 2  # shape(h,w,c)
+    width = shape[1] + border[1] * 2
 
     # Center
     C = np.eye(3)
-    C[0, 2] = -im.shape[1] / 2  # x translation (pixels)
-    C[1, 2] = -im.shape[0] / 2  # y translation (pixels)
+    C[0, 2] = -shape[1] / 2  # x translation (pixels)
+    C[1, 2] = -shape[0] / 2  # y translation (pixels)
 
     # Perspective
     P = np.eye(3)
@@ -190,19 +208,11 @@ def random_perspective(
 
     # Combined rotation matrix
     M = T @ S @ R @ P @ C  # order of operations (right to left) is IMPORTANT
-    if (border[0] != 0) or (border[1] != 0) or (M != np.eye(3)).any():  # image changed
-        if perspective:
-            im = cv2.warpPerspective(im, M, dsize=(width, height), borderValue=(114, 114, 114))
-        else:  # affine
-            im = cv2.warpAffine(im, M[:2], dsize=(width, height), borderValue=(114, 114, 114))
+    return M, s, (width, height)
 
-    # Visualize
-    # import matplotlib.pyplot as plt
-    # ax = plt.subplots(1, 2, figsize=(12, 6))[1].ravel()
-    # ax[0].imshow(im[:, :, ::-1])  # base
-    # ax[1].imshow(im2[:, :, ::-1])  # warped
 
-    # Transform label coordinates
+def warp_labels(targets, segments, M, s, width, height, perspective=0.0):
+    """Warps [cls, xyxy] `targets` (boxes from `segments` if given for all) by M, dropping degenerate boxes."""
     n = len(targets)
     if n:
         use_segments = any(x.any() for x in segments) and len(segments) == n
@@ -238,7 +248,24 @@ def random_perspective(
         targets = targets[i]
         targets[:, 1:5] = new[i]
 
-    return im, targets
+    return targets
+
+
+def mosaic_tile(i, xc, yc, h, w, s):
+    """Returns canvas (x1a, y1a, x2a, y2a) and image (x1b, y1b, x2b, y2b) corners of mosaic tile `i` of size (h, w)."""
+    if i == 0:  # top left
+        x1a, y1a, x2a, y2a = max(xc - w, 0), max(yc - h, 0), xc, yc  # xmin, ymin, xmax, ymax (large image)
+        x1b, y1b, x2b, y2b = w - (x2a - x1a), h - (y2a - y1a), w, h  # xmin, ymin, xmax, ymax (small image)
+    elif i == 1:  # top right
+        x1a, y1a, x2a, y2a = xc, max(yc - h, 0), min(xc + w, s * 2), yc
+        x1b, y1b, x2b, y2b = 0, h - (y2a - y1a), min(w, x2a - x1a), h
+    elif i == 2:  # bottom left
+        x1a, y1a, x2a, y2a = max(xc - w, 0), yc, xc, min(s * 2, yc + h)
+        x1b, y1b, x2b, y2b = w - (x2a - x1a), 0, w, min(y2a - y1a, h)
+    else:  # bottom right
+        x1a, y1a, x2a, y2a = xc, yc, min(xc + w, s * 2), min(s * 2, yc + h)
+        x1b, y1b, x2b, y2b = 0, 0, min(w, x2a - x1a), min(y2a - y1a, h)
+    return (x1a, y1a, x2a, y2a), (x1b, y1b, x2b, y2b)
 
 
 def copy_paste(im, labels, segments, p=0.5):
@@ -439,3 +466,77 @@ class ToTensor:
         im = im.half() if self.half else im.float()  # uint8 to fp16/32
         im /= 255.0  # 0-255 to 0.0-1.0
         return im
+
+
+class LetterboxBuffers:
+    # YOLOv5 letterbox + ToTensor into reused model-input buffers, i.e. im = LetterboxBuffers(640, device=dev)([im0])
+    def __init__(
+        self, new_shape=(640, 640), stride=32, auto=True, color=(114, 114, 114), device="cpu", half=False, n=1
+    ):
+        """
+        Initializes letterboxing into `n` rotating preallocated (b, 3, h, w) buffers per batch size.
+
+        Pass n > 1 when a returned tensor may still be in use while the next frames are prepared, i.e. queued between
+        pipeline threads; buffers are pinned for asynchronous copies when `device` is CUDA.
+        """
+        self.new_shape = (new_shape, new_shape) if isinstance(new_shape, int) else tuple(new_shape)
+        self.stride, self.auto, self.color = stride, auto, color
+        self.device = torch.device(device) if isinstance(device, str) else device
+        self.dtype = torch.float16 if half else torch.float32
+        self.n = n
+        self.buffers = {}  # b -> [[flat tensor, (out h, out w, top, left, h, w) its padding is filled for], ...]
+        self.resized = None  # (h, w) resized shape, reusable uint8 HWC resize target and B, G, R planes
+
+    def _geometry(self, shape):
+        """Returns the letterbox() output shape, top/left padding and resized shape for an input of `shape` (h, w)."""
+        r = min(self.new_shape[0] / shape[0], self.new_shape[1] / shape[1])
+        w, h = int(round(shape[1] * r)), int(round(shape[0] * r))
+        dw, dh = self.new_shape[1] - w, self.new_shape[0] - h  # wh padding
+        if self.auto:  # minimum rectangle
+            dw, dh = np.mod(dw, self.stride), np.mod(dh, self.stride)
+        top, bottom = int(round(dh / 2 - 0.1)), int(round(dh / 2 + 0.1))
+        left, right = int(round(dw / 2 - 0.1)), int(round(dw / 2 + 0.1))
+        return top + h + bottom, left + w + right, top, left, h, w
+
+    def _buffer(self, b, geometry):
+        """
+        Returns a new buffer for batch size `b` until there are `n`, then the oldest one, viewed and padded for
+        `geometry` (out h, out w, top, left, h, w).
+
+        Buffers hold the largest output, new_shape, so every input and output shape reuses the same `n` buffers per
+        batch size; the padding color is rewritten only when a buffer's geometry changes.
+        """
+        ring = self.buffers.setdefault(b, [])
+        if len(ring) < self.n:
+            size = b * 3 * self.new_shape[0] * self.new_shape[1]
+            entry = [torch.empty(size, dtype=self.dtype, pin_memory=self.device.type == "cuda"), None]
+        else:
+            entry = ring.pop(0)
+        ring.append(entry)
+        im = entry[0][: b * 3 * geometry[0] * geometry[1]].view(b, 3, geometry[0], geometry[1])
+        if entry[1] != geometry:
+            im[:] = torch.tensor(self.color[::-1], dtype=self.dtype)[:, None, None] / 255  # RGB padding
+            entry[1] = geometry
+        return im
+
+    def __call__(self, ims):
+        """
+        Returns BGR uint8 HWC frames `ims` (same shape) letterboxed as a normalized RGB (b, 3, h, w) tensor on `device`.
+
+        Each frame is resized and split into reused uint8 arrays, then every plane is scaled to 0.0-1.0 straight into
+        its RGB channel of the buffer, matching letterbox() followed by ToTensor() exactly.
+        """
+        shape = ims[0].shape[:2]
+        hs, ws, top, left, h, w = self._geometry(shape)
+        im = self._buffer(len(ims), (hs, ws, top, left, h, w))
+        x = im.numpy()
+        if self.resized is None or self.resized[0] != (h, w):  # one set, reallocated when the resized shape changes
+            self.resized = (h, w), np.empty((h, w, 3), dtype=np.uint8), [np.empty((h, w), np.uint8) for _ in "bgr"]
+        _, resized, planes = self.resized
+        for i, im0 in enumerate(ims):
+            if shape != (h, w):  # resize
+                im0 = cv2.resize(im0, (w, h), dst=resized, interpolation=cv2.INTER_LINEAR)
+            cv2.split(im0, planes)  # contiguous planes make the scaling below ~2x faster than a strided HWC read
+            for c, plane in enumerate(reversed(planes)):  # BGR to RGB
+                np.divide(plane, x.dtype.type(255), out=x[i, c, top : top + h, left : left + w], casting="unsafe")
+        return im.to(self.device, non_blocking=True)
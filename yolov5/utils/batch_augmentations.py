@@ -0,0 +1,178 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""
+Batched training augmentation on the training device: mosaic, MixUp, random_perspective(), HSV and flips.
+
+LoadImagesAndLabels.__getitem__() builds every augmented sample on the CPU inside the DataLoader workers, which bound
+throughput on boxes with few cores per GPU. With `train.py --batch-augment` the workers only decode and resize
+(load_image()), and BatchAugment turns each batch of resized uint8 images into the augmented (n, 3, s, s) batch:
+
+    - random draws, in the order __getitem__() makes them, and all label math run on the CPU through the same
+      functions the CPU path uses (mosaic_tile(), perspective_matrix(), warp_labels()), so labels transform identically
+    - images are placed on one 2s x 2s canvas per sample, warped by one grid_sample() for the whole batch, then MixUp,
+      HSV (augment_hsv_batch()) and flips run as batched tensor ops
+
+Differences from the CPU path: mosaic and MixUp partners are drawn from the batch instead of the whole dataset,
+bilinear warps and the HSV round trip may differ by a level or two from OpenCV's fixed-point versions, and copy_paste
+and Albumentations are not applied.
+
+Usage:
+    augment = BatchAugment(hyp, img_size=640, device=device)
+    for imgs, labels, paths, segments in train_loader:  # create_dataloader(..., batch_augment=True)
+        imgs, targets = augment(imgs, labels, segments)  # uint8 (n, 3, 640, 640) RGB, (m, 6) image, class, xywhn
+"""
+
+import random
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from utils.augmentations import mosaic_tile, perspective_matrix, warp_labels
+from utils.general import LOGGER, xywhn2xyxy, xyn2xy, xyxy2xywhn
+
+
+def augment_hsv_batch(im, gains):
+    """Applies augment_hsv() with per-image (n, 3) hue, saturation, value `gains` to uint8 BGR images (n, 3, h, w)."""
+    b, g, r = im.int().unbind(1)
+    v = torch.maximum(torch.maximum(b, g), r)
+    d = v - torch.minimum(torch.minimum(b, g), r)
+
+    # BGR to HSV in OpenCV's 12-bit fixed point (hue 0-179), a hue off by one shifts saturated colors by ~8 levels
+    sdiv = torch.where(v > 0, (255 * 4096 / v.clamp(min=1)).round(), 0).int()
+    hdiv = torch.where(d > 0, (180 * 4096 / (6 * d.clamp(min=1))).round(), 0).int()
+    h = torch.where(v == r, g - b, torch.where(v == g, b - r + 2 * d, r - g + 4 * d))
+    h = torch.div(h * hdiv + 2048, 4096, rounding_mode="floor")
+    h = torch.where(h < 0, h + 180, h).float()
+    s = torch.div(d * sdiv + 2048, 4096, rounding_mode="floor").float()
+
+    # augment_hsv() LUTs: hue wraps at 180, saturation and value clip at 255, both truncate to uint8
+    k = gains.view(-1, 3, 1, 1).to(im.device, torch.float32)
+    h = (h * k[:, 0] % 180).floor()
+    s = (s * k[:, 1]).clamp(0, 255).floor() / 255
+    v = (v * k[:, 2]).clamp(0, 255).floor() / 255
+
+    # HSV to BGR, OpenCV's float sector formulas
+    sector = (h / 30).floor()
+    f = h / 30 - sector
+    p, q, t = v * (1 - s), v * (1 - s * f), v * (1 - s * (1 - f))
+    i = sector.long().remainder(6)[None]
+    rgb = [torch.stack(x).gather(0, i)[0] for x in ((v, q, p, p, t, v), (t, v, v, q, p, p), (p, p, t, v, v, q))]
+    return (torch.stack(rgb[::-1], 1) * 255).round().clamp(0, 255).to(torch.uint8)
+
+
+class BatchAugment:
+    """Augments batches of resized uint8 images and their labels on `device`, see module docstring."""
+
+    def __init__(self, hyp, img_size=640, device="cpu", mosaic=True):
+        """Initializes with hyperparameter dict `hyp`, output size `img_size` and the target `device`."""
+        self.hyp, self.img_size, self.device, self.mosaic = hyp, img_size, torch.device(device), mosaic
+        s = img_size
+        y, x = torch.meshgrid(torch.arange(s), torch.arange(s), indexing="ij")
+        self.xy1 = torch.stack((x, y, torch.ones_like(x)), -1).view(1, -1, 3).float().to(self.device)  # output pixels
+        if hyp.get("copy_paste", 0) > 0:
+            LOGGER.warning("WARNING ⚠️ BatchAugment does not apply copy_paste, use the default CPU augmentation")
+
+    def __call__(self, ims, labels, segments):
+        """Returns augmented uint8 (n, 3, s, s) RGB images and (m, 6) image, class, xywhn targets on the device."""
+        hyp, s, n = self.hyp, self.img_size, len(ims)
+        ims = [im.to(self.device, non_blocking=True) for im in ims]  # (h, w, 3) uint8 BGR
+        canvas = torch.full((n, 3, 2 * s, 2 * s), 114, dtype=torch.uint8, device=self.device)
+        M, targets, mosaic, mix = np.zeros((n, 3, 3)), [], np.zeros(n, bool), {}
+        hsv, flipud, fliplr = np.ones((n, 3)), np.zeros(n, bool), np.zeros(n, bool)
+        warp = dict(
+            degrees=hyp["degrees"],
+            translate=hyp["translate"],
+            scale=hyp["scale"],
+            shear=hyp["shear"],
+            perspective=hyp["perspective"],
+        )
+        for i in range(n):  # draws in __getitem__() order
+            mosaic[i] = self.mosaic and random.random() < hyp["mosaic"]
+            if mosaic[i]:
+                lb, segs = self._mosaic(canvas[i], i, ims, labels, segments)
+                M[i], scale, wh = perspective_matrix((2 * s, 2 * s), **warp, border=(-s // 2, -s // 2))
+                if random.random() < hyp["mixup"]:
+                    mix[i] = np.random.beta(32.0, 32.0)  # mixup ratio, alpha=beta=32.0
+            else:
+                lb, segs = self._letterbox(canvas[i], ims[i], labels[i]), ()
+                M[i], scale, wh = perspective_matrix((s, s), **warp)
+            targets.append(warp_labels(lb, segs, M[i], scale, *wh, hyp["perspective"]))
+            if hyp["hsv_h"] or hyp["hsv_s"] or hyp["hsv_v"]:
+                hsv[i] = np.random.uniform(-1, 1, 3) * [hyp["hsv_h"], hyp["hsv_s"], hyp["hsv_v"]] + 1
+            flipud[i] = random.random() < hyp["flipud"]
+            fliplr[i] = random.random() < hyp["fliplr"]
+
+        im = self._warp(canvas, M, hyp["perspective"])
+        if mix:  # MixUp with another mosaic of the batch
+            im0, t0 = im.clone(), list(targets)
+            for i, r in mix.items():
+                j = random.choice([j for j in np.flatnonzero(mosaic) if j != i] or [i])
+                im[i] = (im0[i].float() * r + im0[j].float() * (1 - r)).to(torch.uint8)
+                targets[i] = np.concatenate((t0[i], t0[j]), 0)
+
+        for i, lb in enumerate(targets):
+            if len(lb):
+                lb[:, 1:5] = xyxy2xywhn(lb[:, 1:5], w=s, h=s, clip=True, eps=1e-3)
+                if flipud[i]:
+                    lb[:, 2] = 1 - lb[:, 2]
+                if fliplr[i]:
+                    lb[:, 1] = 1 - lb[:, 1]
+            targets[i] = np.concatenate((np.full((len(lb), 1), i), lb.reshape(-1, 5)), 1)
+        if (hsv != 1).any():
+            im = augment_hsv_batch(im, torch.from_numpy(hsv))
+        for flip, dim in (flipud, 2), (fliplr, 3):
+            if flip.any():
+                m = torch.from_numpy(flip).to(self.device).view(-1, 1, 1, 1)
+                im = torch.where(m, im.flip(dim), im)
+        targets = torch.from_numpy(np.concatenate(targets, 0)).float().to(self.device)
+        return im.flip(1).contiguous(), targets  # BGR to RGB
+
+    def _mosaic(self, canvas, index, ims, labels, segments):
+        """Places image `index` and 3 random batch images on 2s x 2s `canvas`, returns pixel labels and segments."""
+        s, border = self.img_size, -self.img_size // 2  # LoadImagesAndLabels.mosaic_border
+        yc, xc = (int(random.uniform(-border, 2 * s + border)) for _ in range(2))  # mosaic center x, y
+        indices = [index] + random.choices(range(len(ims)), k=3)  # 3 additional image indices
+        random.shuffle(indices)
+        labels4, segments4 = [], []
+        for i, k in enumerate(indices):
+            h, w = ims[k].shape[:2]
+            (x1a, y1a, x2a, y2a), (x1b, y1b, x2b, y2b) = mosaic_tile(i, xc, yc, h, w, s)
+            canvas[:, y1a:y2a, x1a:x2a] = ims[k][y1b:y2b, x1b:x2b].permute(2, 0, 1)
+            lb, segs = labels[k].copy(), segments[k]
+            if lb.size:
+                lb[:, 1:] = xywhn2xyxy(lb[:, 1:], w, h, x1a - x1b, y1a - y1b)  # normalized xywh to pixel xyxy
+                segs = [xyn2xy(x, w, h, x1a - x1b, y1a - y1b) for x in segs]
+            labels4.append(lb)
+            segments4.extend(segs)
+        labels4 = np.concatenate(labels4, 0)
+        for x in (labels4[:, 1:], *segments4):
+            np.clip(x, 0, 2 * s, out=x)  # clip when using random_perspective()
+        return labels4, segments4
+
+    def _letterbox(self, canvas, im, labels):
+        """Letterboxes `im` to s x s in the top left of `canvas` like letterbox(auto=False), returns pixel labels."""
+        s, (h, w) = self.img_size, im.shape[:2]
+        r = min(s / h, s / w)
+        nw, nh = int(round(w * r)), int(round(h * r))
+        dw, dh = (s - nw) / 2, (s - nh) / 2
+        top, left = int(round(dh - 0.1)), int(round(dw - 0.1))
+        im = im.permute(2, 0, 1)
+        if (nh, nw) != (h, w):  # load_image() rounding, rare
+            im = F.interpolate(im[None].float(), (nh, nw), mode="bilinear").round().clamp(0, 255).byte()[0]
+        canvas[:, top : top + nh, left : left + nw] = im
+        lb = labels.copy()
+        if lb.size:
+            lb[:, 1:] = xywhn2xyxy(lb[:, 1:], r * w, r * h, padw=dw, padh=dh)
+        return lb
+
+    def _warp(self, canvas, M, perspective=0.0):
+        """Warps canvases by matrices M (n, 3, 3) to (n, 3, s, s) in one grid_sample(), like cv2.warpAffine()."""
+        n, size = len(M), canvas.shape[-1]
+        Mi = torch.from_numpy(np.linalg.inv(M)).float().to(self.device)  # output to canvas pixels
+        xy = self.xy1 @ Mi.transpose(1, 2)
+        xy = xy[..., :2] / xy[..., 2:] if perspective else xy[..., :2]
+        grid = (xy * (2 / (size - 1)) - 1).view(n, self.img_size, self.img_size, 2)  # align_corners=True pixels
+        x = canvas.float() - 114  # zero padding is then the 114 border
+        # float32 grid and canvas on every device, float16 steps are ~0.3 px at 2s = 1280 and drift from the labels
+        x = F.grid_sample(x, grid, mode="bilinear", padding_mode="zeros", align_corners=True)
+        return (x + 114).round().clamp(0, 255).to(torch.uint8)
@@ -26,6 +26,7 @@ from PIL import ExifTags, Image, ImageOps
 from torch.utils.data import DataLoader, Dataset, dataloader, distributed
 from tqdm import tqdm
 
+from utils.arena import ImageArena, resized_shapes
 from utils.augmentations import (
     Albumentations,
     augment_hsv,
@@ -34,6 +35,7 @@ from utils.augmentations import (
     copy_paste,
     letterbox,
     mixup,
+    mosaic_tile,
     random_perspective,
 )
 from utils.general import (
@@ -55,12 +57,14 @@ from utils.general import (
     xywhn2xyxy,
     xyxy2xywhn,
 )
+from utils.shards import DatasetShards, compile_shards
 from utils.torch_utils import torch_distributed_zero_first
 
 # Parameters
 HELP_URL = "See https://docs.ultralytics.com/yolov5/tutorials/train_custom_data"
 IMG_FORMATS = "bmp", "dng", "jpeg", "jpg", "mpo", "png", "tif", "tiff", "webp", "pfm"  # include image suffixes
 VID_FORMATS = "asf", "avi", "gif", "m4v", "mkv", "mov", "mp4", "mpeg", "mpg", "ts", "wmv"  # include video suffixes
+JPEG_SCALES = {8: cv2.IMREAD_REDUCED_COLOR_8, 4: cv2.IMREAD_REDUCED_COLOR_4, 2: cv2.IMREAD_REDUCED_COLOR_2}  # DCT
 LOCAL_RANK = int(os.getenv("LOCAL_RANK", -1))  # https://pytorch.org/docs/stable/elastic/run.html
 RANK = int(os.getenv("RANK", -1))
 WORLD_SIZE = int(os.getenv("WORLD_SIZE", 1))
@@ -80,6 +84,21 @@ def get_hash(paths):
     return h.hexdigest()  # return hash
 
 
+def file_stats(im_files, label_files):
+    """Returns (image size, image mtime ns, label size, label mtime ns) per image-label pair, -1 for missing files."""
+
+    def stat(p):
+        try:
+            st = os.stat(p)
+            return st.st_size, st.st_mtime_ns
+        except OSError:
+            return -1, -1
+
+    with ThreadPool(NUM_THREADS) as pool:  # stat() waits on I/O on network filesystems
+        ims, lbs = pool.map(stat, im_files, chunksize=1024), pool.map(stat, label_files, chunksize=1024)
+    return [(*a, *b) for a, b in zip(ims, lbs)]
+
+
 def exif_size(img):
     """Returns corrected PIL image size (width, height) considering EXIF orientation."""
     s = img.size  # (width, height)
@@ -90,6 +109,30 @@ def exif_size(img):
     return s
 
 
+def imread_scaled(path, img_size, wh=None):
+    """
+    Reads BGR image `path` for resizing to `img_size`, returning (im, original hw) or (None, None) if unreadable.
+
+    JPEGs at least twice `img_size` are decoded with libjpeg's DCT scaling at the largest factor 1/2, 1/4 or 1/8 that
+    keeps the long side >= `img_size`, skipping most of the full-resolution decode; the caller's resize then finishes
+    from an image at most 2x the target. `wh` is the known EXIF-corrected (w, h), read from the header if None. Other
+    formats, and decodes whose shape does not match `wh` (i.e. EXIF transposes exif_size() misses), read in full.
+    """
+    if path.lower().endswith((".jpg", ".jpeg")):
+        if wh is None:
+            with contextlib.suppress(Exception), Image.open(path) as img:
+                wh = exif_size(img)
+        if wh is not None:
+            w0, h0 = (int(x) for x in wh)
+            k = next((k for k in JPEG_SCALES if max(h0, w0) >= k * img_size), 1)  # DCT scale denominator
+            if k > 1:
+                im = cv2.imread(path, JPEG_SCALES[k])
+                if im is not None and im.shape[:2] == (-(-h0 // k), -(-w0 // k)):  # libjpeg rounds up
+                    return im, (h0, w0)
+    im = cv2.imread(path)  # BGR
+    return (im, im.shape[:2]) if im is not None else (None, None)
+
+
 def exif_transpose(image):
     """
     Transpose a PIL image accordingly if it has an EXIF Orientation tag.
@@ -173,10 +216,12 @@ def create_dataloader(
     prefix="",
     shuffle=False,
     seed=0,
+    batch_augment=False,
 ):
     if rect and shuffle:
         LOGGER.warning("WARNING ⚠️ --rect is incompatible with DataLoader shuffle, setting shuffle=False")
         shuffle = False
+    assert not (batch_augment and quad), "--batch-augment is incompatible with --quad"
     with torch_distributed_zero_first(rank):  # init dataset *.cache only once if DDP
         dataset = LoadImagesAndLabels(
             path,
@@ -192,6 +237,7 @@ def create_dataloader(
             image_weights=image_weights,
             prefix=prefix,
             rank=rank,
+            batch_augment=batch_augment,
         )
 
     batch_size = min(batch_size, len(dataset))
@@ -201,6 +247,9 @@ def create_dataloader(
     loader = DataLoader if image_weights else InfiniteDataLoader  # only DataLoader allows for attribute updates
     generator = torch.Generator()
     generator.manual_seed(6148914691236517205 + seed + RANK)
+    collate_fn = LoadImagesAndLabels.collate_fn4 if quad else LoadImagesAndLabels.collate_fn
+    if batch_augment:
+        collate_fn = LoadImagesAndLabels.collate_fn_batch  # resized images, augmented by BatchAugment
     return loader(
         dataset,
         batch_size=batch_size,
@@ -208,7 +257,7 @@ def create_dataloader(
         num_workers=nw,
         sampler=sampler,
         pin_memory=PIN_MEMORY,
-        collate_fn=LoadImagesAndLabels.collate_fn4 if quad else LoadImagesAndLabels.collate_fn,
+        collate_fn=collate_fn,
         worker_init_fn=seed_worker,
         generator=generator,
     ), dataset
@@ -317,12 +366,22 @@ class LoadScreenshots:
 class LoadImages:
     """YOLOv5 image/video dataloader, i.e. `python detect.py --source image.jpg/vid.mp4`"""
 
-    def __init__(self, path, img_size=640, stride=32, auto=True, transforms=None, vid_stride=1):
-        """Initializes YOLOv5 loader for images/videos, supporting glob patterns, directories, and lists of paths."""
+    def __init__(
+        self, path, img_size=640, stride=32, auto=True, transforms=None, vid_stride=1, batch_size=1, scaled_decode=False
+    ):
+        """Initializes YOLOv5 loader for images/videos, supporting glob patterns, directories, and lists of paths.
+
+        With `batch_size` > 1 videos are read as stacks of up to `batch_size` consecutive frames of the same video. With
+        `scaled_decode` large JPEGs are decoded DCT-downscaled towards `img_size` (imread_scaled()), so `im0` is the
+        reduced image, for callers that only need detections rather than full-resolution output.
+        """
         if isinstance(path, str) and Path(path).suffix == ".txt":  # *.txt file with img/vid/dir on each line
             path = Path(path).read_text().rsplit()
         files = []
         for p in sorted(path) if isinstance(path, (list, tuple)) else [path]:
+            if str(p).startswith(("http://", "https://")):  # remote video file, i.e. presigned URL, streamed by cv2
+                files.append(str(p))
+                continue
             p = str(Path(p).resolve())
             if "*" in p:
                 files.extend(sorted(glob.glob(p, recursive=True)))  # glob
@@ -333,8 +392,9 @@ class LoadImages:
             else:
                 raise FileNotFoundError(f"{p} does not exist")
 
-        images = [x for x in files if x.split(".")[-1].lower() in IMG_FORMATS]
-        videos = [x for x in files if x.split(".")[-1].lower() in VID_FORMATS]
+        suffix = [urlparse(x).path.split(".")[-1].lower() if "://" in x else x.split(".")[-1].lower() for x in files]
+        images = [x for x, s in zip(files, suffix) if s in IMG_FORMATS]
+        videos = [x for x, s in zip(files, suffix) if s in VID_FORMATS]
         ni, nv = len(images), len(videos)
 
         self.img_size = img_size
@@ -346,6 +406,8 @@ class LoadImages:
         self.auto = auto
         self.transforms = transforms  # optional
         self.vid_stride = vid_stride  # video frame-rate stride
+        self.batch_size = batch_size  # video frames per batch
+        self.scaled_decode = scaled_decode  # JPEG DCT downscale towards img_size
         if any(videos):
             self._new_video(videos[0])  # new video
         else:
@@ -384,11 +446,16 @@ class LoadImages:
             self.frame += 1
             # im0 = self._cv2_rotate(im0)  # for use if cv2 autorotation is False
             s = f"video {self.count + 1}/{self.nf} ({self.frame}/{self.frames}) {path}: "
+            if self.batch_size > 1:
+                return self._next_batch(path, im0)
 
         else:
             # Read image
             self.count += 1
-            im0 = cv2.imread(path)  # BGR
+            if self.scaled_decode:
+                im0 = imread_scaled(path, int(np.max(self.img_size)))[0]
+            else:
+                im0 = cv2.imread(path)  # BGR
             assert im0 is not None, f"Image Not Found {path}"
             s = f"image {self.count}/{self.nf} {path}: "
 
@@ -401,6 +468,29 @@ class LoadImages:
 
         return path, im, im0, self.cap, s
 
+    def _next_batch(self, path, im0):
+        """Returns up to `batch_size` consecutive frames of the current video starting with `im0`, as a (n, 3, h, w)
+        letterboxed stack and a list of original frames; the batch ends early at the end of the video.
+        """
+        f0, im0 = self.frame, [im0]
+        while len(im0) < self.batch_size:
+            for _ in range(self.vid_stride):
+                self.cap.grab()
+            ret_val, im = self.cap.retrieve()
+            if not ret_val:  # next __next__() moves on to the next video
+                break
+            self.frame += 1
+            im0.append(im)
+        s = f"video {self.count + 1}/{self.nf} ({f0}-{self.frame}/{self.frames}) {path}: "
+
+        if self.transforms:
+            im = [self.transforms(x) for x in im0]  # transforms
+        else:
+            im = np.stack([letterbox(x, self.img_size, stride=self.stride, auto=self.auto)[0] for x in im0])
+            im = np.ascontiguousarray(im.transpose((0, 3, 1, 2))[:, ::-1])  # BHWC to BCHW, BGR to RGB
+
+        return path, im, im0, self.cap, s
+
     def _new_video(self, path):
         """Initializes a new video capture object with path, frame count adjusted by stride, and orientation
         metadata.
@@ -531,7 +621,7 @@ def img2label_paths(img_paths):
 
 class LoadImagesAndLabels(Dataset):
     # YOLOv5 train_loader/val_loader, loads images and labels for training and validation
-    cache_version = 0.6  # dataset labels *.cache version
+    cache_version = 0.7  # dataset labels *.cache version
     rand_interp_methods = [cv2.INTER_NEAREST, cv2.INTER_LINEAR, cv2.INTER_CUBIC, cv2.INTER_AREA, cv2.INTER_LANCZOS4]
 
     def __init__(
@@ -551,6 +641,7 @@ class LoadImagesAndLabels(Dataset):
         prefix="",
         rank=-1,
         seed=0,
+        batch_augment=False,
     ):
         self.img_size = img_size
         self.augment = augment
@@ -562,6 +653,8 @@ class LoadImagesAndLabels(Dataset):
         self.stride = stride
         self.path = path
         self.albumentations = Albumentations(size=img_size) if augment else None
+        self.batch_augment = batch_augment  # return resized images for BatchAugment, utils/batch_augmentations.py
+        assert not batch_augment or (augment and not rect), f"{prefix}batch_augment needs augment=True and rect=False"
 
         try:
             f = []  # image files
@@ -590,7 +683,9 @@ class LoadImagesAndLabels(Dataset):
         try:
             cache, exists = np.load(cache_path, allow_pickle=True).item(), True  # load dict
             assert cache["version"] == self.cache_version  # matches current version
-            assert cache["hash"] == get_hash(self.label_files + self.im_files)  # identical hash
+            stats = file_stats(self.im_files, self.label_files)  # labels edited in place change only their own stats
+            if list(cache["stats"]) != self.im_files or [st for st, *_ in cache["stats"].values()] != stats:
+                cache, exists = self.cache_labels(cache_path, prefix, cache, stats), False  # verify changed files
         except Exception:
             cache, exists = self.cache_labels(cache_path, prefix), False  # run cache ops
 
@@ -604,7 +699,8 @@ class LoadImagesAndLabels(Dataset):
         assert nf > 0 or not augment, f"{prefix}No labels found in {cache_path}, can not start training. {HELP_URL}"
 
         # Read cache
-        [cache.pop(k) for k in ("hash", "version", "msgs")]  # remove items
+        stats = cache.pop("stats")  # per-file sizes and mtimes
+        [cache.pop(k, None) for k in ("dirs", "version", "msgs")]  # remove items, 'dirs' in older caches
         labels, shapes, self.segments = zip(*cache.values())
         nl = len(np.concatenate(labels, 0))  # number of labels
         assert nl > 0 or not augment, f"{prefix}All labels empty in {cache_path}, can not start training. {HELP_URL}"
@@ -673,34 +769,38 @@ class LoadImagesAndLabels(Dataset):
             self.batch_shapes = np.ceil(np.array(shapes) * img_size / stride + pad).astype(int) * stride
 
         # Cache images into RAM/disk for faster training
-        if cache_images == "ram" and not self.check_cache_ram(prefix=prefix):
+        self.ims, self.arena, self.shards = [None] * n, None, None
+        if str(cache_images).startswith("disk"):  # packed shards, 'disk', 'disk:lz4' or 'disk:jpeg'
+            compression = cache_images.partition(":")[2] or None
+            self.shards = self.cache_images_to_shards(cache_path, stats, compression, prefix)
             cache_images = False
-        self.ims = [None] * n
-        self.npy_files = [Path(f).with_suffix(".npy") for f in self.im_files]
+        if cache_images == "ram":  # one shared copy for all DataLoader workers and local DDP ranks
+            key, shapes = (self.img_size, self.augment, self.im_files), resized_shapes(self.shapes, self.img_size)
+            if LOCAL_RANK > 0:
+                self.arena = ImageArena.attach(key, shapes)  # created by local rank 0
+            elif self.check_cache_ram(prefix=prefix):
+                self.arena = ImageArena.create(key, shapes, prefix)
+            else:
+                cache_images = False
+            if cache_images and self.arena is None and not self.check_cache_ram(WORLD_SIZE, prefix=prefix):
+                cache_images = False  # no shared arena, every rank would hold its own copy
         if cache_images:
             b, gb = 0, 1 << 30  # bytes of cached images, bytes per gigabytes
             self.im_hw0, self.im_hw = [None] * n, [None] * n
-            fcn = self.cache_images_to_disk if cache_images == "disk" else self.load_image
-            results = ThreadPool(NUM_THREADS).imap(lambda i: (i, fcn(i)), self.indices)
+            results = ThreadPool(NUM_THREADS).imap(lambda i: (i, self.load_image(i)), self.indices)
             pbar = tqdm(results, total=len(self.indices), bar_format=TQDM_BAR_FORMAT, disable=LOCAL_RANK > 0)
             for i, x in pbar:
-                if cache_images == "disk":
-                    b += self.npy_files[i].stat().st_size
-                else:  # 'ram'
-                    self.ims[i], self.im_hw0[i], self.im_hw[i] = x  # im, hw_orig, hw_resized = load_image(self, i)
-                    b += self.ims[i].nbytes * WORLD_SIZE
-                pbar.desc = f"{prefix}Caching images ({b / gb:.1f}GB {cache_images})"
+                im, self.im_hw0[i], self.im_hw[i] = x  # im, hw_orig, hw_resized = load_image(self, i)
+                if self.arena is None or not self.arena.put(i, im, self.im_hw0[i]):
+                    self.ims[i] = im  # per-process copy, i.e. no arena or an image not matching its label shape
+                b += im.nbytes if self.ims[i] is None else im.nbytes * WORLD_SIZE
+                pbar.desc = f"{prefix}Caching images ({b / gb:.1f}GB {'shared ' if self.arena else ''}{cache_images})"
             pbar.close()
 
-    def check_cache_ram(self, safety_margin=0.1, prefix=""):
-        """Checks if available RAM is sufficient for caching images, adjusting for a safety margin."""
-        b, gb = 0, 1 << 30  # bytes of cached images, bytes per gigabytes
-        n = min(self.n, 30)  # extrapolate from 30 random images
-        for _ in range(n):
-            im = cv2.imread(random.choice(self.im_files))  # sample image
-            ratio = self.img_size / max(im.shape[0], im.shape[1])  # max(h, w)  # ratio
-            b += im.nbytes * ratio**2
-        mem_required = b * self.n / n  # GB required to cache dataset into RAM
+    def check_cache_ram(self, copies=1, safety_margin=0.1, prefix=""):
+        """Checks if available RAM is sufficient for `copies` copies of the cached images, with a safety margin."""
+        gb = 1 << 30  # bytes per gigabytes
+        mem_required = ImageArena.layout(resized_shapes(self.shapes, self.img_size))[1] * copies  # exact, from shapes
         mem = psutil.virtual_memory()
         cache = mem_required * (1 + safety_margin) < mem.available  # to cache or not to cache, that is the question
         if not cache:
@@ -711,42 +811,55 @@ class LoadImagesAndLabels(Dataset):
             )
         return cache
 
-    def cache_labels(self, path=Path("./labels.cache"), prefix=""):
-        """Caches dataset labels, verifies images, reads shapes, and tracks dataset integrity."""
-        x = {}  # dict
-        nm, nf, ne, nc, msgs = 0, 0, 0, 0, []  # number missing, found, empty, corrupt, messages
+    def cache_labels(self, path=Path("./labels.cache"), prefix="", old=None, stats=None):
+        """Caches dataset labels, verifying only the images and labels that are new or changed since cache `old`."""
+        old = old or {}
+        known = old.get("stats", {})  # im_file: ((im size, im mtime, label size, label mtime), counts, msg)
+        if stats is None:  # before scanning, later changes trigger an update
+            stats = file_stats(self.im_files, self.label_files)
+        new = [i for i, (f, st) in enumerate(zip(self.im_files, stats)) if known.get(f, (None,))[0] != st]
+        verified = {}  # index: ([lb, shape, segments] or None, counts, msg)
+        nm, nf, ne, nc = 0, 0, 0, 0  # number missing, found, empty, corrupt
         desc = f"{prefix}Scanning {path.parent / path.stem}..."
-        with Pool(NUM_THREADS) as pool:
-            pbar = tqdm(
-                pool.imap(verify_image_label, zip(self.im_files, self.label_files, repeat(prefix))),
-                desc=desc,
-                total=len(self.im_files),
-                bar_format=TQDM_BAR_FORMAT,
-            )
-            for im_file, lb, shape, segments, nm_f, nf_f, ne_f, nc_f, msg in pbar:
-                nm += nm_f
-                nf += nf_f
-                ne += ne_f
-                nc += nc_f
-                if im_file:
-                    x[im_file] = [lb, shape, segments]
-                if msg:
-                    msgs.append(msg)
-                pbar.desc = f"{desc} {nf} images, {nm + ne} backgrounds, {nc} corrupt"
-
-        pbar.close()
+        if new:
+            with Pool(NUM_THREADS) as pool:
+                args = zip([self.im_files[i] for i in new], [self.label_files[i] for i in new], repeat(prefix))
+                pbar = tqdm(pool.imap(verify_image_label, args), desc=desc, total=len(new), bar_format=TQDM_BAR_FORMAT)
+                for i, (im_file, lb, shape, segments, nm_f, nf_f, ne_f, nc_f, msg) in zip(new, pbar):
+                    nm += nm_f
+                    nf += nf_f
+                    ne += ne_f
+                    nc += nc_f
+                    verified[i] = [lb, shape, segments] if im_file else None, (nm_f, nf_f, ne_f, nc_f), msg
+                    pbar.desc = f"{desc} {nf} images, {nm + ne} backgrounds, {nc} corrupt"
+            pbar.close()
+
+        x = {"stats": {}}  # im_file: [lb, shape, segments] for valid images, 'stats' for all images
+        for i, (f, st) in enumerate(zip(self.im_files, stats)):
+            entry, counts, msg = verified[i] if i in verified else (old.get(f), *known[f][1:])  # unchanged file
+            x["stats"][f] = st, counts, msg
+            if entry is not None:
+                x[f] = entry
+        nm, nf, ne, nc = np.array([c for _, c, _ in x["stats"].values()], dtype=int).reshape(-1, 4).sum(0).tolist()
+        msgs = [msg for *_, msg in x["stats"].values() if msg]
         if msgs:
             LOGGER.info("\n".join(msgs))
         if nf == 0:
             LOGGER.warning(f"{prefix}WARNING ⚠️ No labels found in {path}. {HELP_URL}")
-        x["hash"] = get_hash(self.label_files + self.im_files)
         x["results"] = nf, nm, ne, nc, len(self.im_files)
         x["msgs"] = msgs  # warnings
         x["version"] = self.cache_version  # cache version
         try:
             np.save(path, x)  # save cache for next time
             path.with_suffix(".cache.npy").rename(path)  # remove .npy suffix
-            LOGGER.info(f"{prefix}New cache created: {path}")
+            if old:
+                removed = len(known.keys() - x["stats"].keys())
+                LOGGER.info(
+                    f"{prefix}Cache updated: {path} ({len(new)} new or changed, {removed} removed files), "
+                    f"{nf} images, {nm + ne} backgrounds, {nc} corrupt"
+                )
+            else:
+                LOGGER.info(f"{prefix}New cache created: {path}")
         except Exception as e:
             LOGGER.warning(f"{prefix}WARNING ⚠️ Cache directory {path.parent} is not writeable: {e}")  # not writeable
         return x
@@ -764,6 +877,9 @@ class LoadImagesAndLabels(Dataset):
     def __getitem__(self, index):
         """Fetches the dataset item at the given index, considering linear, shuffled, or weighted sampling."""
         index = self.indices[index]  # linear, shuffled, or image_weights
+        if self.batch_augment:  # augmented per batch on the training device
+            img = self.load_image(index)[0]
+            return torch.from_numpy(img.copy()), self.labels[index], self.im_files[index], self.segments[index]
 
         hyp = self.hyp
         mosaic = self.mosaic and random.random() < hyp["mosaic"]
@@ -844,18 +960,15 @@ class LoadImagesAndLabels(Dataset):
 
         Returns (im, original hw, resized hw)
         """
-        im, f, fn = (
-            self.ims[i],
-            self.im_files[i],
-            self.npy_files[i],
-        )
+        im, f = self.ims[i], self.im_files[i]
         if im is None:  # not cached in RAM
-            if fn.exists():  # load npy
-                im = np.load(fn)
-            else:  # read image
-                im = cv2.imread(f)  # BGR
-                assert im is not None, f"Image Not Found {f}"
-            h0, w0 = im.shape[:2]  # orig hw
+            if self.arena is not None and (x := self.arena.get(i)) is not None:  # shared RAM cache, read-only view
+                return x
+            if self.shards is not None:  # disk shards, already resized
+                return self.shards.get(i)
+            im, hw0 = imread_scaled(f, self.img_size, self.shapes[i])  # BGR, JPEGs DCT-downscaled towards img_size
+            assert im is not None, f"Image Not Found {f}"
+            h0, w0 = hw0  # orig hw
             r = self.img_size / max(h0, w0)  # ratio
             if r != 1:  # if sizes are not equal
                 interp = cv2.INTER_LINEAR if (self.augment or r > 1) else cv2.INTER_AREA
@@ -863,11 +976,13 @@ class LoadImagesAndLabels(Dataset):
             return im, (h0, w0), im.shape[:2]  # im, hw_original, hw_resized
         return self.ims[i], self.im_hw0[i], self.im_hw[i]  # im, hw_original, hw_resized
 
-    def cache_images_to_disk(self, i):
-        """Saves an image to disk as an *.npy file for quicker loading, identified by index `i`."""
-        f = self.npy_files[i]
-        if not f.exists():
-            np.save(f.as_posix(), cv2.imread(self.im_files[i]))
+    def cache_images_to_shards(self, cache_path, stats, compression=None, prefix=""):
+        """Returns disk shards of the resized images next to the labels cache, compiling them if missing or stale."""
+        path = cache_path.with_name(f"{cache_path.stem}_{self.img_size}{'_augment' if self.augment else ''}.shards")
+        files = str(sorted((f, stats[f][0][:2]) for f in self.im_files))  # image paths, sizes and mtimes
+        key = hashlib.sha256(files.encode()).hexdigest() + f"_{self.img_size}_{self.augment}_{compression}_dct"
+        shards = DatasetShards.load(path, key, self.im_files)  # DDP local rank 0 compiles first (zero_first)
+        return shards or compile_shards(self, path, key, compression, prefix=prefix)
 
     def load_mosaic(self, index):
         """Loads a 4-image mosaic for YOLOv5, combining 1 selected and 3 random images, with labels and segments."""
@@ -881,20 +996,9 @@ class LoadImagesAndLabels(Dataset):
             img, _, (h, w) = self.load_image(index)
 
             # place img in img4
-            if i == 0:  # top left
+            if i == 0:
                 img4 = np.full((s * 2, s * 2, img.shape[2]), 114, dtype=np.uint8)  # base image with 4 tiles
-                x1a, y1a, x2a, y2a = max(xc - w, 0), max(yc - h, 0), xc, yc  # xmin, ymin, xmax, ymax (large image)
-                x1b, y1b, x2b, y2b = w - (x2a - x1a), h - (y2a - y1a), w, h  # xmin, ymin, xmax, ymax (small image)
-            elif i == 1:  # top right
-                x1a, y1a, x2a, y2a = xc, max(yc - h, 0), min(xc + w, s * 2), yc
-                x1b, y1b, x2b, y2b = 0, h - (y2a - y1a), min(w, x2a - x1a), h
-            elif i == 2:  # bottom left
-                x1a, y1a, x2a, y2a = max(xc - w, 0), yc, xc, min(s * 2, yc + h)
-                x1b, y1b, x2b, y2b = w - (x2a - x1a), 0, w, min(y2a - y1a, h)
-            elif i == 3:  # bottom right
-                x1a, y1a, x2a, y2a = xc, yc, min(xc + w, s * 2), min(s * 2, yc + h)
-                x1b, y1b, x2b, y2b = 0, 0, min(w, x2a - x1a), min(y2a - y1a, h)
-
+            (x1a, y1a, x2a, y2a), (x1b, y1b, x2b, y2b) = mosaic_tile(i, xc, yc, h, w, s)
             img4[y1a:y2a, x1a:x2a] = img[y1b:y2b, x1b:x2b]  # img4[ymin:ymax, xmin:xmax]
             padw = x1a - x1b
             padh = y1a - y1b
@@ -1018,6 +1122,12 @@ class LoadImagesAndLabels(Dataset):
             lb[:, 0] = i  # add target image index for build_targets()
         return torch.stack(im, 0), torch.cat(label, 0), path, shapes
 
+    @staticmethod
+    def collate_fn_batch(batch):
+        """Lists resized (h, w, 3) images, [cls, xywhn] labels, paths and segments for BatchAugment."""
+        im, label, path, segments = zip(*batch)  # transposed
+        return list(im), list(label), path, list(segments)
+
     @staticmethod
     def collate_fn4(batch):
         """Bundles a batch's data by quartering the number of shapes and paths, preparing it for model input."""
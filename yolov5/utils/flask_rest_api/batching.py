@@ -0,0 +1,145 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""
+Dynamic request batching in front of an AutoShape model for the Flask REST API.
+
+Concurrent requests are queued and collected into batches of up to `max_batch` images, waiting at most `max_wait_ms`
+after the first one. Each batch is letterboxed to one shared shape and runs a single forward pass and a single
+non_max_suppression() call inside AutoShape, then the per-image Detections are handed back to the waiting requests.
+
+Usage:
+    predictor = BatchPredictor(torch.hub.load("ultralytics/yolov5", "yolov5s"), max_batch=8, max_wait_ms=10)
+    results = predictor(Image.open("zidane.jpg"))  # blocks until the batch containing this image is done
+"""
+
+import bisect
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class Histogram:
+    """Latency histogram in milliseconds with fixed log-spaced buckets, cheap enough to update on every request."""
+
+    BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)  # bucket upper bounds (ms)
+
+    def __init__(self):
+        """Initializes empty buckets."""
+        self.counts = [0] * (len(self.BOUNDS) + 1)  # last bucket is +inf
+        self.n, self.sum, self.max = 0, 0.0, 0.0
+
+    def add(self, ms):
+        """Records one observation of `ms` milliseconds."""
+        self.counts[bisect.bisect_left(self.BOUNDS, ms)] += 1
+        self.n += 1
+        self.sum += ms
+        self.max = max(self.max, ms)
+
+    def quantile(self, q):
+        """Returns the upper bound of the bucket holding quantile `q`, the observed max for the last bucket."""
+        k, c = q * self.n, 0
+        for bound, count in zip((*self.BOUNDS, self.max), self.counts):
+            c += count
+            if c >= k:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        """Returns count, mean, p50/p90/p99, max and per-bucket counts as a JSON-serializable dict."""
+        return {
+            "n": self.n,
+            "mean": round(self.sum / self.n, 2) if self.n else None,
+            "p50": round(self.quantile(0.5), 2),
+            "p90": round(self.quantile(0.9), 2),
+            "p99": round(self.quantile(0.99), 2),
+            "max": round(self.max, 2),
+            "buckets": {**{f"<={b}": c for b, c in zip(self.BOUNDS, self.counts)}, "+inf": self.counts[-1]},
+        }
+
+
+class BatchPredictor:
+    """
+    Serves AutoShape `model` from one thread, batching concurrent predict requests.
+
+    At most `max_queue` images wait for a batch, beyond that submit() raises queue.Full so the API can answer 503.
+    Latency histograms are kept for the queue wait and the total time of every request, and for the preprocess,
+    inference and NMS stages of every batch.
+    """
+
+    STAGES = "queue", "preprocess", "inference", "nms", "total"
+
+    def __init__(self, model, size=640, max_batch=8, max_wait_ms=10, max_queue=64):
+        """Starts the batching thread for `model` at inference `size`."""
+        self.model = model
+        self.size = size
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1e3
+        self.queue = queue.Queue(max_queue)
+        self.lock = threading.Lock()
+        self.hist = {k: Histogram() for k in self.STAGES}
+        self.batches = [0] * (max_batch + 1)  # batch count by batch size
+        self.thread = threading.Thread(target=self._work, daemon=True)
+        self.thread.start()
+
+    def submit(self, im):
+        """Queues image `im` (any AutoShape input) and returns a Future of its Detections, raising queue.Full."""
+        future = Future()
+        self.queue.put_nowait((im, time.perf_counter(), future))
+        return future
+
+    def __call__(self, im, timeout=None):
+        """Returns the Detections of image `im`, blocking until its batch has run."""
+        return self.submit(im).result(timeout)
+
+    def _collect(self):
+        """Returns the next batch: the first queued request plus any arriving within `max_wait`, up to `max_batch`."""
+        batch = [self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.queue.get_nowait())  # drain requests that are already waiting
+                continue
+            except queue.Empty:
+                pass
+            t = deadline - time.perf_counter()
+            if t <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=t))
+            except queue.Empty:
+                break
+        return batch
+
+    def _work(self):
+        """Batching thread: runs one AutoShape call per batch and resolves the request futures."""
+        while True:
+            batch = self._collect()
+            t = time.perf_counter()
+            try:
+                results = self.model([im for im, *_ in batch], size=self.size).tolist()
+            except Exception as e:
+                for *_, future in batch:
+                    future.set_exception(e)
+                continue
+            done = time.perf_counter()
+            with self.lock:
+                self.batches[len(batch)] += 1
+                for k, dt in zip(self.STAGES[1:4], results[0].times):  # per-batch AutoShape Profile()s
+                    self.hist[k].add(dt.t * 1e3)
+                for _, t0, _ in batch:
+                    self.hist["queue"].add((t - t0) * 1e3)
+                    self.hist["total"].add((done - t0) * 1e3)
+            for (*_, future), r in zip(batch, results):
+                future.set_result(r)
+
+    def stats(self):
+        """Returns the configuration, queue depth, batch size counts and per-stage latency histograms."""
+        with self.lock:
+            return {
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1e3,
+                "max_queue": self.queue.maxsize,
+                "queue_depth": self.queue.qsize(),
+                "batch_sizes": {n: c for n, c in enumerate(self.batches) if c},
+                "latency_ms": {k: h.summary() for k, h in self.hist.items()},
+            }
@@ -1,17 +1,27 @@
 # YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
-"""Run a Flask REST API exposing one or more YOLOv5s models."""
+"""Run a Flask REST API exposing one or more YOLOv5s models, batching concurrent requests per model."""
 
 import argparse
 import io
+import queue
+import sys
+from pathlib import Path
 
 import torch
 from flask import Flask, request
 from PIL import Image
 
+FILE = Path(__file__).resolve()
+if str(FILE.parent) not in sys.path:
+    sys.path.append(str(FILE.parent))  # add restapi.py directory to PATH, for batching when run from anywhere
+
+from batching import BatchPredictor  # noqa: E402
+
 app = Flask(__name__)
-models = {}
+models = {}  # model name -> BatchPredictor
 
 DETECTION_URL = "/v1/object-detection/<model>"
+METRICS_URL = "/v1/metrics"
 
 
 @app.route(DETECTION_URL, methods=["POST"])
@@ -33,17 +43,31 @@ def predict(model):
         im = Image.open(io.BytesIO(im_bytes))
 
         if model in models:
-            results = models[model](im, size=640)  # reduce size=320 for faster inference
+            try:
+                results = models[model](im)  # batched with concurrent requests, see --max-batch and --max-wait-ms
+            except queue.Full:
+                return {"error": "Too many queued requests, retry later"}, 503
             return results.pandas().xyxy[0].to_json(orient="records")
 
 
+@app.route(METRICS_URL, methods=["GET"])
+def metrics():
+    """Returns queue depth, batch sizes and per-stage latency histograms of every model as JSON."""
+    return {m: p.stats() for m, p in models.items()}
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Flask API exposing YOLOv5 model")
     parser.add_argument("--port", default=5000, type=int, help="port number")
     parser.add_argument("--model", nargs="+", default=["yolov5s"], help="model(s) to run, i.e. --model yolov5n yolov5s")
+    parser.add_argument("--size", default=640, type=int, help="inference size, reduce to 320 for faster inference")
+    parser.add_argument("--max-batch", default=8, type=int, help="maximum images per forward pass")
+    parser.add_argument("--max-wait-ms", default=10, type=float, help="maximum wait for a batch to fill (ms)")
+    parser.add_argument("--max-queue", default=64, type=int, help="maximum queued images per model, 503 beyond")
     opt = parser.parse_args()
 
     for m in opt.model:
-        models[m] = torch.hub.load("ultralytics/yolov5", m, force_reload=True, skip_validation=True)
+        model = torch.hub.load("ultralytics/yolov5", m, force_reload=True, skip_validation=True)
+        models[m] = BatchPredictor(model, opt.size, opt.max_batch, opt.max_wait_ms, opt.max_queue)
 
-    app.run(host="0.0.0.0", port=opt.port)  # debug=True causes Restarting with stat
+    app.run(host="0.0.0.0", port=opt.port, threaded=True)  # debug=True causes Restarting with stat
@@ -1012,10 +1012,15 @@ def non_max_suppression(
     labels=(),
     max_det=300,
     nm=0,  # number of masks
+    topk=0,  # prefilter: keep the top-k boxes per class and image before NMS (0: off)
 ):
     """
     Non-Maximum Suppression (NMS) on inference results to reject overlapping detections.
 
+    With `topk`, rows whose objectness times best class probability cannot pass `conf_thres` are dropped before the
+    class-probability multiply, and at most `topk` boxes per class of each image enter NMS. The first step is lossless,
+    the second trades a little recall at very low thresholds (i.e. val.py) for much smaller NMS inputs at 1280+ sizes.
+
     Returns:
          list of detections, on (n,6) tensor per image [xyxy, conf, cls]
     """
@@ -1038,12 +1043,10 @@ def non_max_suppression(
     # min_wh = 2  # (pixels) minimum box width and height
     max_wh = 7680  # (pixels) maximum box width and height
     max_nms = 30000  # maximum number of boxes into torchvision.ops.nms()
-    time_limit = 0.5 + 0.05 * bs  # seconds to quit after
     redundant = True  # require redundant detections
     multi_label &= nc > 1  # multiple labels per box (adds 0.5ms/img)
     merge = False  # use merge-NMS
 
-    t = time.time()
     mi = 5 + nc  # mask start index
     output = [torch.zeros((0, 6 + nm), device=prediction.device)] * bs
     for xi, x in enumerate(prediction):  # image index, image inference
@@ -1060,6 +1063,10 @@ def non_max_suppression(
             v[range(len(lb)), lb[:, 0].long() + 5] = 1.0  # cls
             x = torch.cat((x, v), 0)
 
+        # Only rows that can pass conf_thres, max(obj * cls) == obj * max(cls)
+        if topk:
+            x = x[x[:, 4] * x[:, 5:mi].amax(1) > conf_thres]
+
         # If none remain process next image
         if not x.shape[0]:
             continue
@@ -1087,6 +1094,12 @@ def non_max_suppression(
         # if not torch.isfinite(x).all():
         #     x = x[torch.isfinite(x).all(1)]
 
+        # Keep the top-k boxes per class
+        if topk and x.shape[0] > topk:
+            x = x[x[:, 4].argsort(descending=True)]
+            x = x[x[:, 5].argsort(stable=True)]  # by class, then confidence
+            x = x[_ranked_below(x[:, 5].long(), nc, topk)]
+
         # Check shape
         n = x.shape[0]  # number of boxes
         if not n:  # no boxes
@@ -1109,13 +1122,16 @@ def non_max_suppression(
         output[xi] = x[i]
         if mps:
             output[xi] = output[xi].to(device)
-        if (time.time() - t) > time_limit:
-            LOGGER.warning(f"WARNING ⚠️ NMS time limit {time_limit:.3f}s exceeded")
-            break  # time limit exceeded
 
     return output
 
 
+def _ranked_below(g, groups, n):
+    """Returns a mask of the first `n` rows of every group in sorted group indices `g` (0 <= g < `groups`)."""
+    counts = torch.bincount(g, minlength=groups)
+    return torch.arange(len(g), device=g.device) - (counts.cumsum(0) - counts)[g] < n
+
+
 def strip_optimizer(f="best.pt", s=""):
     """
     Strips optimizer and optionally saves checkpoint to finalize training; arguments are file path 'f' and save path
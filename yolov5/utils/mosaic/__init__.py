@@ -0,0 +1 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
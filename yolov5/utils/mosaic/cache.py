@@ -0,0 +1,139 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Size-bounded LRU disk cache of finished mosaic results, keyed by content hashes of the inputs and the options."""
+
+import hashlib
+import json
+import shutil
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+from pathlib import Path
+
+from utils.general import LOGGER
+
+
+class ResultCache:
+    """
+    Disk cache of mosaic results under `root`, evicting least recently used entries beyond `max_bytes`.
+
+    Each entry is a directory holding the result file, optionally the detections (detections.npz, a utils.mosaic.sidecar
+    DetectionLog) and meta.json, i.e. the response returned for it. Entries are built in a temporary directory and
+    renamed into place under a unique `<key>.<id>` name, so concurrent readers never see partial entries; putting an
+    existing key replaces its entry. get() pins the entry until release(): a pinned entry that is replaced or evicted
+    leaves the index at once but its files stay until the last reader releases it.
+    """
+
+    def __init__(self, root, max_bytes=2 << 30):
+        """Creates `root` and indexes existing entries in least to most recently used order."""
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+        self.index = OrderedDict()  # key -> (entry directory name, entry bytes), least recently used first
+        self.pins = Counter()  # entry directory name -> readers between get() and release()
+        self.retired = set()  # pinned entry directories replaced or evicted, removed on their last release()
+        entries = [d for d in self.root.iterdir() if not d.name.startswith(".") and (d / "meta.json").is_file()]
+        for d in sorted(entries, key=lambda d: (d / "meta.json").stat().st_mtime):
+            key = d.name.split(".")[0]
+            self.index.pop(key, None)  # an older entry of a replacement interrupted before its removal
+            self.index[key] = d.name, sum(f.stat().st_size for f in d.iterdir())
+        names = {name for name, _ in self.index.values()}
+        for d in self.root.iterdir():
+            if d.name not in names:  # incomplete and replaced entries of killed processes
+                shutil.rmtree(d, ignore_errors=True)
+        self.bytes = sum(size for _, size in self.index.values())
+
+    @staticmethod
+    def key(*parts):
+        """Returns the SHA256 hex digest of JSON-serializable `parts`, i.e. input hash, weights hash and options."""
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, key):
+        """
+        Returns (result path, meta dict) of `key` and marks it most recently used, or None on a miss.
+
+        The entry is pinned, its files stay on disk until release() is called with the returned result path.
+        """
+        with self.lock:
+            if key not in self.index:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.index.move_to_end(key)
+            name = self.index[key][0]
+            self.pins[name] += 1
+        d = self.root / name
+        meta = json.loads((d / "meta.json").read_text())
+        (d / "meta.json").touch()  # persist recency across restarts
+        return d / meta["result"], meta
+
+    def release(self, path):
+        """Unpins the entry of result `path` returned by get(), removing it if it was replaced or evicted meanwhile."""
+        name = Path(path).parent.name
+        with self.lock:
+            self.pins[name] -= 1
+            if self.pins[name] <= 0:
+                del self.pins[name]
+                if name in self.retired:
+                    self.retired.discard(name)
+                    shutil.rmtree(self.root / name, ignore_errors=True)
+
+    def _retire(self, name):
+        """Removes entry directory `name` dropped from the index, or defers it to release() while pinned."""
+        if self.pins[name]:
+            self.retired.add(name)
+        else:
+            shutil.rmtree(self.root / name, ignore_errors=True)
+
+    def put(self, key, result, meta, log=None):
+        """
+        Moves file `result` into entry `key` with `meta` and DetectionLog `log`, returning the cached result path.
+
+        Results larger than the whole cache are not stored and None is returned.
+        """
+        result = Path(result)
+        size = result.stat().st_size
+        if size > self.max_bytes:
+            return None
+        tmp = Path(tempfile.mkdtemp(prefix=".tmp", dir=self.root))
+        name = "result" + result.suffix
+        shutil.move(str(result), tmp / name)
+        if log is not None:
+            log.save(tmp / "detections.npz")
+        (tmp / "meta.json").write_text(json.dumps({**meta, "result": name}))
+        size = sum(f.stat().st_size for f in tmp.iterdir())
+        with self.lock:
+            d = self.root / f"{key}.{tmp.name[4:]}"  # unique, readers of a replaced entry keep their paths
+            tmp.rename(d)
+            if key in self.index:  # i.e. a sidecar re-recorded with face verdicts
+                prev, old = self.index.pop(key)
+                self.bytes -= old
+                self._retire(prev)
+            self.index[key] = d.name, size
+            self.bytes += size
+            self._evict()
+        return d / name
+
+    def _evict(self):
+        """Removes least recently used entries until the cache fits in `max_bytes`, called with the lock held."""
+        while self.bytes > self.max_bytes and len(self.index) > 1:
+            key, (name, size) = self.index.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+            self._retire(name)
+            LOGGER.info(f"ResultCache: evicted {key[:12]} ({size / 1E6:.1f} MB)")
+
+    def stats(self):
+        """Returns hit and miss counts, hit rate, entry count and disk usage."""
+        with self.lock:
+            n = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / n, 4) if n else None,
+                "evictions": self.evictions,
+                "entries": len(self.index),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,148 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Reference-face verification for the mosaic face exclusion, with cached reference embeddings and batched crops."""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.general import LOGGER, cv2
+
+
+def file_hash(path):
+    """Returns the SHA256 hex digest of the contents of file `path`."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def find_threshold(model_name="VGG-Face", distance_metric="cosine"):
+    """Returns DeepFace's verification threshold for `model_name` and `distance_metric` across DeepFace versions."""
+    try:  # deepface>=0.0.80
+        from deepface.modules.verification import find_threshold
+    except ImportError:  # deepface<0.0.80
+        from deepface.commons.distance import findThreshold as find_threshold
+    return find_threshold(model_name, distance_metric)
+
+
+class EmbeddingCache:
+    """Thread-safe LRU cache of face embeddings, i.e. keyed by (model name, reference file hash)."""
+
+    def __init__(self, maxsize=32):
+        """Initializes an empty cache holding at most `maxsize` embeddings."""
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the embedding for `key` and marks it most recently used, or None if not cached."""
+        with self.lock:
+            if key in self.data:
+                self.data.move_to_end(key)
+                return self.data[key]
+
+    def put(self, key, value):
+        """Stores `value` under `key`, evicting the least recently used entry beyond `maxsize`."""
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def __len__(self):
+        """Returns the number of cached embeddings."""
+        return len(self.data)
+
+
+class FaceVerifier:
+    """
+    Verifies detected face crops against a reference face.
+
+    The reference image is embedded once and cached by content hash, crops are embedded without re-running face
+    detection (they come from the YOLOv5 face class) in a single batched forward pass, and each match is a vector
+    distance against a threshold.
+    """
+
+    def __init__(self, model_name="VGG-Face", distance_metric="cosine", threshold=None, cache_size=32):
+        """Initializes the verifier with a DeepFace model name, distance metric and optional custom threshold."""
+        from deepface import DeepFace  # scoped to avoid TensorFlow import at module level
+
+        self.DeepFace = DeepFace
+        self.model_name = model_name
+        self.distance_metric = distance_metric
+        self.threshold = find_threshold(model_name, distance_metric) if threshold is None else threshold
+        self.cache = EmbeddingCache(cache_size)
+        self.net, self.input_size = self._load_net()
+
+    def _load_net(self):
+        """Returns the Keras model behind the DeepFace model and its (height, width) input, or (None, None)."""
+        m = self.DeepFace.build_model(self.model_name)
+        net = getattr(m, "model", m)  # FacialRecognition wrapper (deepface>=0.0.80) or Keras model
+        shape = getattr(net, "input_shape", None)
+        if isinstance(shape, tuple) and len(shape) == 4 and hasattr(net, "predict_on_batch"):
+            return net, shape[1:3]
+        LOGGER.warning(f"WARNING ⚠️ {self.model_name} does not support batched embedding, using DeepFace.represent()")
+        return None, None
+
+    def preprocess(self, im):
+        """Letterboxes BGR crop `im` to the model input as BGR float32 in [0, 1], as DeepFace.represent() feeds it."""
+        h, w = self.input_size
+        r = min(h / im.shape[0], w / im.shape[1])
+        im = cv2.resize(im, (max(1, int(im.shape[1] * r)), max(1, int(im.shape[0] * r))))  # stays BGR like reference()
+        dh, dw = h - im.shape[0], w - im.shape[1]
+        im = np.pad(im, ((dh // 2, dh - dh // 2), (dw // 2, dw - dw // 2), (0, 0)))  # centered zero padding
+        return im.astype(np.float32) / 255
+
+    def represent(self, img, detector_backend="skip"):
+        """Returns the float32 embedding of image path or BGR array `img` from the DeepFace model."""
+        r = self.DeepFace.represent(
+            img_path=img, model_name=self.model_name, detector_backend=detector_backend, enforce_detection=False
+        )
+        return np.asarray(r[0]["embedding"] if isinstance(r[0], dict) else r, dtype=np.float32)  # list[dict] >=0.0.76
+
+    def reference(self, path):
+        """Returns the cached embedding of reference image `path`, computing it on first use."""
+        key = (self.model_name, file_hash(path))
+        emb = self.cache.get(key)
+        if emb is None:
+            emb = self.represent(str(path), detector_backend="opencv")  # locate the face in the reference photo
+            self.cache.put(key, emb)
+        return emb
+
+    def distance(self, a, b):
+        """Returns the configured distance between embeddings `a` and `b` along the last axis."""
+        if self.distance_metric == "cosine":
+            return 1 - (a * b).sum(-1) / (np.linalg.norm(a, axis=-1) * np.linalg.norm(b, axis=-1))
+        if self.distance_metric == "euclidean_l2":
+            a, b = (x / np.linalg.norm(x, axis=-1, keepdims=True) for x in (a, b))
+        return np.linalg.norm(a - b, axis=-1)
+
+    def embed(self, faces):
+        """Returns an (n, d) array of embeddings for BGR crops `faces`, computed in one batched forward pass."""
+        if self.net is None:
+            return np.stack([self.represent(f) for f in faces])
+        x = np.stack([self.preprocess(f) for f in faces])  # (n, h, w, 3)
+        return np.asarray(self.net.predict_on_batch(x), dtype=np.float32)
+
+    def verify_batch(self, reference, faces):
+        """Returns a boolean array, True where a BGR crop in `faces` matches embedding `reference`."""
+        verified = np.zeros(len(faces), dtype=bool)
+        i = [j for j, f in enumerate(faces) if f.size]  # skip empty crops from degenerate boxes
+        if i:
+            verified[i] = self.distance(reference[None], self.embed([faces[j] for j in i])) <= self.threshold
+        return verified
+
+    def verify(self, reference, face):
+        """Returns True if BGR crop `face` matches `reference`, an embedding from `reference()`."""
+        return bool(self.verify_batch(reference, [face])[0])
+
+
+def load_reference(verifier, path):
+    """Returns the reference embedding for `path`, or None with a warning if it cannot be read or embedded."""
+    try:
+        return verifier.reference(path)
+    except (OSError, ValueError) as e:
+        LOGGER.warning(f"WARNING ⚠️ Reference face {path} unusable, all faces will be mosaicked: {e}")
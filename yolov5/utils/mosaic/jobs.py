@@ -0,0 +1,122 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""In-process priority job queue with a bounded worker pool, job status and per-stage timings for the mosaic API."""
+
+import contextlib
+import itertools
+import queue
+import threading
+import time
+import uuid
+
+from utils.general import LOGGER
+
+PRIORITY_IMAGE, PRIORITY_VIDEO = 0, 10  # lower runs first, so short image jobs overtake queued videos
+
+
+class Job:
+    """A unit of work submitted to a JobQueue, with its status, result or error and per-stage timings."""
+
+    def __init__(self, fn, kwargs, priority=0):
+        """Initializes a queued job that will call `fn(**kwargs, job=job)`."""
+        self.id = uuid.uuid4().hex
+        self.fn = fn
+        self.kwargs = kwargs
+        self.priority = priority
+        self.status = "queued"  # queued -> running -> done | failed
+        self.result = None
+        self.error = None
+        self.stages = {}  # stage name -> seconds, in execution order
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Context manager that records the wall time of stage `name`, i.e. `with job.stage("download"): ...`."""
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - t
+
+    def info(self):
+        """Returns a JSON-serializable status dict."""
+        end = self.finished or time.time()
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "priority": self.priority,
+            "queued_s": round((self.started or end) - self.created, 3),
+            "running_s": round(end - self.started, 3) if self.started else None,
+            "stages_s": {k: round(v, 3) for k, v in self.stages.items()},
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    Priority queue of jobs served by `workers` daemon threads.
+
+    Jobs run in (priority, submission) order. At most `maxsize` jobs wait in the queue, beyond that submit() raises
+    queue.Full so callers can shed load. Finished jobs are kept for `ttl` seconds for status and result polling.
+    """
+
+    def __init__(self, workers=2, maxsize=64, ttl=3600):
+        """Starts the worker threads."""
+        self.queue = queue.PriorityQueue(maxsize)
+        self.jobs = {}
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.counter = itertools.count()  # FIFO tie-break within a priority
+        self.threads = [threading.Thread(target=self._work, daemon=True, name=f"job{i}") for i in range(workers)]
+        for t in self.threads:
+            t.start()
+
+    def submit(self, fn, priority=0, **kwargs):
+        """Enqueues `fn(**kwargs, job=job)` and returns its Job, raising queue.Full if the queue is at capacity."""
+        job = Job(fn, kwargs, priority)
+        self.prune()
+        with self.lock:
+            self.jobs[job.id] = job
+        try:
+            self.queue.put_nowait((priority, next(self.counter), job))
+        except queue.Full:
+            with self.lock:
+                del self.jobs[job.id]
+            raise
+        return job
+
+    def get(self, job_id):
+        """Returns the Job with `job_id`, or None if unknown or expired."""
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def prune(self):
+        """Drops finished jobs older than `ttl` seconds."""
+        t = time.time()
+        with self.lock:
+            for k in [k for k, j in self.jobs.items() if j.finished and t - j.finished > self.ttl]:
+                del self.jobs[k]
+
+    def stats(self):
+        """Returns queue depth, worker count and job counts by status."""
+        with self.lock:
+            counts = {}
+            for j in self.jobs.values():
+                counts[j.status] = counts.get(j.status, 0) + 1
+        return {"depth": self.queue.qsize(), "maxsize": self.queue.maxsize, "workers": len(self.threads), **counts}
+
+    def _work(self):
+        """Worker thread: runs queued jobs forever, recording their result or error."""
+        while True:
+            _, _, job = self.queue.get()
+            job.status, job.started = "running", time.time()
+            try:
+                job.result = job.fn(**job.kwargs, job=job)
+                job.status = "done"
+            except Exception as e:
+                job.error, job.status = f"{type(e).__name__}: {e}", "failed"
+                LOGGER.warning(f"WARNING ⚠️ Job {job.id} failed: {job.error}")
+            finally:
+                job.finished = time.time()
+                self.queue.task_done()
@@ -0,0 +1,65 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""In-place mosaic kernels (pixelate, blur, fill) for multiple regions of a frame."""
+
+import numpy as np
+
+from utils.general import cv2
+
+MOSAIC_MODES = "pixelate", "blur", "fill"
+
+
+def clip_boxes_int(boxes, shape):
+    """Returns xyxy `boxes` rounded to int and clipped to image `shape` (h, w), as an (n, 4) int array."""
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4).round()
+    h, w = shape[:2]
+    return boxes.clip(0, [w, h, w, h]).astype(int)
+
+
+def pixelate(roi, b):
+    """Pixelates `roi` in place with the mean color of each `b`x`b` block, partial edge blocks included."""
+    h, w, c = roi.shape
+    nh, nw = h // b, w // b
+    H, W = nh * b, nw * b
+    if nh and nw:  # whole blocks, INTER_AREA at an integer factor is the exact block mean
+        m = cv2.resize(roi[:H, :W], (nw, nh), interpolation=cv2.INTER_AREA)
+        roi[:H, :W] = cv2.resize(m, (W, H), interpolation=cv2.INTER_NEAREST)
+    if W < w:  # right edge, reshaped into (nh, b, w - W) blocks
+        e = roi[:H, W:].reshape(nh, b, w - W, c)
+        e[:] = e.mean((1, 2), keepdims=True).round()
+    if H < h:  # bottom edge, reshaped into (h - H, nw, b) blocks
+        e = roi[H:, :W].reshape(h - H, nw, b, c)
+        e[:] = e.mean((0, 2), keepdims=True).round()
+        if W < w:  # bottom-right corner
+            roi[H:, W:] = roi[H:, W:].mean((0, 1)).round()
+
+
+def apply_mosaic(im0, boxes, classes=None, enabled=None, ratio=50, mode="pixelate", color=(0, 0, 0)):
+    """
+    Mosaics regions of BGR image `im0` in place and returns it.
+
+    Arguments:
+        im0 (np.ndarray): HWC uint8 frame, modified in place
+        boxes (array-like): (n, 4) xyxy boxes in im0 pixels, clipped to the frame
+        classes (array-like, optional): (n,) class ids of boxes
+        enabled (collection, optional): class ids to mosaic, all boxes if None
+        ratio (int): mosaic strength, block size is ratio / 5 pixels (ratio 50 -> 10 px blocks)
+        mode (str): 'pixelate' block averaging, 'blur' Gaussian blur or 'fill' solid color
+        color (tuple): BGR fill color for mode 'fill'
+    """
+    assert mode in MOSAIC_MODES, f"Invalid mosaic mode '{mode}', valid modes are {MOSAIC_MODES}"
+    boxes = clip_boxes_int(boxes, im0.shape)
+    if classes is not None and enabled is not None:
+        boxes = boxes[np.isin(np.asarray(classes).astype(int), list(enabled))]
+    b = max(1, round(ratio / 5))  # block size in pixels
+    for x1, y1, x2, y2 in boxes:
+        if x2 <= x1 or y2 <= y1:
+            continue
+        roi = im0[y1:y2, x1:x2]
+        if mode == "pixelate":
+            pixelate(roi, b)
+        elif mode == "blur":
+            k = 2 * b + 1  # odd kernel
+            roi[:] = cv2.GaussianBlur(roi, (k, k), 0)
+        else:
+            cv2.rectangle(im0, (x1, y1), (x2 - 1, y2 - 1), color, -1)  # filled, inclusive corners
+    return im0
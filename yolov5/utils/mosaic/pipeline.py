@@ -0,0 +1,140 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Threaded stage pipeline with bounded queues, backpressure and per-stage throughput, i.e. decode → infer → encode."""
+
+import queue
+import threading
+import time
+
+DONE = object()  # end-of-stream marker passed down the queues
+
+
+class Stage:
+    """
+    A pipeline step run on its own thread.
+
+    `fn(item)` returns one output item, or an iterable of output items (possibly empty) if `many`. `final()` is called
+    once after the last input and returns an iterable of remaining items, i.e. to flush a window of buffered frames.
+    """
+
+    def __init__(self, name, fn, many=False, final=None):
+        """Initializes stage `name` with its step function and empty counters."""
+        self.name = name
+        self.fn = fn
+        self.many = many
+        self.final = final
+        self.n = 0  # items processed
+        self.busy = 0.0  # seconds spent in fn/final
+        self.blocked = 0.0  # seconds waiting on a full output queue (backpressure from downstream)
+
+    @property
+    def fps(self):
+        """Returns items processed per busy second, the throughput this stage could sustain on its own."""
+        return self.n / self.busy if self.busy else float("inf")
+
+
+class Pipeline:
+    """
+    Runs iterable `source` (the decode stage) and each of `stages` on separate threads joined by bounded FIFO queues.
+
+    A single thread per stage and FIFO queues preserve item order. A full queue blocks its producer, so at most `maxsize`
+    items are buffered between two stages and a slow stage throttles the ones before it. The first exception raised by
+    any stage stops all threads and is re-raised by run().
+    """
+
+    def __init__(self, source, stages, maxsize=4):
+        """Initializes the pipeline; nothing runs until run()."""
+        self.source = source
+        self.stages = [Stage("decode", None), *stages]
+        self.maxsize = maxsize
+        self.stop = threading.Event()
+        self.error = None
+        self.t = 0.0  # wall-clock seconds of the last run()
+
+    def _fail(self, e):
+        """Records the first stage error and stops every stage."""
+        if self.error is None:
+            self.error = e
+        self.stop.set()
+
+    def _get(self, q):
+        """Returns the next item of `q`, or DONE once the pipeline is stopped."""
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return DONE
+
+    def _put(self, st, q, x):
+        """Puts `x` on `q` (None for the last stage), blocking while it is full unless the pipeline is stopped."""
+        if q is None:
+            return
+        t = time.perf_counter()
+        while not self.stop.is_set():
+            try:
+                q.put(x, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        st.blocked += time.perf_counter() - t
+
+    def _decode(self, st, outq):
+        """Source thread: pulls items from `self.source` and feeds the first stage."""
+        it = iter(self.source)
+        try:
+            while not self.stop.is_set():
+                t = time.perf_counter()
+                x = next(it, DONE)
+                st.busy += time.perf_counter() - t
+                if x is DONE:
+                    break
+                st.n += 1
+                self._put(st, outq, x)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(st, outq, DONE)
+
+    def _work(self, st, inq, outq):
+        """Stage thread: applies `st.fn` to every input item in order and forwards the outputs."""
+        try:
+            while (x := self._get(inq)) is not DONE:
+                t = time.perf_counter()
+                y = st.fn(x)
+                st.busy += time.perf_counter() - t
+                st.n += 1
+                for y in y if st.many else (y,):
+                    self._put(st, outq, y)
+            if st.final and not self.stop.is_set():
+                t = time.perf_counter()
+                y = list(st.final())
+                st.busy += time.perf_counter() - t
+                for y in y:
+                    self._put(st, outq, y)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(st, outq, DONE)
+
+    def run(self):
+        """Runs all stages to completion, returning the stages with their counters or re-raising a stage error."""
+        qs = [queue.Queue(self.maxsize) for _ in self.stages[1:]] + [None]  # qs[k] is the output of stages[k]
+        threads = [threading.Thread(target=self._decode, args=(self.stages[0], qs[0]), daemon=True)]
+        for k, st in enumerate(self.stages[1:], 1):
+            threads.append(threading.Thread(target=self._work, args=(st, qs[k - 1], qs[k]), daemon=True))
+        t = time.perf_counter()
+        for x in threads:
+            x.start()
+        for x in threads:
+            x.join()
+        self.t = time.perf_counter() - t
+        if self.error is not None:
+            raise self.error
+        return self.stages
+
+    def summary(self):
+        """Returns a one-line per-stage throughput report naming the bottleneck (slowest) stage."""
+        s = ", ".join(f"{st.name} {st.fps:.1f} fps ({st.blocked:.1f}s blocked)" for st in self.stages)
+        n = self.stages[0].n
+        slow = min(self.stages, key=lambda st: st.fps)
+        return f"Pipeline: {n} items in {self.t:.1f}s ({n / max(self.t, 1e-9):.1f} fps), {s}, bottleneck {slow.name}"
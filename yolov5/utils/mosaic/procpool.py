@@ -0,0 +1,258 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""
+Multi-process detection pool: N worker processes each hold their own model, frames travel through shared memory.
+
+The parent copies every frame into a free slot of one multiprocessing.shared_memory ring and only sends the slot
+number and frame shape through the task queue, so frames are never pickled. Each worker letterboxes the frame straight
+from the shared slot, runs inference and NMS with `threads` intra-op threads (torch or ONNX Runtime) and sends back the
+(n, 6) detections in letterbox coordinates, which are small. The slot is reused once its result arrives, a full ring
+blocks submit() and so bounds the frames in flight. Frames larger than a slot (`max_frame`) are letterboxed by the
+parent first, which leaves the worker's letterbox a no-op and the results unchanged. If a worker process dies (i.e. OOM
+killed) the pool fails every pending and later future instead of waiting forever.
+
+Usage:
+    with ModelPool("4class.pt", processes=4) as pool:
+        det, shape = pool.submit(im0, conf_thres=0.25).result()  # det: (n, 6) xyxy conf cls at letterbox `shape`
+"""
+
+import contextlib
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from utils.augmentations import letterbox
+from utils.general import LOGGER
+
+
+class ShmRing:
+    """`slots` fixed-size frame slots of `slot_bytes` in one SharedMemory block, created by the parent or attached."""
+
+    def __init__(self, slots, slot_bytes, name=None):
+        """Creates the block, or attaches to block `name` created by another process."""
+        self.slots, self.slot_bytes = slots, slot_bytes
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=slots * slot_bytes)
+        self.free = queue.Queue()
+        for i in range(slots):
+            self.free.put(i)
+
+    @property
+    def name(self):
+        """Returns the shared memory block name for attaching from other processes."""
+        return self.shm.name
+
+    def view(self, slot, shape, dtype=np.uint8):
+        """Returns a numpy view of `slot` holding an array of `shape` and `dtype`."""
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def put(self, im):
+        """Copies array `im` into a free slot, blocking until one is released, and returns the slot index."""
+        if im.nbytes > self.slot_bytes:
+            raise ValueError(f"frame {im.shape} ({im.nbytes} bytes) exceeds slot size {self.slot_bytes}")
+        slot = self.free.get()
+        self.view(slot, im.shape, im.dtype)[:] = im
+        return slot
+
+    def release(self, slot):
+        """Returns `slot` to the free list."""
+        self.free.put(slot)
+
+    def close(self):
+        """Detaches from the block, and removes it if this process created it."""
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+@contextlib.contextmanager
+def _spawn_without_main():
+    """Keeps spawned workers from re-running the parent's __main__, i.e. app.py which loads its models at import."""
+    main = sys.modules["__main__"]
+    spec, file = getattr(main, "__spec__", None), main.__dict__.pop("__file__", None)
+    main.__spec__ = None
+    try:
+        yield
+    finally:
+        main.__spec__ = spec
+        if file is not None:
+            main.__file__ = file
+
+
+def _serve(weights, device, data, half, imgsz, threads, ring, tasks, results):
+    """Worker process: loads the model, then letterboxes, infers and NMSes frames from shared slots until None."""
+    import torch
+
+    from models.common import DetectMultiBackend
+    from utils.augmentations import letterbox
+    from utils.general import non_max_suppression
+    from utils.torch_utils import select_device
+
+    torch.set_num_threads(threads)  # N processes x `threads` should not exceed the physical cores
+    try:
+        model = DetectMultiBackend(weights, device=select_device(device), data=data, fp16=half)
+        if model.onnx:  # rebuild the ONNX Runtime session with the same intra-op thread budget
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads, options.inter_op_num_threads = threads, 1
+            model.session = onnxruntime.InferenceSession(
+                weights, sess_options=options, providers=model.session.get_providers()
+            )
+        model.warmup(imgsz=(1, 3, *imgsz))
+        ring = ShmRing(*ring)
+    except Exception as e:
+        results.put((None, os.getpid(), None, f"{type(e).__name__}: {e}"))
+        return
+    results.put((None, os.getpid(), (model.names, model.stride, model.pt), None))  # ready
+    with torch.inference_mode():
+        while (task := tasks.get()) is not None:
+            tid, slot, shape, nms = task
+            try:
+                im = letterbox(ring.view(slot, shape), imgsz, stride=model.stride, auto=model.pt)[0]
+                results.put((tid, slot, None, None))  # slot copied out, the parent can reuse it
+                slot = None
+                im = torch.from_numpy(np.ascontiguousarray(im.transpose((2, 0, 1))[::-1])).to(model.device)
+                im = (im.half() if model.fp16 else im.float())[None] / 255
+                det = non_max_suppression(model(im), **nms)[0].cpu().numpy()
+                results.put((tid, None, (det, im.shape[2:]), None))
+            except Exception as e:
+                results.put((tid, slot, None, f"{type(e).__name__}: {e}"))
+    ring.shm.close()
+
+
+class ModelPool:
+    """
+    `processes` detection worker processes fed through a shared memory ring, see module docstring.
+
+    submit() is thread-safe and returns a Future of (det, letterbox shape); results complete out of order, callers that
+    need order (detect.run) keep their own window of futures.
+    """
+
+    def __init__(
+        self,
+        weights,
+        processes=2,  # worker processes, each with its own model
+        threads=1,  # intra-op threads per process
+        device="cpu",  # cuda device, i.e. 0 or cpu
+        data=None,  # dataset.yaml path for class names
+        half=False,  # use FP16 half-precision inference
+        imgsz=(640, 640),  # inference size (height, width)
+        slots=None,  # shared frame slots, default 2 per process
+        max_frame=(2160, 3840),  # largest (height, width) BGR frame a slot holds
+        timeout=600,  # seconds to wait for the workers to load their models
+    ):
+        """Creates the shared ring and starts the workers, returning once every model is loaded and warmed up."""
+        ctx = mp.get_context("spawn")  # fork would copy the parent's threads and torch state
+        self.processes, self.threads, self.imgsz = processes, threads, tuple(imgsz)
+        self.ring = ShmRing(slots or 2 * processes, max_frame[0] * max_frame[1] * 3)
+        self.tasks, self.results = ctx.Queue(), ctx.Queue()
+        ring = self.ring.slots, self.ring.slot_bytes, self.ring.name
+        args = str(weights), device, data, half, self.imgsz, threads, ring, self.tasks, self.results
+        self.workers = [ctx.Process(target=_serve, args=args, daemon=True) for _ in range(processes)]
+        with _spawn_without_main():  # workers only need this module
+            for p in self.workers:
+                p.start()
+        try:
+            for _ in self.workers:
+                _, pid, model, error = self.results.get(timeout=timeout)
+                if error:
+                    raise RuntimeError(f"ModelPool worker {pid} failed to load {weights}: {error}")
+                self.names, self.stride, self.pt = model
+        except queue.Empty:
+            self.close()
+            raise RuntimeError(f"ModelPool workers did not start within {timeout}s") from None
+        except RuntimeError:
+            self.close()
+            raise
+        self.ids = itertools.count()
+        self.futures = {}  # task id -> Future
+        self.error = None  # set once a worker dies, the pool then fails every future
+        self.closing = False
+        self.lock = threading.Lock()
+        self.collector = threading.Thread(target=self._collect, daemon=True)
+        self.collector.start()
+        LOGGER.info(f"ModelPool: {processes} processes x {threads} threads, {self.ring.slots} shared frame slots")
+
+    def submit(self, im0, **nms):
+        """Queues BGR frame `im0` with non_max_suppression() keyword arguments `nms`, returns a Future."""
+        if self.error:
+            raise RuntimeError(self.error)
+        if im0.nbytes > self.ring.slot_bytes:  # i.e. a 12 MP photo, the worker then letterboxes a letterboxed frame
+            im0 = np.ascontiguousarray(letterbox(im0, self.imgsz, stride=self.stride, auto=self.pt)[0])
+        slot = self.ring.put(im0)
+        future = Future()
+        with self.lock:
+            if self.error:  # a worker died while this call waited for a slot
+                raise RuntimeError(self.error)
+            tid = next(self.ids)
+            self.futures[tid] = future
+        self.tasks.put((tid, slot, im0.shape, nms))
+        return future
+
+    def _fail(self, error):
+        """Fails every pending future with `error` and wakes submit() calls waiting for slots a dead worker holds."""
+        with self.lock:
+            self.error = error
+            futures, self.futures = self.futures, {}
+        for future in futures.values():
+            future.set_exception(RuntimeError(error))
+        for _ in range(self.ring.slots):
+            self.ring.release(0)  # slot contents no longer matter, submit() raises once it has one
+
+    def _collect(self):
+        """Result thread: frees slots and resolves futures as worker messages arrive, and watches worker liveness."""
+        while True:
+            try:
+                r = self.results.get(timeout=1)
+            except queue.Empty:
+                dead = [p for p in self.workers if not p.is_alive()]
+                if dead and not self.closing:
+                    p = dead[0]
+                    self._fail(f"ModelPool worker {p.pid} exited with code {p.exitcode}")
+                    LOGGER.error(self.error)
+                    return
+                continue
+            if r is None:
+                break
+            tid, slot, result, error = r
+            if slot is not None:
+                self.ring.release(slot)
+            if result is None and error is None:
+                continue
+            with self.lock:
+                future = self.futures.pop(tid, None)
+            if future is None:  # already failed by _fail()
+                continue
+            if error:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(result)
+
+    def close(self):
+        """Stops the workers and the result thread and removes the shared ring."""
+        self.closing = True
+        for _ in self.workers:
+            self.tasks.put(None)
+        for p in self.workers:
+            p.join(timeout=10)
+            if p.is_alive():
+                p.terminate()
+        self.results.put(None)
+        if getattr(self, "collector", None):
+            self.collector.join()
+        self.ring.close()
+
+    def __enter__(self):
+        """Returns the pool for use as a context manager."""
+        return self
+
+    def __exit__(self, *args):
+        """Closes the pool on context exit."""
+        self.close()
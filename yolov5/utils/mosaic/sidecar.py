@@ -0,0 +1,96 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""
+Raw detections and face-verification verdicts of a detect.run() call, saved as a compact columnar .npz sidecar.
+
+Mosaic strength and class toggles only affect post-processing, so a sidecar recorded once (detect.run(record=log))
+lets later renders of the same source replay the mosaic step (detect.run(replay=log)) without the model or DeepFace.
+
+Columns, one row per box in the order they were mosaiced:
+    det_*   NMS detections of every class, file index, frame, xyxy (uint16), conf (float16), cls (uint8)
+    face_*  reference-verified face boxes incl. tracker-coasted ones, file index, frame, xyxy, keep (matched reference)
+"""
+
+import json
+
+import numpy as np
+
+
+class DetectionLog:
+    """Per-frame detections and face verdicts keyed by (file name, frame), see module docstring for the layout."""
+
+    def __init__(self, names=None):
+        """Initializes an empty log for class `names` (dict or list)."""
+        self.names = dict(enumerate(names)) if isinstance(names, (list, tuple)) else names
+        self.files = []  # file names, rows store their index
+        self.faces_verified = False  # True once face rows were recorded from a reference comparison
+        self.det = []  # (file, frame, (n, 6) xyxy conf cls) chunks while recording
+        self.face = []  # (file, frame, (m, 4) xyxy, (m,) keep) chunks while recording
+        self.columns = None  # concatenated columns once saved or loaded
+        self.index = None  # {(table, file, frame): slice} once loaded
+
+    def _file(self, name):
+        """Returns the index of file `name`, adding it if new."""
+        if name not in self.files:
+            self.files.append(name)
+        return self.files.index(name)
+
+    def add(self, file, frame, det):
+        """Records the (n, 6) xyxy, conf, cls detections of `frame` of `file`, boxes in original image pixels."""
+        if len(det):
+            self.det.append((self._file(file), frame, np.asarray(det, dtype=np.float32)))
+
+    def add_faces(self, file, frame, boxes, keep):
+        """Records verified face `boxes` (m, 4) of `frame` and whether each matched the reference (`keep`)."""
+        self.faces_verified = True
+        if len(boxes):
+            self.face.append((self._file(file), frame, np.asarray(boxes).reshape(-1, 4), np.asarray(keep, dtype=bool)))
+
+    def _columns(self):
+        """Returns the recorded chunks as a dict of column arrays."""
+        d = np.concatenate([x for *_, x in self.det]) if self.det else np.zeros((0, 6), dtype=np.float32)
+        n = [len(x) for *_, x in self.det]
+        m = [len(k) for *_, k in self.face]
+        return {
+            "det_file": np.repeat(np.array([f for f, *_ in self.det], dtype=np.uint16), n),
+            "det_frame": np.repeat(np.array([i for _, i, _ in self.det], dtype=np.uint32), n),
+            "det_xyxy": d[:, :4].round().clip(0, 65535).astype(np.uint16),
+            "det_conf": d[:, 4].astype(np.float16),
+            "det_cls": d[:, 5].astype(np.uint8),
+            "face_file": np.repeat(np.array([f for f, *_ in self.face], dtype=np.uint16), m),
+            "face_frame": np.repeat(np.array([i for _, i, *_ in self.face], dtype=np.uint32), m),
+            "face_xyxy": np.concatenate([b for *_, b, _ in self.face]).astype(np.uint16)
+            if self.face
+            else np.zeros((0, 4), dtype=np.uint16),
+            "face_keep": np.concatenate([k for *_, k in self.face]) if self.face else np.zeros(0, dtype=bool),
+        }
+
+    def save(self, path):
+        """Saves the log to .npz `path`."""
+        columns = self._columns() if self.columns is None else self.columns  # recorded or loaded
+        meta = {"names": self.names, "files": self.files, "faces_verified": self.faces_verified}
+        np.savez_compressed(path, meta=np.array(json.dumps(meta)), **columns)
+
+    @classmethod
+    def load(cls, path):
+        """Returns the DetectionLog saved at `path`, indexed for get()."""
+        with np.load(path) as z:
+            meta = json.loads(str(z["meta"]))
+            log = cls({int(k): v for k, v in meta["names"].items()})
+            log.files, log.faces_verified = meta["files"], meta["faces_verified"]
+            log.columns = {k: z[k] for k in z.files if k != "meta"}
+        log.index = {}
+        for table in "det", "face":  # rows of one (file, frame) are contiguous
+            key = log.columns[f"{table}_file"].astype(np.int64) << 32 | log.columns[f"{table}_frame"]
+            if len(key):
+                starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+                for a, b in zip(starts, np.r_[starts[1:], len(key)]):
+                    log.index[table, int(key[a] >> 32), int(key[a] & 0xFFFFFFFF)] = slice(a, b)
+        return log
+
+    def get(self, file, frame):
+        """Returns (det (n, 6) xyxy conf cls, face xyxy (m, 4), face keep (m,)) recorded for `frame` of `file`."""
+        c, f = self.columns, self.files.index(file) if file in self.files else -1
+        i = self.index.get(("det", f, frame), slice(0, 0))
+        det = np.concatenate((c["det_xyxy"][i], c["det_conf"][i, None], c["det_cls"][i, None]), 1).astype(np.float32)
+        j = self.index.get(("face", f, frame), slice(0, 0))
+        return det, c["face_xyxy"][j].astype(int), c["face_keep"][j]
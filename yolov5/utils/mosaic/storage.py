@@ -0,0 +1,260 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""
+Object storage for the mosaic service: concurrent multipart S3 transfers, streamed video reads and part-wise uploads.
+
+Backends share one interface so the service can run against the local filesystem in tests:
+    source(key, dir)  path or URL detect.run() can read, videos are streamed instead of staged on disk
+    download(key, dir)  local copy of `key` in `dir`
+    upload(path, key)  store a local file
+    copy(src, dst)  copy a stored object without transferring it through this host
+    fingerprint(key)  content hash of `key` without downloading it, None if missing
+    writer(key)  binary sink uploading bytes as they are written, i.e. a fragmented mp4 from FFmpegWriter
+"""
+
+import os
+import shutil
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from utils.dataloaders import VID_FORMATS
+from utils.mosaic.faces import file_hash
+
+MB = 1 << 20
+
+
+def is_video(key):
+    """Returns True if object `key` has a video file suffix."""
+    return Path(key).suffix[1:].lower() in VID_FORMATS
+
+
+class LocalWriter:
+    """Sink writing to `path` through a temporary .part file that is renamed into place on close()."""
+
+    def __init__(self, path):
+        """Opens the temporary file next to `path`."""
+        self.path = Path(path)
+        self.tmp = self.path.with_name(self.path.name + ".part")
+        self.f = open(self.tmp, "wb")
+        self.size = 0
+
+    def write(self, b):
+        """Writes bytes `b`."""
+        self.size += len(b)
+        return self.f.write(b)
+
+    @property
+    def closed(self):
+        """Returns True once closed or aborted."""
+        return self.f.closed
+
+    def close(self):
+        """Finalizes the file."""
+        if not self.f.closed:
+            self.f.close()
+            os.replace(self.tmp, self.path)
+
+    def abort(self):
+        """Discards the partial file."""
+        self.f.close()
+        self.tmp.unlink(missing_ok=True)
+
+
+class TeeWriter:
+    """Sink duplicating writes to several sinks, i.e. an upload and a local copy for the result cache."""
+
+    def __init__(self, *sinks):
+        """Initializes the tee, `size` and `closed` are reported by the first sink."""
+        self.sinks = sinks
+
+    @property
+    def size(self):
+        """Returns bytes written."""
+        return self.sinks[0].size
+
+    @property
+    def closed(self):
+        """Returns True once closed or aborted."""
+        return self.sinks[0].closed
+
+    def write(self, b):
+        """Writes bytes `b` to every sink."""
+        for s in self.sinks:
+            s.write(b)
+        return len(b)
+
+    def close(self):
+        """Closes every sink."""
+        for s in self.sinks:
+            s.close()
+
+    def abort(self):
+        """Aborts every sink."""
+        for s in self.sinks:
+            s.abort()
+
+
+class LocalStorage:
+    """Storage backed by directory `root`, a stand-in for S3 in tests and local deployments."""
+
+    def __init__(self, root):
+        """Creates `root` if missing."""
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def source(self, key, dir):
+        """Returns the stored file path itself, nothing is copied."""
+        path = self.root / key
+        if not path.is_file():
+            raise FileNotFoundError(path)
+        return str(path)
+
+    def download(self, key, dir):
+        """Copies `key` into `dir` and returns the copy path."""
+        return shutil.copy(self.root / key, Path(dir) / key)
+
+    def upload(self, path, key):
+        """Copies local file `path` to `key`."""
+        shutil.copy(path, self.root / key)
+
+    def copy(self, src, dst):
+        """Copies `src` to `dst`."""
+        shutil.copy(self.root / src, self.root / dst)
+
+    def fingerprint(self, key):
+        """Returns the SHA256 of `key`, None if missing."""
+        path = self.root / key
+        return file_hash(path) if path.is_file() else None
+
+    def writer(self, key):
+        """Returns a LocalWriter for `key`."""
+        return LocalWriter(self.root / key)
+
+
+class S3MultipartWriter:
+    """
+    Sink uploading written bytes to S3 as a multipart upload while the producer is still writing.
+
+    Parts of `part_size` bytes (S3 minimum 5 MB except the last) are uploaded by `concurrency` threads; write() blocks
+    while that many parts are in flight, which bounds memory to about (concurrency + 1) * part_size.
+    """
+
+    def __init__(self, client, bucket, key, part_size=16 * MB, concurrency=4):
+        """Starts the multipart upload of `key` in `bucket`."""
+        self.client, self.bucket, self.key = client, bucket, key
+        self.part_size = max(part_size, 5 * MB)
+        self.concurrency = concurrency
+        self.upload_id = client.create_multipart_upload(Bucket=bucket, Key=key)["UploadId"]
+        self.pool = ThreadPoolExecutor(concurrency)
+        self.parts = []  # futures of upload_part results, in part order
+        self.buf = bytearray()
+        self.size = 0
+        self.closed = False
+
+    def _upload_part(self, n, data):
+        """Uploads part number `n` and returns its completion entry."""
+        r = self.client.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, PartNumber=n, Body=data
+        )
+        return {"ETag": r["ETag"], "PartNumber": n}
+
+    def _submit(self, data):
+        """Queues `data` as the next part, waiting while `concurrency` parts are already uploading."""
+        while sum(not f.done() for f in self.parts) >= self.concurrency:
+            wait(self.parts, return_when=FIRST_COMPLETED)
+        self.parts.append(self.pool.submit(self._upload_part, len(self.parts) + 1, bytes(data)))
+
+    def write(self, b):
+        """Buffers bytes `b`, uploading every full part."""
+        self.buf += b
+        self.size += len(b)
+        while len(self.buf) >= self.part_size:
+            self._submit(self.buf[: self.part_size])
+            del self.buf[: self.part_size]
+        return len(b)
+
+    def close(self):
+        """Uploads the last part and completes the upload, aborting it if any part failed."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self.buf or not self.parts:
+                self._submit(self.buf)
+            parts = [f.result() for f in self.parts]
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, MultipartUpload={"Parts": parts}
+            )
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self.pool.shutdown()
+
+    def abort(self):
+        """Cancels the upload and discards uploaded parts, waiting for in-flight parts so none land after the abort."""
+        self.closed = True
+        for f in self.parts:
+            f.cancel()
+        wait(self.parts)  # parts already uploading cannot be cancelled, abort only once they settled
+        self.pool.shutdown()
+        self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+
+class S3Storage:
+    """
+    S3 bucket storage with concurrent multipart transfers.
+
+    Videos are read through presigned URLs so decoding starts with the first ranged GET instead of after a full
+    download, and result videos are uploaded part by part while frames are still being encoded.
+    """
+
+    def __init__(self, bucket, client=None, part_size=16 * MB, concurrency=8, expires=3600):
+        """Initializes the storage for `bucket` using boto3 `client` (a default client if None)."""
+        import boto3  # scoped, only S3 deployments need boto3
+        from boto3.s3.transfer import TransferConfig
+
+        self.bucket = bucket
+        self.client = client or boto3.client("s3")
+        self.part_size = part_size
+        self.concurrency = concurrency
+        self.expires = expires
+        self.config = TransferConfig(
+            multipart_threshold=part_size, multipart_chunksize=part_size, max_concurrency=concurrency, use_threads=True
+        )
+
+    def source(self, key, dir):
+        """Returns a presigned URL for videos (streamed by the decoder), else downloads `key` into `dir`."""
+        if is_video(key):
+            return self.client.generate_presigned_url(
+                "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=self.expires
+            )
+        return self.download(key, dir)
+
+    def download(self, key, dir):
+        """Downloads `key` into `dir` with concurrent ranged GETs and returns the local path."""
+        path = str(Path(dir) / key)
+        self.client.download_file(self.bucket, key, path, Config=self.config)
+        return path
+
+    def upload(self, path, key):
+        """Uploads local file `path` to `key` with concurrent multipart PUTs."""
+        self.client.upload_file(str(path), self.bucket, key, Config=self.config)
+
+    def copy(self, src, dst):
+        """Copies `src` to `dst` server-side, in concurrent parts for large objects."""
+        self.client.copy({"Bucket": self.bucket, "Key": src}, self.bucket, dst, Config=self.config)
+
+    def fingerprint(self, key):
+        """Returns the ETag of `key` from a HEAD request (content MD5 for single-part uploads), None if missing."""
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)["ETag"].strip('"')
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def writer(self, key):
+        """Returns an S3MultipartWriter for `key`."""
+        return S3MultipartWriter(self.client, self.bucket, key, self.part_size, min(self.concurrency, 4))
@@ -0,0 +1,99 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Lightweight IoU tracker that lets video frames reuse a face verification verdict per track."""
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+
+def box_iou_np(box1, box2, eps=1e-7):
+    """Returns the (N, M) IoU matrix of numpy xyxy boxes `box1` (N, 4) and `box2` (M, 4)."""
+    lt = np.maximum(box1[:, None, :2], box2[None, :, :2])
+    rb = np.minimum(box1[:, None, 2:], box2[None, :, 2:])
+    inter = (rb - lt).clip(0).prod(2)
+    area1 = (box1[:, 2:] - box1[:, :2]).prod(1)
+    area2 = (box2[:, 2:] - box2[:, :2]).prod(1)
+    return inter / (area1[:, None] + area2[None] - inter + eps)
+
+
+class Track:
+    """A tracked face with a constant-velocity box estimate and its cached verification verdict."""
+
+    def __init__(self, id, box, conf):
+        """Initializes track `id` from an xyxy `box` and detection confidence `conf`."""
+        self.id = id
+        self.box = np.asarray(box, dtype=np.float32)
+        self.velocity = np.zeros(4, dtype=np.float32)  # xyxy pixels per frame
+        self.conf = conf
+        self.misses = 0  # consecutive frames without a matching detection
+        self.verified = None  # None until verified, then True (reference face) or False (mosaic)
+        self.verified_at = None  # frame index of the last verification
+
+    def predict(self):
+        """Returns the box expected in the next frame."""
+        return self.box + self.velocity
+
+    def update(self, box, conf, smooth=0.5):
+        """Moves the track to matched detection `box`, smoothing the velocity estimate (alpha-beta filter)."""
+        box = np.asarray(box, dtype=np.float32)
+        self.velocity = smooth * (box - self.box) + (1 - smooth) * self.velocity
+        self.box, self.conf, self.misses = box, conf, 0
+
+
+class IoUTracker:
+    """
+    Associates face boxes across video frames by IoU with predicted track boxes (Hungarian matching).
+
+    A verification verdict is cached per track and only re-checked every `recheck` frames, when the detection
+    confidence falls below `min_conf` or when the association IoU falls below `min_iou`.
+    """
+
+    def __init__(self, iou_thres=0.3, max_age=15, recheck=30, min_conf=0.5, min_iou=0.5):
+        """Initializes an empty tracker; tracks unmatched for more than `max_age` frames are dropped."""
+        self.iou_thres = iou_thres
+        self.max_age = max_age
+        self.recheck = recheck
+        self.min_conf = min_conf
+        self.min_iou = min_iou
+        self.tracks = []
+        self.next_id = 0
+
+    def update(self, boxes, confs):
+        """
+        Matches (N, 4) xyxy `boxes` with confidences `confs` to tracks.
+
+        Returns a list of (track, iou) per box, iou being the association IoU (0 for new tracks).
+        """
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        matches = [None] * len(boxes)
+        unmatched = set(range(len(self.tracks)))
+        if len(boxes) and self.tracks:
+            iou = box_iou_np(np.stack([t.predict() for t in self.tracks]), boxes)
+            for ti, bi in zip(*linear_sum_assignment(-iou)):
+                if iou[ti, bi] >= self.iou_thres:
+                    self.tracks[ti].update(boxes[bi], confs[bi])
+                    matches[bi] = (self.tracks[ti], float(iou[ti, bi]))
+                    unmatched.discard(ti)
+        for i in unmatched:  # coast on the velocity estimate
+            t = self.tracks[i]
+            t.box, t.misses = t.predict(), t.misses + 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_age]
+        for bi, m in enumerate(matches):
+            if m is None:  # new track
+                t = Track(self.next_id, boxes[bi], confs[bi])
+                self.next_id += 1
+                self.tracks.append(t)
+                matches[bi] = (t, 0.0)
+        return matches
+
+    def needs_verification(self, track, iou, frame):
+        """Returns True if `track`, matched with association `iou` at `frame`, must be (re-)verified."""
+        return (
+            track.verified_at is None
+            or frame - track.verified_at >= self.recheck
+            or track.conf < self.min_conf
+            or iou < self.min_iou
+        )
+
+    def coasting(self, hold=3):
+        """Returns tracks missed for at most `hold` frames whose last verdict was a non-matching face."""
+        return [t for t in self.tracks if 0 < t.misses <= hold and t.verified is False]
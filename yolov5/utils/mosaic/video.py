@@ -0,0 +1,146 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Streaming video output that pipes processed frames into one ffmpeg process and stream-copies the source audio."""
+
+import contextlib
+import re
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+
+from utils.general import LOGGER, cv2
+
+MP4_AUDIO_CODECS = "aac", "mp3", "ac3", "eac3", "alac"  # audio stream-copied into mp4, others are encoded to AAC
+
+
+def ffmpeg_exe():
+    """Returns the ffmpeg executable on PATH, else the imageio-ffmpeg binary bundled with MoviePy, else None."""
+    exe = shutil.which("ffmpeg")
+    if exe is None:
+        try:
+            import imageio_ffmpeg
+
+            exe = imageio_ffmpeg.get_ffmpeg_exe()
+        except (ImportError, RuntimeError):
+            pass
+    return exe
+
+
+def audio_codec(source, exe=None):
+    """Returns the codec name of the first audio stream of video path or URL `source`, None if it has none."""
+    try:
+        r = subprocess.run([exe or ffmpeg_exe(), "-hide_banner", "-i", str(source)], capture_output=True, timeout=60)
+    except subprocess.TimeoutExpired:
+        return ""  # unknown, encoded
+    m = re.search(r"Stream #\S+.*?: Audio: (\w+)", r.stderr.decode(errors="ignore"))
+    return m[1] if m else None
+
+
+class FFmpegWriter:
+    """
+    cv2.VideoWriter-like sink that encodes BGR frames in a single ffmpeg process fed through stdin.
+
+    Frames are encoded once (H.264, yuv420p) and muxed with the audio of `audio`, a source video path or URL, so no
+    intermediate video file is written and the result is never decoded again to attach the sound. The audio is copied
+    when mp4 can hold its codec and encoded to AAC otherwise (i.e. PCM in .mov), and cut to the video length like
+    MoviePy's set_audio() did. With a binary `sink` (i.e. utils.mosaic.storage S3MultipartWriter) a fragmented mp4 is
+    streamed to it instead of written to `path`. Odd frame sizes are padded by one black pixel row or column, which
+    yuv420p requires.
+    """
+
+    def __init__(self, path, fps, size, audio=None, exe=None, crf=23, preset="veryfast", sink=None):
+        """Starts ffmpeg writing `path` at `fps` for frames of `size` (width, height), muxing audio from `audio`."""
+        self.path = Path(path)
+        self.size = tuple(size)
+        self.sink = sink
+        fps = valid_fps(fps)
+        w, h = self.size
+        exe = exe or ffmpeg_exe()
+        cmd = [exe, "-y", "-loglevel", "error"]
+        cmd += ["-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{w}x{h}", "-r", f"{fps:g}", "-i", "-"]
+        codec = audio_codec(audio, exe) if audio else None
+        if codec is not None:
+            # 0:v 파이프 프레임, 1:a 원본 오디오, mp4에 담을 수 있는 코덱이면 재인코딩 없이 복사
+            cmd += ["-i", str(audio), "-map", "0:v:0", "-map", "1:a:0"]
+            cmd += ["-c:a", "copy" if codec in MP4_AUDIO_CODECS else "aac"]
+            cmd += ["-shortest"]  # --vid-stride나 디코딩 실패로 프레임이 적어도 오디오를 영상 길이에 맞춤
+        cmd += ["-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2"]  # libx264 yuv420p needs even sizes, no-op when they are
+        cmd += ["-c:v", "libx264", "-preset", preset, "-crf", str(crf), "-pix_fmt", "yuv420p"]
+        if sink is None:
+            cmd += ["-movflags", "+faststart", str(self.path)]
+        else:  # moov first and self-contained fragments, so the output never needs seeking
+            cmd += ["-movflags", "frag_keyframe+empty_moov+default_base_moof", "-f", "mp4", "pipe:1"]
+        stdout = None if sink is None else subprocess.PIPE
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=stdout, stderr=subprocess.PIPE)
+        self.pump, self.error = None, None
+        if sink is not None:
+            self.pump = threading.Thread(target=self._pump, daemon=True)
+            self.pump.start()
+
+    def _pump(self):
+        """Copies encoded bytes from ffmpeg stdout to the sink as they are produced."""
+        for chunk in iter(lambda: self.proc.stdout.read(1 << 20), b""):
+            if self.error is None:  # after a sink error keep draining so ffmpeg never blocks on a full pipe
+                try:
+                    self.sink.write(chunk)
+                except Exception as e:
+                    self.error = e
+
+    def write(self, im):
+        """Writes BGR frame `im`, resized if it does not match the writer size, raising ffmpeg's error if it exited."""
+        if (im.shape[1], im.shape[0]) != self.size:
+            im = cv2.resize(im, self.size)
+        try:
+            self.proc.stdin.write(im.tobytes())
+        except OSError as e:  # BrokenPipeError, ffmpeg exited
+            _, err = self._finish()
+            if self.sink is not None:
+                self.sink.abort()
+            raise RuntimeError(f"ffmpeg failed writing {self.path}: {err}") from e
+
+    def _finish(self):
+        """Closes the frame pipe, waits for ffmpeg and the sink pump, and returns (exit code, stderr text)."""
+        with contextlib.suppress(OSError):  # flushing into an exited ffmpeg
+            self.proc.stdin.close()
+        err = self.proc.stderr.read().decode(errors="ignore").strip()
+        if self.pump is not None:
+            self.pump.join()
+        return self.proc.wait(), err
+
+    def isOpened(self):
+        """Returns True while the ffmpeg process is running, like cv2.VideoWriter.isOpened()."""
+        return self.proc.poll() is None
+
+    def release(self):
+        """Closes the frame pipe and waits for ffmpeg to finalize the file or sink, logging ffmpeg errors."""
+        if self.proc.stdin.closed:
+            return
+        code, err = self._finish()
+        if code:
+            LOGGER.warning(f"WARNING ⚠️ ffmpeg failed writing {self.path}: {err}")
+            self.error = self.error or RuntimeError(f"ffmpeg failed: {err}")
+        if self.sink is None:
+            return
+        if self.error is not None:
+            self.sink.abort()
+            raise self.error
+        self.sink.close()
+
+
+def valid_fps(fps, default=30):
+    """Returns `fps`, or `default` if it is 0, negative or NaN as cv2.CAP_PROP_FPS reports for some streams."""
+    if fps > 0:
+        return fps
+    LOGGER.warning(f"WARNING ⚠️ invalid video fps {fps}, writing at {default} fps")
+    return default
+
+
+def video_writer(path, fps, size, audio=None, sink=None):
+    """Returns an FFmpegWriter for mp4 `path` with `audio` muxed in, or an mp4v cv2.VideoWriter without ffmpeg."""
+    fps = valid_fps(fps)
+    exe = ffmpeg_exe()
+    if exe:
+        return FFmpegWriter(path, fps, size, audio=audio, exe=exe, sink=sink)
+    assert sink is None, "ffmpeg is required to stream video output to a sink"
+    LOGGER.warning("WARNING ⚠️ ffmpeg not found, writing mp4v video without audio with cv2.VideoWriter")
+    return cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
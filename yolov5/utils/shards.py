@@ -0,0 +1,159 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""
+Packed dataset shards for `--cache disk`: resized images in a few large files with one index.
+
+The former disk cache wrote one full-resolution .npy next to every image, millions of small files on large datasets.
+compile_shards() instead appends every image, resized exactly as LoadImagesAndLabels.load_image() does, to
+`shard_gb`-sized files in dataset order, so an epoch reads each file front to back. The index (index.npy) holds each
+image's shard, offset, size and shapes, and is written last, so an interrupted compile is rebuilt on the next run.
+Labels and segments are not sharded, the dataset reads them from labels.cache as for every other cache mode.
+
+Compression         | `--cache`     | Stored as
+---                 | ---           | ---
+none                | `disk`        | raw (h, w, 3) uint8, read as zero-copy np.memmap views
+LZ4 (lossless)      | `disk:lz4`    | lz4.frame compressed pixels, ~2x smaller, decompressed per read
+JPEG (lossy, q=95)  | `disk:jpeg`   | cv2.imencode() JPEG, ~10x smaller, decoded per read
+
+Layout:
+    labels_640.shards/
+        index.npy       # dict, see compile_shards()
+        00000.shard     # entries at 64-byte aligned offsets
+        00001.shard
+"""
+
+import shutil
+from multiprocessing.pool import ThreadPool
+from pathlib import Path
+
+import numpy as np
+from tqdm import tqdm
+
+from utils.general import LOGGER, NUM_THREADS, TQDM_BAR_FORMAT, check_requirements, cv2
+
+VERSION = 2  # index version, bump on format changes
+ALIGN = 64  # entry offset alignment (bytes)
+CODECS = None, "lz4", "jpeg"
+
+
+def encode(im, compression=None, quality=95):
+    """Returns the bytes stored for uint8 image `im` with `compression` None, 'lz4' or 'jpeg'."""
+    if compression == "lz4":
+        import lz4.frame
+
+        return lz4.frame.compress(np.ascontiguousarray(im).data)
+    if compression == "jpeg":
+        return cv2.imencode(".jpg", im, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+    return np.ascontiguousarray(im).data
+
+
+def decode(buf, shape, compression=None):
+    """Returns the (h, w, 3) uint8 image of `shape` stored in uint8 array `buf`, a read-only view if uncompressed."""
+    if compression == "lz4":
+        import lz4.frame
+
+        return np.frombuffer(lz4.frame.decompress(buf), dtype=np.uint8).reshape(shape)
+    if compression == "jpeg":
+        return cv2.imdecode(buf, cv2.IMREAD_COLOR)
+    return buf.view(np.ndarray).reshape(shape)
+
+
+class DatasetShards:
+    """Reader for shards written by compile_shards(), mapping each shard file on first access."""
+
+    def __init__(self, path, index, files):
+        """Reads shards in `path` with loaded `index`, mapping dataset `files` to entries (KeyError if missing)."""
+        self.path = Path(path)
+        position = {f: j for j, f in enumerate(index.pop("files"))}
+        self.order = np.array([position[f] for f in files], dtype=np.int64)  # dataset index -> entry
+        self.__dict__.update(index)
+        self.maps = {}  # shard -> np.memmap
+
+    @classmethod
+    def load(cls, path, key, files):
+        """Returns the shards in `path` if they were compiled for `key` and hold all `files`, else None."""
+        try:
+            index = np.load(Path(path) / "index.npy", allow_pickle=True).item()
+            assert index["version"] == VERSION and index["key"] == key
+            return cls(path, index, files)
+        except Exception:
+            return None
+
+    def __getstate__(self):
+        """Pickles the index only, DataLoader workers map the shard files themselves."""
+        return {**self.__dict__, "maps": {}}
+
+    def _map(self, s):
+        """Returns the read-only memory map of shard `s`."""
+        if s not in self.maps:
+            self.maps[s] = np.memmap(self.path / f"{s:05d}.shard", dtype=np.uint8, mode="r")
+        return self.maps[s]
+
+    def get(self, i):
+        """Returns (image, original hw, resized hw) of dataset image `i`."""
+        j = self.order[i]
+        o, b = self.offset[j], self.nbytes[j]
+        im = decode(self._map(self.shard[j])[o : o + b], tuple(self.shape[j]), self.compression)
+        return im, tuple(int(x) for x in self.hw0[j]), im.shape[:2]
+
+    def close(self):
+        """Unmaps the shard files, i.e. before dropping them from the page cache."""
+        self.maps.clear()
+
+
+def compile_shards(dataset, path, key, compression=None, quality=95, shard_gb=1.0, prefix=""):
+    """
+    Writes the resized images of LoadImagesAndLabels `dataset` to shards in `path`.
+
+    `key` identifies the dataset and resize settings, load() rejects shards compiled for another key. Returns the
+    DatasetShards reader.
+    """
+    assert compression in CODECS, f"unknown shard compression '{compression}', choose from {CODECS}"
+    if compression == "lz4":
+        check_requirements("lz4")
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    n, limit = dataset.n, int(shard_gb * (1 << 30))
+    shard, offset, nbytes = np.zeros(n, np.int32), np.zeros(n, np.int64), np.zeros(n, np.int64)
+    shape, hw0 = np.zeros((n, 3), np.int32), np.zeros((n, 2), np.int32)
+
+    def load(i):
+        """Loads, resizes and encodes image `i` in a pool thread."""
+        im, h0w0, _ = dataset.load_image(i)
+        return im.shape, h0w0, encode(im, compression, quality)
+
+    s, o, b, f = 0, 0, 0, open(tmp / "00000.shard", "wb")
+    pbar = tqdm(ThreadPool(NUM_THREADS).imap(load, range(n)), total=n, bar_format=TQDM_BAR_FORMAT)
+    for i, x in enumerate(pbar):  # imap keeps dataset order, writes stay sequential
+        shape[i], hw0[i], data = x
+        size = memoryview(data).nbytes
+        if o and o + size > limit:  # next shard
+            f.close()
+            s, o = s + 1, 0
+            f = open(tmp / f"{s:05d}.shard", "wb")
+        shard[i], offset[i], nbytes[i] = s, o, size
+        pad = -(o + size) % ALIGN
+        f.write(data)
+        f.write(bytes(pad))
+        o, b = o + size + pad, b + size + pad
+        pbar.desc = f"{prefix}Caching images ({b / (1 << 30):.1f}GB disk shards {compression or 'raw'})"
+    f.close()
+    pbar.close()
+
+    index = {
+        "version": VERSION,
+        "key": key,
+        "compression": compression,
+        "files": list(dataset.im_files),
+        "shard": shard,
+        "offset": offset,
+        "nbytes": nbytes,
+        "shape": shape,
+        "hw0": hw0,
+    }
+    np.save(tmp / "index.npy", index)  # last, an interrupted compile has no index and is rebuilt
+    shutil.rmtree(path, ignore_errors=True)
+    tmp.rename(path)
+    LOGGER.info(f"{prefix}New shards created: {path} ({s + 1} files, {b / (1 << 30):.2f}GB)")
+    return DatasetShards(path, index, dataset.im_files)
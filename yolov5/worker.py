@@ -0,0 +1,149 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""
+Resident mosaic worker that keeps the YOLOv5 and DeepFace models warm between requests.
+
+Usage:
+    from worker import MosaicWorker
+
+    worker = MosaicWorker(weights="4class.pt")  # load once at startup
+    with worker.scratch.request() as save_dir:  # per request, deleted on exit
+        outputs = worker("uploads/image.jpg", save_dir=save_dir, ratio=50, face=True, reference="croped/face.jpg")
+"""
+
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[0]  # YOLOv5 root directory
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
+ROOT = Path(os.path.relpath(ROOT, Path.cwd()))  # relative
+
+import detect
+from models.common import DetectMultiBackend
+from utils.general import LOGGER, Profile, check_img_size
+from utils.mosaic.procpool import ModelPool
+from utils.torch_utils import select_device
+
+
+class ScratchSpace:
+    """Per-request scratch directories under `root`, deleted when the request ends so `root` stays bounded."""
+
+    def __init__(self, root=ROOT / "runs/mosaic", max_age=3600):
+        """Creates `root` and prunes directories older than `max_age` seconds left behind by killed processes."""
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_age = max_age
+        self.live = set()  # directories of requests in progress in this process, never pruned
+        self.lock = threading.Lock()
+        self.prune()
+
+    @staticmethod
+    def newest_mtime(d):
+        """Returns the newest mtime in directory tree `d`, writes into subdirectories do not update `d` itself."""
+        t = d.stat().st_mtime
+        for root, dirs, files in os.walk(d):
+            for f in dirs + files:
+                with contextlib.suppress(OSError):  # removed while walking
+                    t = max(t, os.stat(os.path.join(root, f)).st_mtime)
+        return t
+
+    def prune(self):
+        """Removes stale scratch directories; cost is bounded by the number of in-flight requests."""
+        t = time.time()
+        with self.lock:
+            live = set(self.live)
+        for d in self.root.iterdir():
+            with contextlib.suppress(OSError):  # may be removed concurrently by its own request
+                if d not in live and d.is_dir() and t - self.newest_mtime(d) > self.max_age:
+                    shutil.rmtree(d, ignore_errors=True)
+
+    @contextlib.contextmanager
+    def request(self):
+        """Yields a new unique directory for one request and deletes it with all its contents on exit."""
+        d = Path(tempfile.mkdtemp(prefix="req", dir=self.root))
+        with self.lock:
+            self.live.add(d)
+        try:
+            yield d
+        finally:
+            with self.lock:
+                self.live.discard(d)
+            shutil.rmtree(d, ignore_errors=True)
+            self.prune()
+
+
+class MosaicWorker:
+    """Long-lived detect.run() callable serving every request from a single warm DetectMultiBackend."""
+
+    def __init__(
+        self,
+        weights="4class.pt",  # model path
+        data=ROOT / "data/widerface.yaml",  # dataset.yaml path
+        imgsz=(640, 640),  # inference size (height, width)
+        conf_thres=0.25,  # confidence threshold
+        iou_thres=0.45,  # NMS IOU threshold
+        device="",  # cuda device, i.e. 0 or 0,1,2,3 or cpu
+        half=False,  # use FP16 half-precision inference
+        dnn=False,  # use OpenCV DNN for ONNX inference
+        face_model="VGG-Face",  # DeepFace model used by the reference-face exclusion
+        scratch=ROOT / "runs/mosaic",  # root of per-request scratch directories
+        processes=0,  # detection worker processes fed through shared memory (0: one in-process model)
+        threads=1,  # intra-op threads per detection worker process
+    ):
+        """Loads and warms up the detection model and the DeepFace model once, for reuse by every call."""
+        from deepface import DeepFace  # scoped, only the worker process needs TensorFlow
+
+        from utils.mosaic.faces import FaceVerifier, file_hash
+
+        with Profile() as dt:
+            self.model = self.pool = None
+            if processes:  # frames of one request are spread over the worker processes
+                self.imgsz = check_img_size(imgsz, s=32)  # YOLOv5 P5 stride, workers letterbox to this size
+                self.pool_args = weights, processes, threads
+                self.pool_kwargs = dict(device=device or "cpu", data=data, half=half, imgsz=self.imgsz)
+                self.pool = ModelPool(*self.pool_args, **self.pool_kwargs)
+            else:
+                self.device = select_device(device)
+                self.model = DetectMultiBackend(weights, device=self.device, dnn=dnn, data=data, fp16=half)
+                self.imgsz = check_img_size(imgsz, s=self.model.stride)
+                self.model.warmup(imgsz=(1, 3, *self.imgsz))
+            DeepFace.build_model(face_model)  # DeepFace caches built models globally
+            self.verifier = FaceVerifier(face_model)  # reference embeddings cached across requests
+        self.conf_thres, self.iou_thres = conf_thres, iou_thres
+        self.weights_hash = file_hash(weights) if Path(weights).is_file() else str(weights)  # result cache key part
+        self.lock = threading.Lock()  # detect.run() shares the model and video writers, serve one call at a time
+        self.scratch = ScratchSpace(scratch)
+        LOGGER.info(f"MosaicWorker ready, {weights} and {face_model} loaded in {dt.t:.1f}s")
+
+    def __call__(self, source, save_dir=None, **kwargs):
+        """
+        Runs detect.run() mosaic inference on `source` with the warm models and returns the saved output paths.
+
+        Outputs are written directly to `save_dir` (i.e. from `self.scratch.request()`), skipping the runs/detect/exp*
+        increment scan; `kwargs` are passed to detect.run().
+        """
+        if save_dir is not None:
+            save_dir = Path(save_dir)
+            kwargs.update(project=save_dir.parent, name=save_dir.name, exist_ok=True)
+        with self.lock:
+            if self.pool is not None and self.pool.error:  # a worker process died, its requests failed
+                LOGGER.warning(f"Restarting ModelPool after: {self.pool.error}")
+                self.pool.close()
+                self.pool = ModelPool(*self.pool_args, **self.pool_kwargs)
+            return detect.run(
+                model=self.model,
+                pool=self.pool,
+                source=source,
+                imgsz=self.imgsz,
+                conf_thres=self.conf_thres,
+                iou_thres=self.iou_thres,
+                verifier=self.verifier,
+                **kwargs,
+            )